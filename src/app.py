@@ -1,135 +1,222 @@
+import os
+
 from dash import Dash, dcc, html
 import dash_bootstrap_components as dbc
-from flask_caching import Cache
-
-from .data import df
-from .components import date_picker_range, country_dropdown, cards_layout, product_bar_chart, country_pie_chart, stacked_chart, monthly_revenue_chart
-
-# Initialization
-app = Dash(
-    __name__,
-    external_stylesheets=[dbc.themes.BOOTSTRAP],
-    title='RetaiLense Dashboard'
-)
-server = app.server
-
-cache = Cache(
-    app.server,
-    config={
-        'CACHE_TYPE': 'filesystem',
-        'CACHE_DIR': 'tmp'
-    }
-)
-
-from . import callbacks # import callbacks after caching is initialized 
-
-# Layout
-app.layout = dbc.Container(
-    fluid=True,  # Make the container fluid to span the full width
-    style={'padding': '0', 'margin': '0'},  # Remove default padding 
-    children=[
-        dcc.Store(id='selected-country-store', data=None),
-        dcc.Store(id='other-countries-store', data=[]),  # Stores list of "Others" countries
-        dbc.Row(dbc.Col(html.H1(
-            'RetaiLense',
-            style={
-                'backgroundColor': '#1E3A4C',
-                'color': 'white',             
-                'padding': '5px',
-                'textAlign': 'center',
-                'boxShadow': '2px 2px 10px rgba(0, 0, 0, 0.1)',
-                'marginBottom': '0' 
-            }
-        ))),
-        dbc.Row([
-            dbc.Col(dbc.Row([
-                html.Label('   Filters',
-                           style={
-                               'color': 'white',
-                               'marginTop': '30px',
-                               'marginLeft': '10px',
-                               'fontSize': '22px', 
-                               'fontWeight': 'bold', 
-                               'fontFamily': 'inherit' # to match header font
-                                }),
-                                html.Hr(style={'borderBottom': '2px solid white', 'margin': '9px auto', 'width': '80%'}), # horizontal line 
-
-                html.Label('   Date Range',
-                           style={
-                               'color': 'white',
-                               'marginTop': '30px',
-                               'marginLeft': '10px',
-                               'fontSize': '18px', 
-                               'fontFamily': 'inherit' # to match header font
-                                }),
-                html.Div(date_picker_range,
-                                  style={'justifyContent': 'center', 'width': '100%', 'padding': '20px'}),
-                html.Hr(style={'borderBottom': '2px solid white', 'margin': '9px auto', 'width': '80%'}), # horizontal line 
-                html.Label('  Country', 
-                           style={
-                               'color': 'white',
-                               'marginTop': '20px',
-                               'marginLeft': '10px',
-                               'fontSize': '18px', 
-                               'fontFamily': 'inherit' # to match header font
-                               }),
-                html.Div(country_dropdown,
-                                  style={'justifyContent': 'center', 'width': '100%', 'padding': '10px'}),
-                html.Hr(style={'borderBottom': '2px solid white', 'margin': '9px auto', 'width': '80%'}), # horizontal line 
-            ]), md=2, # Country dropdown on the left (adjust width)
-            style={
-                'backgroundColor': '#809DAF', 
-                'padding': '10px',
-                'boxShadow': '2px 2px 10px rgba(0, 0, 0, 0.1)'
+
+from .cache import ResultCache
+from .metrics import metrics
+from .profiling import PROFILE_DIR, PROFILE_THRESHOLD, profiler
+from .data import DATA_PATH, data_version, frame_metadata, load_metadata, set_data
+from .components import date_picker_range, country_dropdown, cards_layout, granularity_radio, product_bar_chart, country_pie_chart, stacked_chart, monthly_revenue_chart
+
+# Callback results, kept in process in front of the on-disk cache shared by
+# the workers (set up by `create_app`), and namespaced by the dataset version
+result_cache = ResultCache(version=data_version)
+
+# Date ranges longer than this many days get HyperLogLog estimates of the
+# distinct customer and invoice counts, None keeps every count exact
+APPROXIMATE_DISTINCT_DAYS = os.environ.get('RETAILENSE_APPROXIMATE_DISTINCT_DAYS')
+
+# Server configuration, overridden by the `config` of `create_app`
+DEFAULT_CONFIG = {
+    'RESULT_CACHE_MAXSIZE': 256,
+    'RESULT_CACHE_MAX_BYTES': 64 * 1024 * 1024,
+    'RESULT_CACHE_DIR': 'tmp',  # None keeps results in process only
+    'RESULT_CACHE_DISK_BYTES': 256 * 1024 * 1024,
+    'DATA_PATH': DATA_PATH,
+    'APPROXIMATE_DISTINCT_DAYS': int(APPROXIMATE_DISTINCT_DAYS) if APPROXIMATE_DISTINCT_DAYS else None,
+    'PROFILE_DIR': PROFILE_DIR,  # None disables profiling
+    'PROFILE_THRESHOLD': PROFILE_THRESHOLD,  # seconds, None profiles requested callbacks only
+    'PROFILE_MAX_FILES': 100,
+}
+
+
+def create_app(config=None, data=None):
+    """
+    Creates the dashboard app without loading the dataset: the layout is
+    built from the metadata sidecar of the processed parquet file, and the
+    dataset is loaded by the first callback that needs it.
+
+    Parameters:
+    ----------
+    config : dict or None, optional
+        Flask configuration overriding `DEFAULT_CONFIG`, e.g. the
+        'RESULT_CACHE_DIR' of the on-disk cache, the 'RESULT_CACHE_MAXSIZE'
+        of the in-process cache, the 'DATA_PATH' of the processed parquet
+        file or the 'PROFILE_DIR' of the callback profiles.
+    data : pandas.DataFrame or None, optional
+        The invoice lines to answer from instead of loading 'DATA_PATH',
+        with the pandas backend only.
+
+    Returns:
+    -------
+    dash.Dash
+        The app, whose Flask server is `app.server`.
+    """
+    app = Dash(
+        __name__,
+        external_stylesheets=[dbc.themes.BOOTSTRAP],
+        title='RetaiLense Dashboard'
+    )
+    app.server.config.update(DEFAULT_CONFIG)
+    app.server.config.update(config or {})
+    result_cache.init_app(app.server)
+    metrics.init_app(app.server, cache=result_cache)
+    profiler.init_app(app.server)
+
+    path = app.server.config['DATA_PATH']
+    set_data(data, path)
+
+    from . import callbacks  # import callbacks after caching is initialized
+
+    metadata = load_metadata(path) if data is None else frame_metadata(data)
+    app.layout = make_layout(metadata)
+    return app
+
+
+def make_layout(metadata):
+    """
+    Builds the dashboard layout.
+
+    Parameters:
+    ----------
+    metadata : dict
+        The date bounds and countries of the dataset, as returned by
+        `src.data.load_metadata`.
+
+    Returns:
+    -------
+    dash_bootstrap_components.Container
+        The page layout.
+    """
+    return dbc.Container(
+        fluid=True,  # Make the container fluid to span the full width
+        style={'padding': '0', 'margin': '0'},  # Remove default padding 
+        children=[
+            # Template version of the spec each chart shows, so updates only send its data
+            *[dcc.Store(id=f'{chart}-template') for chart in
+              ['monthly-revenue', 'stacked-chart', 'product-bar-chart', 'country-pie-chart']],
+            dbc.Row(dbc.Col(html.H1(
+                'RetaiLense',
+                style={
+                    'backgroundColor': '#1E3A4C',
+                    'color': 'white',             
+                    'padding': '5px',
+                    'textAlign': 'center',
+                    'boxShadow': '2px 2px 10px rgba(0, 0, 0, 0.1)',
+                    'marginBottom': '0' 
                 }
-            ),  
-            dbc.Col([
-                # Cards in a grid layout
-                cards_layout,
-                dbc.Row([
-                    dbc.Col(dbc.Container([monthly_revenue_chart], fluid=True), md=8), 
-                    dbc.Col(dbc.Container([stacked_chart], fluid=True), md=4)
-                ],
+            ))),
+            dbc.Row([
+                dbc.Col(dbc.Row([
+                    html.Label('   Filters',
+                               style={
+                                   'color': 'white',
+                                   'marginTop': '30px',
+                                   'marginLeft': '10px',
+                                   'fontSize': '22px', 
+                                   'fontWeight': 'bold', 
+                                   'fontFamily': 'inherit' # to match header font
+                                    }),
+                                    html.Hr(style={'borderBottom': '2px solid white', 'margin': '9px auto', 'width': '80%'}), # horizontal line 
+
+                    html.Label('   Date Range',
+                               style={
+                                   'color': 'white',
+                                   'marginTop': '30px',
+                                   'marginLeft': '10px',
+                                   'fontSize': '18px', 
+                                   'fontFamily': 'inherit' # to match header font
+                                    }),
+                    html.Div(date_picker_range(metadata),
+                                      style={'justifyContent': 'center', 'width': '100%', 'padding': '20px'}),
+                    html.Hr(style={'borderBottom': '2px solid white', 'margin': '9px auto', 'width': '80%'}), # horizontal line 
+                    html.Label('  Country', 
+                               style={
+                                   'color': 'white',
+                                   'marginTop': '20px',
+                                   'marginLeft': '10px',
+                                   'fontSize': '18px', 
+                                   'fontFamily': 'inherit' # to match header font
+                                   }),
+                    html.Div(country_dropdown(metadata),
+                                      style={'justifyContent': 'center', 'width': '100%', 'padding': '10px'}),
+                    html.Hr(style={'borderBottom': '2px solid white', 'margin': '9px auto', 'width': '80%'}), # horizontal line 
+                ]), md=2, # Country dropdown on the left (adjust width)
+                style={
+                    'backgroundColor': '#809DAF', 
+                    'padding': '10px',
+                    'boxShadow': '2px 2px 10px rgba(0, 0, 0, 0.1)'
+                    }
+                ),  
+                dbc.Col([
+                    # Cards in a grid layout
+                    cards_layout,
+                    dbc.Row([
+                        dbc.Col(dbc.Container([granularity_radio, monthly_revenue_chart()], fluid=True), md=8), 
+                        dbc.Col(dbc.Container([stacked_chart()], fluid=True), md=4)
+                    ],
+                    style={'marginRight': '0', 'paddingRight': '0'}
+                    ),
+                    dbc.Row([
+                        dbc.Col(dbc.Container([product_bar_chart()], fluid=True), md=8),
+                        dbc.Col(dbc.Container([country_pie_chart()], fluid=True), md=4)
+                    ],
+                    style={'marginRight': '0', 'paddingRight': '0'}
+                    ),
+                ], md=10,
                 style={'marginRight': '0', 'paddingRight': '0'}
                 ),
-                dbc.Row([
-                    dbc.Col(dbc.Container([product_bar_chart], fluid=True), md=8),
-                    dbc.Col(dbc.Container([country_pie_chart], fluid=True), md=4)
+                html.Hr(style={'borderBottom': '2px solid white', 'margin': '9px auto', 'width': '100%'})
                 ],
-                style={'marginRight': '0', 'paddingRight': '0'}
-                ),
-            ], md=10,
             style={'marginRight': '0', 'paddingRight': '0'}
             ),
-            html.Hr(style={'borderBottom': '2px solid white', 'margin': '9px auto', 'width': '100%'})
+            dbc.Row([
+                dbc.Col([
+                    html.Div([
+                        html.P(" ", style={"font-size": "12px"}),
+                        html.P("RetaiLense is an interactive dashboard designed to monitor and optimize eCommerce sales across international markets for a UK-based online retail company.",
+                               style={"font-size": "12px"}),
+                        html.P("Authors: Ashita Diwan @diwanashita, Gurmehak Kaur @gurmehak, Meagan Gardner @meagangardner, and Wai Ming Wong @waiming",
+                               style={"font-size": "12px"}),
+                        html.A("GitHub Repository", href="https://github.com/UBC-MDS/DSCI-532_2025_9_RetaiLense",
+                               target="_blank", style={"font-size": "12px"}),
+                    ],
+                    style={
+                        'textAlign': 'center',  # Center-align text horizontally
+                        'alignItems': 'center',  # Center-align children horizontally
+                        'justifyContent': 'center',  # Center-align children vertically
+                        'margin': '0 auto',  # Center the div itself horizontally
+                        'paddingLeft': '20x'
+                    })
+                ], md=12),
             ],
-        style={'marginRight': '0', 'paddingRight': '0'}
-        ),
-        dbc.Row([
-            dbc.Col([
-                html.Div([
-                    html.P(" ", style={"font-size": "12px"}),
-                    html.P("RetaiLense is an interactive dashboard designed to monitor and optimize eCommerce sales across international markets for a UK-based online retail company.",
-                           style={"font-size": "12px"}),
-                    html.P("Authors: Ashita Diwan @diwanashita, Gurmehak Kaur @gurmehak, Meagan Gardner @meagangardner, and Wai Ming Wong @waiming",
-                           style={"font-size": "12px"}),
-                    html.A("GitHub Repository", href="https://github.com/UBC-MDS/DSCI-532_2025_9_RetaiLense",
-                           target="_blank", style={"font-size": "12px"}),
-                ],
-                style={
-                    'textAlign': 'center',  # Center-align text horizontally
-                    'alignItems': 'center',  # Center-align children horizontally
-                    'justifyContent': 'center',  # Center-align children vertically
-                    'margin': '0 auto',  # Center the div itself horizontally
-                    'paddingLeft': '20x'
-                })
-            ], md=12),
-        ],
-        style={'marginTop': '20px'} 
-        ),
-    ]
-)
+            style={'marginTop': '20px'} 
+            ),
+        ]
+    )
+
+
+_app = None
+
+
+def __getattr__(name):
+    # `app` and `server` (e.g. gunicorn src.app:server) are created on first
+    # access, so importing this module neither reads data nor builds a layout
+    global _app
+    if name in ('app', 'server'):
+        if _app is None:
+            _app = create_app()
+        return _app if name == 'app' else _app.server
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Run the app
 if __name__ == '__main__':
-    app.run()
\ No newline at end of file
+    import logging
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    # Run as `python -m src.app`, this module is `__main__`, not the `src.app`
+    # the callbacks import: create the app from the latter so they share its
+    # result cache
+    from src.app import create_app as create_shared_app
+    create_shared_app().run()
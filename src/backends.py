@@ -0,0 +1,291 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .cube import GRANULARITIES, get_cube
+from .distinct import get_distinct_index
+from .kernels import top_k
+from .metrics import metrics
+from .products import get_product_matrix
+
+# Backend used by the callbacks: 'pandas' (default) or 'duckdb'
+BACKEND = os.environ.get('RETAILENSE_BACKEND', 'pandas')
+
+
+class Backend:
+    """
+    Queries the callbacks need, independent of where the data lives.
+
+    Every query takes the selected date range (inclusive, in YYYY-MM-DD
+    format) and, where relevant, the selected countries (None keeps every
+    country).
+    """
+
+    def monthly_revenue(self, start_date, end_date, countries, granularity='month'):
+        """
+        Returns the 'MonthYear' and 'Revenue' of every month with invoice
+        lines, in chronological order. With `granularity` 'week' or 'day',
+        returns the 'Week' or 'Day' (see `src.cube.GRANULARITIES`) and
+        'Revenue' of every week or day instead.
+        """
+        raise NotImplementedError
+
+    def top_products(self, start_date, end_date, countries, n_products=10):
+        """
+        Returns the 'Description' and 'Revenue' of the top products by
+        decreasing revenue (ties by description).
+        """
+        raise NotImplementedError
+
+    def country_shares(self, start_date, end_date, exclude=None):
+        """
+        Returns the 'Country' and 'Count' of invoice lines of every country
+        with invoice lines, by decreasing count (ties by country).
+        """
+        raise NotImplementedError
+
+    def kpis(self, start_date, end_date, countries):
+        """
+        Returns the 'gross', 'refunds', 'net', 'returns', 'loyal' revenue
+        totals and the number of invoice 'lines'.
+        """
+        raise NotImplementedError
+
+    def distinct_counts(self, start_date, end_date, countries):
+        """
+        Returns the number of distinct 'customers' and of distinct
+        'anonymous_invoices' (invoices without a CustomerID), estimated
+        when the range is longer than APPROXIMATE_DISTINCT_DAYS days.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def approximate(start_date, end_date):
+        """
+        Whether the distinct counts of a date range are estimated, as set by
+        the APPROXIMATE_DISTINCT_DAYS of the app serving the request (None,
+        the default, keeps them exact).
+        """
+        from flask import current_app, has_app_context
+
+        days = current_app.config.get('APPROXIMATE_DISTINCT_DAYS') if has_app_context() else None
+        if days is None:
+            return False
+        return (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days + 1 > days
+
+
+class PandasBackend(Backend):
+    """
+    Reference backend answering from an in-memory frame through the shared
+    metrics cube, distinct-count index and product matrix.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame
+        The invoice lines.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    @metrics.timed('aggregate')
+    def monthly_revenue(self, start_date, end_date, countries, granularity='month'):
+        return (get_cube(self.frame)
+            .series(start_date, end_date, countries, metric='net', granularity=granularity)
+            .rename('Revenue')
+            .reset_index())
+
+    @metrics.timed('aggregate')
+    def top_products(self, start_date, end_date, countries, n_products=10):
+        return get_product_matrix(self.frame).top_products(start_date, end_date, countries, n_products)
+
+    @metrics.timed('aggregate')
+    def country_shares(self, start_date, end_date, exclude=None):
+        counts = get_cube(self.frame).by_country(start_date, end_date, metric='lines', exclude=exclude)
+        country_counts = counts.astype(np.int64).rename('Count').reset_index()
+        # Countries come in name order, so ties break by name
+        order = top_k(country_counts['Count'].to_numpy(), len(country_counts))
+        return country_counts.take(order).reset_index(drop=True)
+
+    @metrics.timed('aggregate')
+    def kpis(self, start_date, end_date, countries):
+        return get_cube(self.frame).totals(start_date, end_date, countries)
+
+    @metrics.timed('aggregate')
+    def distinct_counts(self, start_date, end_date, countries):
+        return get_distinct_index(self.frame).counts(start_date, end_date, countries,
+                                                     approximate=self.approximate(start_date, end_date))
+
+
+class DuckDBBackend(Backend):
+    """
+    Backend querying the processed parquet file directly with DuckDB, so
+    filters and column selections are pushed down to the parquet reader and
+    aggregations run multi-threaded, without materializing the dataset.
+
+    Parameters:
+    ----------
+    path : str
+        The path of the processed parquet file.
+    threads : int or None, optional
+        The number of DuckDB worker threads, default is one per CPU.
+    """
+
+    def __init__(self, path, threads=None):
+        import duckdb
+
+        self.path = path
+        self._connection = duckdb.connect()
+        if threads:
+            self._connection.execute(f'SET threads TO {int(threads)}')
+        self._connection.execute(f'CREATE VIEW invoices AS SELECT * FROM read_parquet({_quote(path)})')
+        self._local = threading.local()
+
+    @metrics.timed('aggregate')
+    def monthly_revenue(self, start_date, end_date, countries, granularity='month'):
+        where, params = self._where(start_date, end_date, countries)
+        # Grouped on the truncated date, only the result rows are formatted
+        return self._query(f'''
+            SELECT strftime(Period, '{_PERIOD_FORMATS[granularity]}') AS {GRANULARITIES[granularity]}, Revenue
+            FROM (
+                SELECT date_trunc('{granularity}', InvoiceDate) AS Period, SUM(Revenue) AS Revenue
+                FROM invoices
+                WHERE {where}
+                GROUP BY Period
+            )
+            ORDER BY Period
+        ''', params)
+
+    @metrics.timed('aggregate')
+    def top_products(self, start_date, end_date, countries, n_products=10):
+        where, params = self._where(start_date, end_date, countries)
+        return self._query(f'''
+            SELECT Description, SUM(Revenue) AS Revenue
+            FROM invoices
+            WHERE {where} AND Description IS NOT NULL
+            GROUP BY Description
+            ORDER BY Revenue DESC, Description
+            LIMIT {int(n_products)}
+        ''', params)
+
+    @metrics.timed('aggregate')
+    def country_shares(self, start_date, end_date, exclude=None):
+        where, params = self._where(start_date, end_date, exclude=exclude)
+        return self._query(f'''
+            SELECT Country, COUNT(*) AS Count
+            FROM invoices
+            WHERE {where}
+            GROUP BY Country
+            ORDER BY Count DESC, Country
+        ''', params)
+
+    @metrics.timed('aggregate')
+    def kpis(self, start_date, end_date, countries):
+        where, params = self._where(start_date, end_date, countries)
+        row = self._query(f'''
+            SELECT
+                COALESCE(SUM(Revenue) FILTER (WHERE Quantity > 0), 0) AS gross,
+                COALESCE(SUM(Revenue) FILTER (WHERE Quantity < 0), 0) AS refunds,
+                COALESCE(SUM(Revenue), 0) AS net,
+                COALESCE(SUM(Revenue) FILTER (WHERE Revenue < 0), 0) AS returns,
+                COALESCE(SUM(Revenue) FILTER (WHERE CustomerID IS NOT NULL), 0) AS loyal,
+                COUNT(*) AS lines
+            FROM invoices
+            WHERE {where}
+        ''', params)
+        return {name: float(value) for name, value in row.iloc[0].items()}
+
+    @metrics.timed('aggregate')
+    def distinct_counts(self, start_date, end_date, countries):
+        where, params = self._where(start_date, end_date, countries)
+        count = 'approx_count_distinct({})' if self.approximate(start_date, end_date) else 'COUNT(DISTINCT {})'
+        row = self._query(f'''
+            SELECT
+                {count.format('CustomerID')} AS customers,
+                {count.format('InvoiceNo')} FILTER (WHERE CustomerID IS NULL) AS anonymous_invoices
+            FROM invoices
+            WHERE {where}
+        ''', params)
+        return {name: int(value) for name, value in row.iloc[0].items()}
+
+    @metrics.timed('filter')
+    def _where(self, start_date, end_date, countries=None, exclude=None):
+        # Dates are compared as timestamps, like the pandas backend does
+        clauses = ['InvoiceDate >= ?::TIMESTAMP', 'InvoiceDate <= ?::TIMESTAMP']
+        params = [str(pd.to_datetime(start_date)), str(pd.to_datetime(end_date))]
+        if countries is not None:
+            countries = sorted(set(countries))
+            clauses.append(f"Country IN ({', '.join('?' * len(countries))})" if countries else 'FALSE')
+            params.extend(countries)
+        if exclude:
+            exclude = sorted(set(exclude))
+            clauses.append(f"Country NOT IN ({', '.join('?' * len(exclude))})")
+            params.extend(exclude)
+        return ' AND '.join(clauses), params
+
+    def _query(self, sql, params):
+        # DuckDB connections are not thread-safe, use one cursor per thread
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self._local.cursor = self._connection.cursor()
+        return cursor.execute(sql, params).df()
+
+
+# Labels of the periods, matching the cube's
+_PERIOD_FORMATS = {'month': '%b-%Y', 'week': '%Y-%m-%d', 'day': '%Y-%m-%d'}
+
+
+def _quote(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+_duckdb_backends = {}
+_duckdb_lock = threading.Lock()
+
+
+def get_backend(frame=None, name=None, path=None):
+    """
+    Returns the backend selected by `name`, or by the RETAILENSE_BACKEND
+    environment variable when `name` is None.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame or None, optional
+        The loaded invoice lines, used by the pandas backend. None uses the
+        dataset answered by the callbacks (see `src.data.get_data`), which
+        the DuckDB backend never loads. The DuckDB backend only queries
+        parquet files, so it raises a ValueError when the callbacks' dataset
+        is a frame set with `src.data.set_data`.
+    name : str or None, optional
+        'pandas' or 'duckdb'.
+    path : str or None, optional
+        The parquet file queried by the DuckDB backend, default is the
+        file the dataset is loaded from (see `src.data.set_data`).
+
+    Returns:
+    -------
+    Backend
+        The backend. DuckDB backends are shared per parquet file, pandas
+        backends are cheap views of the indexes shared per frame.
+    """
+    name = name or BACKEND
+    if name == 'pandas':
+        if frame is None:
+            from .data import get_data
+            frame = get_data()
+        # Not registered per frame: the registry would keep the frame alive
+        return PandasBackend(frame)
+    if name == 'duckdb':
+        if path is None:
+            from .data import data_path, injected_data
+            if injected_data() is not None:
+                raise ValueError("The duckdb backend cannot answer from a frame set with set_data, "
+                                 "use the pandas backend")
+            path = data_path()
+        with _duckdb_lock:
+            if path not in _duckdb_backends:
+                _duckdb_backends[path] = DuckDBBackend(path)
+            return _duckdb_backends[path]
+    raise ValueError(f"Unknown backend '{name}', expected 'pandas' or 'duckdb'")
@@ -0,0 +1,370 @@
+"""
+Callback benchmark on synthetic invoice data at production scale.
+
+Usage:
+    python -m src.benchmark [--rows 1000000 10000000 100000000] [--repeat 30]
+                            [--output benchmark.json] [--baseline previous.json]
+
+For every dataset size, generates synthetic invoice lines with the schema
+of the processed dataset (see `synthetic_invoices`), then times every
+dashboard callback over narrow and wide date ranges and country sets, with
+the result cache disabled so every call computes its result. The p50, p95
+and p99 latency, the latency of the first (cold) call and the peak memory
+allocated by every callback are written to a JSON results file.
+
+With --baseline, the p95 latencies are compared to a previous results file
+and the command fails when any regressed by more than the tolerance.
+
+Generating and preparing the frame peaks at about 180 bytes per row, so
+100M rows need a machine with 20 GB of memory or more.
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+# Countries of the dataset, by decreasing share of invoices
+COUNTRIES = [
+    'United Kingdom', 'Germany', 'France', 'Ireland', 'Spain', 'Netherlands', 'Belgium',
+    'Switzerland', 'Portugal', 'Australia', 'Norway', 'Italy', 'Channel Islands', 'Finland',
+    'Cyprus', 'Sweden', 'Austria', 'Denmark', 'Japan', 'Poland', 'Israel', 'USA', 'Hong Kong',
+    'Singapore', 'Iceland', 'Canada', 'Greece', 'Malta', 'United Arab Emirates',
+    'European Community', 'RSA', 'Lebanon', 'Lithuania', 'Brazil', 'Czech Republic',
+    'Bahrain', 'Saudi Arabia', 'Unspecified',
+]
+
+# Share of the invoices from the United Kingdom, the rest follow a long tail
+UK_SHARE = 0.9
+N_PRODUCTS = 4_000
+N_CUSTOMERS = 4_400
+MEAN_LINES_PER_INVOICE = 20
+REFUND_RATE = 0.02
+ANONYMOUS_RATE = 0.25
+FIRST_DAY, LAST_DAY = '2010-12-01', '2011-12-09'
+
+# Date ranges and country sets every callback is timed over
+SCENARIOS = {
+    'narrow-dates-one-country': ('2011-11-01', '2011-11-07', ['United Kingdom']),
+    'narrow-dates-all-countries': ('2011-11-01', '2011-11-07', COUNTRIES),
+    'wide-dates-one-country': (FIRST_DAY, LAST_DAY, ['United Kingdom']),
+    'wide-dates-few-countries': (FIRST_DAY, LAST_DAY, ['Germany', 'France', 'Ireland', 'Spain']),
+    'wide-dates-all-countries': (FIRST_DAY, LAST_DAY, COUNTRIES),
+}
+
+# p95 increase above which a callback counts as regressed
+TOLERANCE = 0.25
+
+
+def _long_tail(n, exponent=1.0):
+    weights = 1 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def synthetic_invoices(n_rows, seed=0):
+    """
+    Generates invoice lines in the processed format, with the traits of the
+    Online Retail dataset:
+        - a skewed country mix, dominated by the United Kingdom
+        - a long tail of products, each with its own stock code and price
+        - invoices of about 20 lines, more of them towards the end of the
+          year and none on Saturdays
+        - refund invoices ('C' prefix, negative quantities)
+        - anonymous invoices, without a CustomerID
+
+    String columns are generated as categoricals, so large sizes fit in
+    memory.
+
+    Parameters:
+    ----------
+    n_rows : int
+        The number of invoice lines.
+    seed : int, optional
+        The random seed.
+
+    Returns:
+    -------
+    pandas.DataFrame
+        The invoice lines, with the columns of the processed dataset.
+    """
+    import pandas as pd
+
+    from .schema import month_keys, month_labels
+
+    rng = np.random.default_rng(seed)
+
+    # One record per invoice, expanded to its lines below
+    n_invoices = max(int(n_rows / MEAN_LINES_PER_INVOICE * 1.2), 1)
+    sizes = rng.geometric(1 / MEAN_LINES_PER_INVOICE, n_invoices)
+    while sizes.sum() < n_rows:
+        sizes = np.concatenate([sizes, rng.geometric(1 / MEAN_LINES_PER_INVOICE, n_invoices)])
+    n_invoices = int(np.searchsorted(np.cumsum(sizes), n_rows)) + 1
+    sizes = sizes[:n_invoices]
+    sizes[-1] -= sizes.sum() - n_rows
+
+    country_shares = np.r_[UK_SHARE, (1 - UK_SHARE) * _long_tail(len(COUNTRIES) - 1)]
+    countries = rng.choice(len(COUNTRIES), n_invoices, p=country_shares)
+
+    days = pd.date_range(FIRST_DAY, LAST_DAY, freq='D')
+    day_weights = np.where(days.dayofweek == 5, 0.0, np.where(days.month >= 9, 2.0, 1.0))
+    dates = days.to_numpy()[rng.choice(len(days), n_invoices, p=day_weights / day_weights.sum())]
+
+    refund = rng.random(n_invoices) < REFUND_RATE
+    customers = rng.choice(N_CUSTOMERS, n_invoices, p=_long_tail(N_CUSTOMERS, 0.5)) + 12346
+    customers = np.where(rng.random(n_invoices) < ANONYMOUS_RATE, np.nan, customers)
+
+    # Lines sorted by date then country, like the processed file
+    order = np.lexsort((countries, dates))
+    invoice = np.repeat(order, sizes[order])
+
+    products = rng.choice(N_PRODUCTS, n_rows, p=_long_tail(N_PRODUCTS)).astype(np.int32)
+    prices = np.round(rng.lognormal(1.0, 0.8, N_PRODUCTS), 2)
+    quantity = rng.geometric(0.15, n_rows)
+    quantity = np.where(refund[invoice], -quantity, quantity)
+    unit_price = prices[products]
+    invoice_dates = dates[invoice]
+
+    invoice_numbers = np.arange(536365, 536365 + n_invoices).astype(str).astype(object)
+    invoice_numbers[refund] = 'C' + invoice_numbers[refund]
+    product_names = np.array([f'PRODUCT {i:04d}' for i in range(N_PRODUCTS)], dtype=object)
+    stock_codes = np.array([str(20000 + i) for i in range(N_PRODUCTS)], dtype=object)
+
+    def categorical(codes, categories):
+        # Categories in sorted order, like `astype('category')` would give
+        rank = np.argsort(categories, kind='stable')
+        position = np.empty(len(categories), dtype=np.int32)
+        position[rank] = np.arange(len(categories))
+        return pd.Categorical.from_codes(position[codes], categories=categories[rank])
+
+    return pd.DataFrame({
+        'InvoiceNo': categorical(invoice, invoice_numbers),
+        'StockCode': categorical(products, stock_codes),
+        'Description': categorical(products, product_names),
+        'Quantity': quantity,
+        'InvoiceDate': invoice_dates,
+        'UnitPrice': unit_price,
+        'CustomerID': customers[invoice],
+        'Country': categorical(countries[invoice], np.array(COUNTRIES, dtype=object)),
+        'Revenue': quantity * unit_price,
+        'MonthYear': month_labels(month_keys(invoice_dates)),
+    })
+
+
+def callback_benchmarks():
+    """
+    Returns the callbacks to time, by name, as functions of a (start date,
+    end date, countries) filter.
+    """
+    from . import callbacks
+
+    return {
+        'plot_monthly_revenue_chart': callbacks.plot_monthly_revenue_chart,
+        'plot_stacked_chart': callbacks.plot_stacked_chart,
+        'plot_top_products_revenue': callbacks.plot_top_products_revenue,
+        'plot_top_countries_pie_chart': lambda start, end, countries: callbacks.plot_top_countries_pie_chart(start, end),
+        'update_cards': callbacks.update_cards,
+        'compute_other_countries': lambda start, end, countries: callbacks.compute_other_countries(start, end, None),
+    }
+
+
+def percentiles(times):
+    """Returns the 'p50_ms', 'p95_ms' and 'p99_ms' of call times in seconds."""
+    p50, p95, p99 = np.percentile(np.asarray(times) * 1000, [50, 95, 99])
+    return {'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+
+def peak_memory(func):
+    """Returns the peak memory allocated by a call, in MB."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_frame(frame, repeat=30, scenarios=None):
+    """
+    Times every callback over every scenario on a prepared frame.
+
+    The app is created with the result cache disabled, so every call
+    computes its result. The first call of every callback also builds the
+    shared indexes it needs, and is reported as 'cold_ms' of the first
+    scenario.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame
+        The invoice lines, as returned by `src.data.prepare_data`.
+    repeat : int, optional
+        The number of timed calls per callback and scenario.
+    scenarios : dict or None, optional
+        The (start date, end date, countries) filters by name, default is
+        SCENARIOS.
+
+    Returns:
+    -------
+    list of dict
+        The 'callback', 'scenario', latency percentiles, 'cold_ms' and
+        'peak_mb' of every callback and scenario.
+    """
+    from .app import create_app
+    from .data import set_data
+
+    create_app({'RESULT_CACHE_DIR': None, 'RESULT_CACHE_MAXSIZE': 0}, data=frame)
+    try:
+        results = []
+        for name, func in callback_benchmarks().items():
+            for scenario, (start, end, countries) in (scenarios or SCENARIOS).items():
+                started = time.perf_counter()
+                func(start, end, countries)
+                cold = time.perf_counter() - started
+
+                times = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    func(start, end, countries)
+                    times.append(time.perf_counter() - started)
+
+                results.append({
+                    'callback': name,
+                    'scenario': scenario,
+                    **percentiles(times),
+                    'cold_ms': cold * 1000,
+                    'peak_mb': peak_memory(lambda: func(start, end, countries)),
+                })
+        return results
+    finally:
+        set_data(None)
+
+
+def run_benchmark(rows=(1_000_000, 10_000_000, 100_000_000), repeat=30, seed=0, scenarios=None):
+    """
+    Generates a synthetic dataset of every size in `rows` and times the
+    callbacks on it.
+
+    Returns:
+    -------
+    dict
+        The run settings, the environment, and the 'results' of every
+        callback, scenario and number of rows, see `benchmark_frame`.
+    """
+    import pandas as pd
+
+    from .data import prepare_data
+
+    run = {
+        'repeat': repeat,
+        'seed': seed,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sizes': [],
+        'results': [],
+    }
+    for n_rows in rows:
+        started = time.perf_counter()
+        frame = prepare_data(synthetic_invoices(n_rows, seed))
+        generated = time.perf_counter() - started
+
+        results = benchmark_frame(frame, repeat, scenarios)
+        run['sizes'].append({'rows': n_rows, 'generate_s': generated,
+                             'frame_mb': frame.memory_usage(deep=True).sum() / 1e6})
+        run['results'].extend({'rows': n_rows, **result} for result in results)
+        del frame
+        gc.collect()
+
+    run['max_rss_mb'] = _max_rss_mb()
+    return run
+
+
+def compare(previous, current, tolerance=TOLERANCE, metric='p95_ms'):
+    """
+    Lists the callbacks whose latency regressed between two runs.
+
+    Parameters:
+    ----------
+    previous : dict
+        The baseline run, as returned by `run_benchmark`.
+    current : dict
+        The new run.
+    tolerance : float, optional
+        The relative increase of `metric` above which a callback counts as
+        regressed, default is TOLERANCE.
+    metric : str, optional
+        The latency compared, default is 'p95_ms'.
+
+    Returns:
+    -------
+    list of dict
+        The 'rows', 'callback', 'scenario', 'previous' and 'current' latency
+        and 'change' of every regressed callback, on the sizes and scenarios
+        both runs measured.
+    """
+    def key(result):
+        return result['rows'], result['callback'], result['scenario']
+
+    baseline = {key(result): result[metric] for result in previous['results']}
+    regressions = []
+    for result in current['results']:
+        before = baseline.get(key(result))
+        if before is None or before <= 0:
+            continue
+        change = result[metric] / before - 1
+        if change > tolerance:
+            regressions.append({'rows': result['rows'], 'callback': result['callback'],
+                                'scenario': result['scenario'], 'previous': before,
+                                'current': result[metric], 'change': change})
+    return regressions
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # ru_maxrss is in kB on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the RetaiLense callbacks on synthetic data.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000, 100_000_000],
+                        help='numbers of synthetic invoice lines')
+    parser.add_argument('--repeat', type=int, default=30, help='timed calls per callback and scenario')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the synthetic data')
+    parser.add_argument('--output', default='benchmark.json', help='results file')
+    parser.add_argument('--baseline', help='previous results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='relative p95 increase counted as a regression')
+    args = parser.parse_args(argv)
+
+    run = run_benchmark(args.rows, args.repeat, args.seed)
+    with open(args.output, 'w') as file:
+        json.dump(run, file, indent=2)
+
+    import pandas as pd
+
+    columns = ['rows', 'callback', 'scenario', 'p50_ms', 'p95_ms', 'p99_ms', 'cold_ms', 'peak_mb']
+    print(pd.DataFrame(run['results'])[columns].round(2).to_string(index=False))
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(json.load(file), run, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression['callback']} ({regression['scenario']}, {regression['rows']} rows): "
+                  f"p95 {regression['previous']:.2f}ms -> {regression['current']:.2f}ms "
+                  f"(+{regression['change']:.0%})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,342 @@
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import shutil
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+
+from .metrics import metrics
+
+
+def canonical_date(value):
+    """
+    Normalizes a date picker value, so '2011-01-01' and
+    '2011-01-01T00:00:00' give the same key.
+    """
+    if value is None:
+        return None
+    return datetime.fromisoformat(str(value)).isoformat()
+
+
+def canonical_countries(countries):
+    """
+    Sorts and deduplicates the selected countries. None (every country) and
+    an empty selection (no country) stay distinct.
+    """
+    if countries is None:
+        return None
+    if isinstance(countries, str):
+        countries = [countries]
+    return tuple(sorted(set(countries)))
+
+
+def filter_key(start_date, end_date, countries=None, *args):
+    """
+    Canonical key of a callback taking a (start_date, end_date[, countries])
+    filter followed by any hashable arguments.
+    """
+    return (canonical_date(start_date), canonical_date(end_date), canonical_countries(countries)) + args
+
+
+def range_key(start_date, end_date, *args):
+    """
+    Canonical key of a callback taking a (start_date, end_date) range
+    followed by any hashable arguments.
+    """
+    return (canonical_date(start_date), canonical_date(end_date)) + args
+
+
+class ResultCache:
+    """
+    Two-tier cache of callback results.
+
+    Results are looked up in a small in-process LRU first, then in a shared
+    tier (e.g. the `DiskCache` shared by the gunicorn workers). A shared hit
+    is promoted to the LRU, so repeated lookups skip the file read and the
+    unpickling.
+
+    Keys are built by a per-callback key function from the call arguments,
+    e.g. `filter_key`, so equivalent filters share their entry, and are
+    namespaced by the version of the dataset, so results computed from a
+    previous dataset are never served.
+
+    Parameters:
+    ----------
+    shared : DiskCache or None, optional
+        The shared tier, with `get(key)` and `set(key, blob)` methods. None
+        keeps results in process only.
+    maxsize : int, optional
+        The maximum number of results kept in process, default is 256. Zero
+        disables the in-process tier.
+    max_bytes : int, optional
+        The maximum total pickled size of the results kept in process,
+        default is 64 MB.
+    version : callable or None, optional
+        Returns the version of the dataset the results are computed from,
+        e.g. `src.data.data_version`. None uses a single version.
+    """
+
+    def __init__(self, shared=None, maxsize=256, max_bytes=64 * 1024 * 1024, version=None):
+        self.shared = shared
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.version = version
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, server):
+        """
+        Reads the settings of a Flask server and drops the results kept in
+        process: RESULT_CACHE_MAXSIZE and RESULT_CACHE_MAX_BYTES bound the
+        in-process tier, RESULT_CACHE_DIR (None disables it) and
+        RESULT_CACHE_DISK_BYTES set up the shared `DiskCache`.
+        """
+        self.maxsize = server.config.get('RESULT_CACHE_MAXSIZE', self.maxsize)
+        self.max_bytes = server.config.get('RESULT_CACHE_MAX_BYTES', self.max_bytes)
+        directory = server.config.get('RESULT_CACHE_DIR')
+        if directory:
+            self.shared = DiskCache(directory, server.config.get('RESULT_CACHE_DISK_BYTES', 256 * 1024 * 1024))
+        else:
+            self.shared = None
+        self.clear()
+
+    def memoize(self, key=filter_key):
+        """
+        Decorator caching the results of a callback.
+
+        Parameters:
+        ----------
+        key : callable, optional
+            Builds the canonical key from the call arguments, default is
+            `filter_key`. It is called with every argument of the callback
+            in order, defaults included, so calls passing arguments by
+            keyword or omitting defaults share their entry.
+        """
+        def decorator(func):
+            name = func.__name__
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                version = self.version() if self.version is not None else ''
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                cache_key = (version, name, key(*bound.args, **bound.kwargs))
+                with metrics.phase('cache'):
+                    found, value = self.get(cache_key)
+                if found:
+                    return value
+                value = func(*args, **kwargs)
+                with metrics.phase('cache'):
+                    self.set(cache_key, value)
+                return value
+
+            wrapper.uncached = func
+            return wrapper
+        return decorator
+
+    def get(self, cache_key):
+        """
+        Returns (True, result) for a cached key and (False, None) otherwise.
+        `cache_key` is a (dataset version, callback name, canonical key) tuple.
+        """
+        name = cache_key[1]
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+                self._count(name, 'hits')
+                return True, entry[0]
+
+        blob = self.shared.get(cache_key) if self.shared is not None else None
+        if blob is not None:
+            value = pickle.loads(blob)
+            self._remember(cache_key, value, len(blob))
+            with self._lock:
+                self._count(name, 'shared_hits')
+            return True, value
+
+        with self._lock:
+            self._count(name, 'misses')
+        return False, None
+
+    def set(self, cache_key, value):
+        """Stores the result of a key in both tiers."""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.shared is not None:
+            self.shared.set(cache_key, blob)
+        self._remember(cache_key, value, len(blob))
+
+    def stats(self):
+        """
+        Returns the 'hits' (in process), 'shared_hits', 'misses' and
+        'evictions' of every callback, by callback name.
+        """
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+    def clear(self):
+        """Drops the results kept in process and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self._stats.clear()
+
+    def _remember(self, cache_key, value, nbytes):
+        if self.maxsize <= 0 or nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(cache_key, None)
+            if previous is not None:
+                self._nbytes -= previous[1]
+            self._entries[cache_key] = (value, nbytes)
+            self._nbytes += nbytes
+            while len(self._entries) > self.maxsize or self._nbytes > self.max_bytes:
+                (_, name, _), (_, evicted) = self._entries.popitem(last=False)
+                self._nbytes -= evicted
+                self._count(name, 'evictions')
+
+    def _count(self, name, counter):
+        counts = self._stats.setdefault(name, {'hits': 0, 'shared_hits': 0, 'misses': 0, 'evictions': 0})
+        counts[counter] += 1
+
+
+class DiskCache:
+    """
+    On-disk cache of pickled results shared by every process using the same
+    directory.
+
+    Entries are zlib-compressed and stored in one subdirectory per dataset
+    version. The total size of the entries is kept under a byte budget by
+    removing the least recently used ones (file modification times are
+    refreshed on every hit), and the entries of other versions are removed
+    in the background as soon as a new version is seen.
+
+    Parameters:
+    ----------
+    directory : str
+        The cache directory.
+    max_bytes : int, optional
+        The maximum total size of the entries, default is 256 MB.
+    level : int, optional
+        The zlib compression level, default is 6.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, level=6):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.level = level
+        self._lock = threading.Lock()
+        self._versions = set()
+        # Size of the entries at the last scan plus the bytes written since,
+        # so the directory is only scanned when the budget may be exceeded
+        self._nbytes = None
+
+    def get(self, cache_key):
+        """
+        Returns the pickled result of a (version, name, key) tuple, or None
+        when it is not cached.
+        """
+        path = self._path(cache_key)
+        try:
+            with open(path, 'rb') as file:
+                blob = zlib.decompress(file.read())
+            os.utime(path)
+        except (OSError, zlib.error):
+            return None
+        return blob
+
+    def set(self, cache_key, blob):
+        """Stores the pickled result of a (version, name, key) tuple."""
+        data = zlib.compress(blob, self.level)
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(cache_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Renamed into place so other processes never read a partial entry
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._nbytes is None:
+                self._nbytes = self._scan_size()
+            else:
+                self._nbytes += len(data)
+            if self._nbytes > self.max_bytes:
+                self._nbytes = self._evict()
+
+    def clear(self):
+        """Removes every entry."""
+        with self._lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self._versions.clear()
+            self._nbytes = 0
+
+    def _path(self, cache_key):
+        version, name, key = cache_key
+        self._see_version(str(version))
+        digest = hashlib.blake2b(repr((name, key)).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, _version_dir(version), f'{name}-{digest}.bin')
+
+    def _see_version(self, version):
+        with self._lock:
+            if version in self._versions:
+                return
+            self._versions.add(version)
+        thread = threading.Thread(target=self._purge, args=(_version_dir(version),), daemon=True)
+        thread.start()
+
+    def _purge(self, current):
+        # Entries of other dataset versions can never be hit again
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith('v-') and name != current:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        with self._lock:
+            self._nbytes = None
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.bin'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        # Least recently used first, until the entries fit in the budget
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        return total
+
+
+def _version_dir(version):
+    return f'v-{version}' if version else 'v-'
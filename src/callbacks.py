@@ -1,21 +1,30 @@
-from dash import Output, Input, callback, State, html
-import pandas as pd
-import altair as alt
+from dash import Output, Input, callback, ctx, no_update, State, html
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 from textwrap import wrap
 
-from .data import df
-from .app import cache
+from .app import result_cache
+from .cache import range_key
+from .logs import get_logger
+from .metrics import metrics
 
+logger = get_logger(__name__)
 
-@callback(
-    Output('monthly-revenue', 'spec'),
-    Input('date-picker-range', 'start_date'),
-    Input('date-picker-range', 'end_date'),
-    Input('country-dropdown', 'value')
-)
-@cache.memoize()
-def plot_monthly_revenue_chart(start_date, end_date, selected_countries):
+# pandas, the chart specs and the backends are imported by the first callback that
+# needs them, so importing the app stays cheap
+
+
+def _backend():
+    # Resolved per call so the backend always answers from the current
+    # dataset, which the pandas backend loads on first use
+    from .backends import get_backend
+
+    return get_backend()
+
+
+@metrics.instrument
+@result_cache.memoize()
+def plot_monthly_revenue_chart(start_date, end_date, selected_countries, granularity='month'):
     """
     Generates an interactive line chart showing the monthly revenue trend 
     for the selected countries within the specified date range.
@@ -28,45 +37,25 @@ def plot_monthly_revenue_chart(start_date, end_date, selected_countries):
         The selected end date from the date picker (in YYYY-MM-DD format).
     selected_countries : list
         A list of selected countries used to filter the data.
+    granularity : str, optional
+        'month' (default), 'week' or 'day'.
 
     Returns:
     -------
     dict
-        A JSON-encoded Altair chart specification representing the monthly 
+        A Vega-Lite chart specification representing the monthly 
         revenue trend.
     """
-    # Filter the data based on selected date range and countries
-    filtered_df = df[(df['InvoiceDate'] >= pd.to_datetime(start_date)) & 
-                     (df['InvoiceDate'] <= pd.to_datetime(end_date)) & 
-                     (df['Country'].isin(selected_countries))]
-    
-    # Create the Altair chart
-    monthly_revenue_chart = alt.Chart(
-        filtered_df.groupby('MonthYear')['Revenue'].sum().reset_index()
-    ).mark_line(point=True, color='#361162').encode(
-        x=alt.X('MonthYear:N', 
-                sort=pd.to_datetime(filtered_df['MonthYear'].unique(), format='%b-%Y').sort_values().strftime('%b-%Y').tolist(), 
-                title='Month-Year'),
-        y=alt.Y('Revenue:Q', title='Total Revenue (£)'),
-        tooltip=[  # Format tooltip values with commas
-            alt.Tooltip('MonthYear:N', title='Month-Year'),
-            alt.Tooltip('Revenue:Q', title='Total Revenue (£)', format=",.0f")
-        ]
-    ).properties(
-        title='Monthly Revenue Trend',
-        width='container',
-        height = 300
-    )
-    
-    return monthly_revenue_chart.to_dict()
+    from .specs import monthly_revenue_spec
 
-@callback(
-    Output('stacked-chart', 'spec'),
-    Input('date-picker-range', 'start_date'),
-    Input('date-picker-range', 'end_date'),
-    Input('country-dropdown', 'value')
-)
-@cache.memoize()
+    # Revenue per period for the selected date range and countries, in chronological order
+    monthly_revenue = _backend().monthly_revenue(start_date, end_date, selected_countries, granularity)
+
+    return monthly_revenue_spec(monthly_revenue, granularity)
+
+
+@metrics.instrument
+@result_cache.memoize()
 def plot_stacked_chart(start_date, end_date, selected_countries):
     """
     Generates a stacked bar chart displaying Gross Revenue, Refunds, and Net Revenue 
@@ -84,19 +73,21 @@ def plot_stacked_chart(start_date, end_date, selected_countries):
     Returns:
     -------
     dict
-        A JSON-encoded Altair chart specification representing the stacked bar 
+        A Vega-Lite chart specification representing the stacked bar 
         chart of revenue components.
     """
-    # Filter the data based on selected date range and countries
-    filtered_df = df[(df['InvoiceDate'] >= pd.to_datetime(start_date)) & 
-                       (df['InvoiceDate'] <= pd.to_datetime(end_date)) & 
-                       (df['Country'].isin(selected_countries))]
+    import pandas as pd
+
+    from .specs import stacked_spec
+
+    # Revenue totals for the selected date range and countries
+    totals = _backend().kpis(start_date, end_date, selected_countries)
     
     # Compute Gross Revenue (sum of revenue where quantity > 0)
-    gross_revenue = filtered_df.loc[filtered_df['Quantity'] > 0, 'Revenue'].sum()
+    gross_revenue = totals['gross']
     
     # Compute Refund (sum of revenue where quantity < 0, taking absolute value)
-    refund = abs(filtered_df.loc[filtered_df['Quantity'] < 0, 'Revenue'].sum())
+    refund = abs(totals['refunds'])
     
     # Compute Net Revenue (Gross Revenue - Refund)
     net_revenue = gross_revenue - refund
@@ -108,32 +99,11 @@ def plot_stacked_chart(start_date, end_date, selected_countries):
     })
     working_df['Total'] = working_df['Value'].sum()
     
-    chart = alt.Chart(working_df).mark_bar(size=40).encode(  # Adjust size here
-        x=alt.X('Total:Q', title='Total Gross Revenue'),
-        y=alt.Y('Value:Q', title='Amount (£)'),
-        color=alt.Color('Component:N', scale=alt.Scale(domain=['Refunds', 'Net Revenue'], range=['#9A2A2A', '#ffcc87']),
-                        legend=alt.Legend(title='Category')
-                       ),
-        order=alt.Order('Component:N', sort='ascending'),  # Ensure correct stacking order,
-    tooltip=[
-        alt.Tooltip('Component:N', title='Category'),
-        alt.Tooltip('Value:Q', title='Amount (£)', format=",.2f")  # Format with pound symbol and commas
-    ]
-    ).properties(
-        title='Revenue Stacked Chart',
-        width=200,
-        height=300
-    )
+    return stacked_spec(working_df)
 
-    return chart.to_dict()
 
-@callback(
-    Output('product-bar-chart', 'spec'),
-    Input('date-picker-range', 'start_date'),
-    Input('date-picker-range', 'end_date'),
-    Input('country-dropdown', 'value')
-)
-@cache.memoize()
+@metrics.instrument
+@result_cache.memoize()
 def plot_top_products_revenue(start_date, end_date, selected_countries, n_products=10):
     """
     Generates a horizontal bar chart displaying the top products by revenue 
@@ -153,28 +123,18 @@ def plot_top_products_revenue(start_date, end_date, selected_countries, n_produc
     Returns:
     -------
     dict
-        A JSON-encoded Altair chart specification representing the 
+        A Vega-Lite chart specification representing the 
         top products by revenue.
     """
-    # Filter the data based on selected date range and countries
-    filtered_df = df[
-        (df['InvoiceDate'] >= pd.to_datetime(start_date)) & 
-        (df['InvoiceDate'] <= pd.to_datetime(end_date)) & 
-        (df['Country'].isin(selected_countries))
-    ]
-    
-    # group description by revenue then get the top products
-    product_revenue = (filtered_df
-        .groupby('Description')['Revenue']
-        .sum()
-        .sort_values(ascending=False)
-        .head(n_products)
-        .reset_index())
+    from .specs import top_products_spec
+
+    # Top products by revenue for the selected date range and countries
+    product_revenue = _backend().top_products(start_date, end_date, selected_countries, n_products)
     
     # Wrap on whitespace with a max line length of 30 chars
     product_revenue['Product'] = product_revenue['Description'].apply(wrap, args=[30])
 
-    # Assign a rank to each product based on its position in the top 10
+    # Assign a rank to each product based on its position in the top N
     product_revenue['Rank'] = range(1, len(product_revenue) + 1)
 
     # Define a consistent color scheme for the top 10 positions
@@ -183,32 +143,50 @@ def plot_top_products_revenue(start_date, end_date, selected_countries, n_produc
         '#de4968', '#f76f5c', '#fe9f6d', '#fece91', '#e8d3bd'
     ]
 
-    # Map the rank to the corresponding color
-    product_revenue['Color'] = product_revenue['Rank'].apply(lambda x: top_colors[x - 1])
-
-    # Plot the bar chart with consistent colors for the top 10 positions
-    bar_chart = alt.Chart(product_revenue).mark_bar().encode(
-        x=alt.X('Revenue:Q', title='Revenue (£)'),
-        y=alt.Y('Product:N', sort='-x', title='Product Name'),
-        color=alt.Color('Color:N', scale=None, legend=None),  # Use consistent colors
-        tooltip=[  
-            alt.Tooltip('Description:N', title='Description'),
-            alt.Tooltip('Revenue:Q', title='Revenue (£)', format=",.0f")
-        ]
-    ).properties(
-        title=f'Top {n_products} Products by Revenue',
-        width='container',
-        height=300
-    )
-    
-    return bar_chart.to_dict()
+    # Map the rank to the corresponding color, cycling past the 10th position
+    product_revenue['Color'] = product_revenue['Rank'].apply(lambda x: top_colors[(x - 1) % len(top_colors)])
 
-@callback(
-    Output('country-pie-chart', 'spec'),
-    Input('date-picker-range', 'start_date'),
-    Input('date-picker-range', 'end_date')
-)
-@cache.memoize()
+    return top_products_spec(product_revenue, n_products)
+
+
+@metrics.instrument
+@result_cache.memoize(key=range_key)
+def compute_country_shares(start_date, end_date, n_top=5):
+    """
+    Splits the countries outside of the UK into the top countries by number
+    of invoice lines and the "Others", once per date range, for both the pie
+    chart and the "Others" dropdown selection.
+
+    Parameters:
+    ----------
+    start_date : str
+        The selected start date from the date picker (in YYYY-MM-DD format).
+    end_date : str
+        The selected end date from the date picker (in YYYY-MM-DD format).
+    n_top : int, optional
+        The number of top countries, default is 5.
+
+    Returns:
+    -------
+    dict
+        The 'top' countries and their 'top_counts', by decreasing count, and
+        the 'others' countries and their 'other_counts'.
+    """
+    # Invoice lines per country, answered from the day x country cube
+    country_counts = _backend().country_shares(start_date, end_date, exclude=['United Kingdom'])
+    countries = [str(country) for country in country_counts['Country']]
+    counts = [int(count) for count in country_counts['Count']]
+
+    return {
+        'top': countries[:n_top],
+        'top_counts': counts[:n_top],
+        'others': countries[n_top:],
+        'other_counts': counts[n_top:],
+    }
+
+
+@metrics.instrument
+@result_cache.memoize(key=range_key)
 def plot_top_countries_pie_chart(start_date, end_date):
     """
     Generates an interactive pie chart displaying the top 5 countries by sales, 
@@ -225,19 +203,20 @@ def plot_top_countries_pie_chart(start_date, end_date):
     Returns:
     -------
     dict
-        A JSON-encoded Altair chart specification representing the pie chart 
+        A Vega-Lite chart specification representing the pie chart 
         of the top 5 countries (excluding the UK) by sales.
     """
-    # Exclude the United Kingdom
-    df_no_uk = df[df['Country'] != 'United Kingdom']
+    import pandas as pd
+
+    from .specs import country_pie_spec
+
+    # Top 5 countries and "Others", shared with compute_other_countries
+    shares = compute_country_shares(start_date, end_date)
+    country_counts = pd.DataFrame({
+        'Country': shares['top'] + shares['others'],
+        'Count': shares['top_counts'] + shares['other_counts'],
+    })
 
-    df_no_uk = df_no_uk[(df_no_uk['InvoiceDate'] >= pd.to_datetime(start_date)) & 
-                        (df_no_uk['InvoiceDate'] <= pd.to_datetime(end_date))]
-    
-    # Count the occurrences of each country and reset index
-    country_counts = df_no_uk['Country'].value_counts().reset_index()
-    country_counts.columns = ['Country', 'Count']
-    
     # Calculate percentage
     total_count = country_counts['Count'].sum()
     country_counts['Percentage'] = round((country_counts['Count'] / total_count) * 100, 1)
@@ -251,55 +230,60 @@ def plot_top_countries_pie_chart(start_date, end_date):
     # Append "Others" to the DataFrame
     others_row = pd.DataFrame({'Country': ['Others'], 'Count': [total_count - top_countries['Count'].sum()], 'Percentage': [others_percentage]})
     final_data = pd.concat([top_countries, others_row], ignore_index=True)
-    
 
+    return country_pie_spec(final_data)
 
-    # Create an Altair selection object for clicking on the pie slices
-    selection = alt.selection_point(fields=['Country'], 
-                                    nearest= False, 
-                                    empty=False,
-                                    name="selected_country")
 
-    # Create the Altair pie chart with percentages
-    pie_chart = alt.Chart(final_data).mark_arc().encode(
-        theta=alt.Theta(field="Percentage", type="quantitative").stack(True),
-        opacity=alt.condition(selection, alt.value(1), alt.value(0.5)), 
-        tooltip=['Country', 'Percentage']
-    )
-    
-    chart = pie_chart.mark_arc(outerRadius=120).encode(
-         color=alt.Color(field="Country", type="nominal", scale=alt.Scale(scheme='magma'), legend=None)
-    ).add_params(selection).properties(
-        title="Top 5 Countries Outside of the UK",
-        width='container',
-        height = 300
-    )
+@metrics.instrument
+@result_cache.memoize()
+def compute_kpis(start_date, end_date, selected_countries):
+    """
+    Computes the key financial metrics shown on the cards.
 
-    text = pie_chart.mark_text(
-        size=10, fontWeight='bold', color='black', radius=140
-    ).encode(
-        text=alt.Text('Country:N'),  # Show country names
-    )
+    Parameters:
+    ----------
+    start_date : str
+        The selected start date from the date picker (in YYYY-MM-DD format).
+    end_date : str
+        The selected end date from the date picker (in YYYY-MM-DD format).
+    selected_countries : list
+        A list of selected countries used for filtering data.
 
-    pie_chart = (chart + text)
+    Returns:
+    -------
+    dict
+        The 'loyal_customer_ratio' (share of known customers among customers
+        and anonymous invoices), the 'loyal_customer_sales', the 'net_sales'
+        and the (negative) 'total_returns'.
+    """
+    # Totals and distinct counts for the selected date range and countries
+    totals = _backend().kpis(start_date, end_date, selected_countries)
+    distinct_counts = _backend().distinct_counts(start_date, end_date, selected_countries)
+
+    # Calculate the loyal customer ratio
+    loyal_customers = distinct_counts['customers']
+    total_non_loyal_customers = distinct_counts['anonymous_invoices']  # Count unique InvoiceNo for non-loyal customers
+    total_unique_customers = loyal_customers + total_non_loyal_customers
 
-    return pie_chart.to_dict()
+    if total_unique_customers == 0:
+        loyal_customers_ratio = 0
+    else:
+        loyal_customers_ratio = float(loyal_customers / total_unique_customers)
 
+    return {
+        'loyal_customer_ratio': loyal_customers_ratio,
+        'loyal_customer_sales': float(totals['loyal']),
+        'net_sales': float(totals['net']),
+        'total_returns': float(totals['returns']),
+    }
 
 
-@callback(
-    Output('card-loyal-customer-ratio', 'children'),
-    Output('card-loyal-customer-sales', 'children'),
-    Output('card-net-sales', 'children'),
-    Output('card-total-returns', 'children'),
-    Input('date-picker-range', 'start_date'),
-    Input('date-picker-range', 'end_date'),
-    Input('country-dropdown', 'value')
-)
-#@cache.memoize()
+@metrics.instrument
 def update_cards(start_date, end_date, selected_countries):
     """
     Updates key financial metric cards based on the selected date range and countries.
+    The metrics come from the cached `compute_kpis`, only the components are
+    rendered on every call.
 
     Parameters:
     ----------
@@ -319,44 +303,28 @@ def update_cards(start_date, end_date, selected_countries):
         3. **Net Sales** (total revenue, including refunds).
         4. **Total Returns** (negative revenue due to refunds).
     """
-    # Filter the data based on selected date range and countries
-    filtered_df = df[(df['InvoiceDate'] >= pd.to_datetime(start_date)) & 
-                     (df['InvoiceDate'] <= pd.to_datetime(end_date)) & 
-                     (df['Country'].isin(selected_countries))]
-
-    # Calculate the loyal customer ratio
-    loyal_customers = filtered_df['CustomerID'].nunique()
-    non_loyal_customers = filtered_df[filtered_df['CustomerID'].isna()]
-    total_non_loyal_customers = non_loyal_customers['InvoiceNo'].nunique()  # Count unique InvoiceNo for non-loyal customers
-    total_unique_customers = loyal_customers + total_non_loyal_customers
+    kpis = compute_kpis(start_date, end_date, selected_countries)
 
-    if total_unique_customers == 0:
-        loyal_customers_ratio = 0
-    else:
-        loyal_customers_ratio = loyal_customers / total_unique_customers
     loyal_customer_ratio_value = html.Span(
-        f"{round(loyal_customers_ratio * 100, 2)}%",
+        f"{round(kpis['loyal_customer_ratio'] * 100, 2)}%",
         style={'color': '#034168', 'fontWeight': 'bold'}  
     )
 
-    # Calculate the loyal customer sales
-    non_blank_customer_ids = filtered_df[filtered_df['CustomerID'].notna()]
-    total_sales = non_blank_customer_ids['Revenue'].sum()
+    # Loyal customer sales
     loyal_customer_sales_value = html.Span(
-        f"£{total_sales:,.2f}",
+        f"£{kpis['loyal_customer_sales']:,.2f}",
         style={'color': '#034168', 'fontWeight': 'bold'}  
     )
 
-    # Calculate net sales
+    # Net sales
     net_sales_value = html.Span(
-        f"£{filtered_df['Revenue'].sum():,.2f}",
+        f"£{kpis['net_sales']:,.2f}",
         style={'color': '#034168', 'fontWeight': 'bold'}  
     )
 
-    # Calculate total returns
-    returns = filtered_df[filtered_df['Revenue'] < 0]
+    # Total returns
     total_returns_value = html.Span(
-        f"-£{-1*returns['Revenue'].sum():,.2f}",
+        f"-£{-1*kpis['total_returns']:,.2f}",
         style={'color': '#9A2A2A', 'fontWeight': 'bold'}  
     )
 
@@ -381,14 +349,7 @@ def update_cards(start_date, end_date, selected_countries):
     return card_loyal_customer_ratio_content, card_loyal_customer_sales_content, card_net_sales_content, card_total_returns_content
 
 
-
-@callback(
-    Output('other-countries-store', 'data'),  # Store list of "Others" countries
-    Input('date-picker-range', 'start_date'),
-    Input('date-picker-range', 'end_date'),
-    Input('other-countries-store', 'data')
-)
-
+@metrics.instrument
 def compute_other_countries(start_date, end_date, store):
     """
     Identifies and returns a list of countries classified under the "Others" category. 
@@ -409,26 +370,12 @@ def compute_other_countries(start_date, end_date, store):
     list
         A list of country names that are outside the top 5 in sales, excluding the United Kingdom.
     """
-    # Exclude the United Kingdom
-    df_no_uk = df[df['Country'] != 'United Kingdom']
+    # The same split as the pie chart
+    return compute_country_shares(start_date, end_date)['others']
 
-    df_no_uk = df_no_uk[(df_no_uk['InvoiceDate'] >= pd.to_datetime(start_date)) & 
-                        (df_no_uk['InvoiceDate'] <= pd.to_datetime(end_date))]
-    
-    # Count occurrences of each country and reset index
-    country_counts = df_no_uk['Country'].value_counts().reset_index()
-    country_counts.columns = ['Country', 'Count']
-    
-    # Get the list of "Others" countries
-    other_countries = country_counts.iloc[5:]['Country'].tolist()
 
-    return other_countries  # Return only the list
-
-@callback(
-    Output('selected-country-store', 'data'),  # Store selected country
-    Input('country-pie-chart', 'signalData')  # Capture Vega selection
-)
-@cache.memoize()
+# Not cached: the arguments are arbitrary Vega signal dicts, and reading them
+# is cheaper than a cache lookup
 def store_selected_country(signalData):
     """
     Extracts and stores the selected country from the pie chart interaction. 
@@ -446,26 +393,21 @@ def store_selected_country(signalData):
         The name of the selected country if a valid selection was made. 
         Returns None if no selection is detected.
     """
-    print(f'store_selected_country {signalData}')  # Debugging output
+    logger.debug('Pie chart signal: %s', signalData)
     
     if signalData and "selected_country" in signalData:
         selected_data = signalData["selected_country"]
         
         if "Country" in selected_data and isinstance(selected_data["Country"], list):
             selected_country = selected_data["Country"][0]  # Extract first country in the list
-            print(f"Extracted Country: {selected_country}")  # Debugging output
+            logger.debug('Selected country: %s', selected_country)
             
             return selected_country  # Store only the name (not the full list)
         
     return None  # Default to None if nothing is clicked
 
-@callback(
-    Output('country-dropdown', 'value'),
-    Input('selected-country-store', 'data'),  # Read from stored selection
-    Input('other-countries-store', 'data'),  # Read from stored "Others" countries
-    State('country-dropdown', 'value')
-)
-@cache.memoize()
+
+# Not cached, like store_selected_country: it only picks one of its arguments
 def update_country_dropdown(selected_country, other_countries, dropdown_value):
     """
     Updates the country dropdown based on the selected country from the pie chart. 
@@ -487,9 +429,8 @@ def update_country_dropdown(selected_country, other_countries, dropdown_value):
         the dropdown will be set to contain all non-top-5 countries. If no selection is 
         made, the dropdown retains its previous value.
     """
-    print(f"Dropdown Updated - selected_country: {selected_country}")  # Debugging output
-    print(f"Dropdown Updated - other_countries: {other_countries}")  # Debugging output
-    print(f"Dropdown Updated - dropdown_value: {dropdown_value}")  # Debugging output
+    logger.debug('Dropdown update: selected_country=%s, other_countries=%s, dropdown_value=%s',
+                 selected_country, other_countries, dropdown_value)
 
     if selected_country is None:
         selected_country = None
@@ -501,3 +442,105 @@ def update_country_dropdown(selected_country, other_countries, dropdown_value):
     
     return [selected_country] # Ensure it's a list (Dropdown expects a list)
 
+
+@callback(
+    output=dict(
+        monthly_revenue=(Output('monthly-revenue', 'spec'), Output('monthly-revenue-template', 'data')),
+        stacked=(Output('stacked-chart', 'spec'), Output('stacked-chart-template', 'data')),
+        top_products=(Output('product-bar-chart', 'spec'), Output('product-bar-chart-template', 'data')),
+        country_pie=(Output('country-pie-chart', 'spec'), Output('country-pie-chart-template', 'data')),
+        cards=(
+            Output('card-loyal-customer-ratio', 'children'),
+            Output('card-loyal-customer-sales', 'children'),
+            Output('card-net-sales', 'children'),
+            Output('card-total-returns', 'children'),
+        ),
+        countries=Output('country-dropdown', 'value'),
+    ),
+    inputs=dict(
+        start_date=Input('date-picker-range', 'start_date'),
+        end_date=Input('date-picker-range', 'end_date'),
+        selected_countries=Input('country-dropdown', 'value'),
+        signal_data=Input('country-pie-chart', 'signalData'),  # Capture Vega selection
+        granularity=Input('granularity', 'value'),
+    ),
+    state=dict(
+        rendered=dict(
+            monthly_revenue=State('monthly-revenue-template', 'data'),
+            stacked=State('stacked-chart-template', 'data'),
+            top_products=State('product-bar-chart-template', 'data'),
+            country_pie=State('country-pie-chart-template', 'data'),
+        ),
+    ),
+)
+@metrics.instrument(expected=(PreventUpdate,))
+def update_dashboard(start_date, end_date, selected_countries, signal_data, granularity, rendered):
+    """
+    Updates every output affected by a filter change or a pie chart click in
+    a single round-trip, so no callback is triggered by another one.
+
+    A pie chart click sets the dropdown to the clicked country (or to the
+    "Others" countries) and updates the charts and cards for it. A date change
+    updates everything, a dropdown change everything but the pie chart, which
+    does not depend on the selected countries. A granularity change only
+    updates the revenue trend.
+
+    Parameters:
+    ----------
+    start_date : str
+        The selected start date from the date picker (in YYYY-MM-DD format).
+    end_date : str
+        The selected end date from the date picker (in YYYY-MM-DD format).
+    selected_countries : list
+        The countries selected in the dropdown.
+    signal_data : dict or None
+        The Vega signals of the pie chart, see `store_selected_country`.
+    granularity : str
+        The period of the revenue trend: 'month', 'week' or 'day'.
+    rendered : dict
+        The template version each chart shows, see `src.specs.spec_update`.
+
+    Returns:
+    -------
+    dict
+        The chart specs (or patches) with their template versions, the card
+        contents and the dropdown value.
+    """
+    from .specs import spec_update
+
+    outputs = {
+        'monthly_revenue': (no_update, no_update),
+        'stacked': (no_update, no_update),
+        'top_products': (no_update, no_update),
+        'country_pie': (no_update, no_update),
+        'cards': (no_update,) * 4,
+        'countries': no_update,
+    }
+    trigger = ctx.triggered_id
+
+    if trigger == 'granularity':
+        outputs['monthly_revenue'] = spec_update(
+            plot_monthly_revenue_chart(start_date, end_date, selected_countries, granularity),
+            rendered['monthly_revenue'])
+        return outputs
+
+    if trigger == 'country-pie-chart':
+        selected_country = store_selected_country(signal_data)
+        if selected_country is None:
+            raise PreventUpdate
+        other_countries = compute_other_countries(start_date, end_date, None) if selected_country == 'Others' else []
+        selected_countries = update_country_dropdown(selected_country, other_countries, selected_countries)
+        outputs['countries'] = selected_countries
+    elif trigger != 'country-dropdown':
+        # Initial call or date change
+        outputs['country_pie'] = spec_update(plot_top_countries_pie_chart(start_date, end_date), rendered['country_pie'])
+
+    outputs['monthly_revenue'] = spec_update(
+        plot_monthly_revenue_chart(start_date, end_date, selected_countries, granularity),
+        rendered['monthly_revenue'])
+    outputs['stacked'] = spec_update(
+        plot_stacked_chart(start_date, end_date, selected_countries), rendered['stacked'])
+    outputs['top_products'] = spec_update(
+        plot_top_products_revenue(start_date, end_date, selected_countries), rendered['top_products'])
+    outputs['cards'] = update_cards(start_date, end_date, selected_countries)
+    return outputs
@@ -1,29 +1,43 @@
-from dash import dcc, html
+from dash import dcc
 import dash_bootstrap_components as dbc
-import dash_vega_components as dvc
-import pandas as pd
 
-from .data import df
 
 # Date Picker Range
-date_picker_range = dcc.DatePickerRange(
-    id='date-picker-range',
-    start_date=df['InvoiceDate'].min().strftime('%Y-%m-%d'),
-    end_date=df['InvoiceDate'].max().strftime('%Y-%m-%d'),
-    min_date_allowed=pd.to_datetime('2010-12-01'), 
-    max_date_allowed=pd.to_datetime('2011-12-31'),
-    display_format='YYYY-MM-DD',
-    style={'width': '100%'},  # Set width to match the parent
-)
+def date_picker_range(metadata):
+    """Date range picker spanning the dataset, see `src.data.load_metadata`."""
+    return dcc.DatePickerRange(
+        id='date-picker-range',
+        start_date=metadata['start_date'],
+        end_date=metadata['end_date'],
+        min_date_allowed='2010-12-01',
+        max_date_allowed='2011-12-31',
+        display_format='YYYY-MM-DD',
+        style={'width': '100%'},  # Set width to match the parent
+    )
 
 # Country Dropdown
-country_dropdown = dcc.Dropdown(
-    id='country-dropdown',
-    options=[{'label': country, 'value': country} for country in df['Country'].unique()],
-    value=['United Kingdom'],  # Default to the UK as a list
-    multi=True,
-    placeholder="Select Country",
-    style={'padding': '10px', 'font-size': '12px'}
+def country_dropdown(metadata):
+    """Country dropdown listing the countries of the dataset, see `src.data.load_metadata`."""
+    return dcc.Dropdown(
+        id='country-dropdown',
+        options=[{'label': country, 'value': country} for country in metadata['countries']],
+        value=['United Kingdom'],  # Default to the UK as a list
+        multi=True,
+        placeholder="Select Country",
+        style={'padding': '10px', 'font-size': '12px'}
+    )
+
+# Granularity of the revenue trend
+granularity_radio = dbc.RadioItems(
+    id='granularity',
+    options=[
+        {'label': 'Month', 'value': 'month'},
+        {'label': 'Week', 'value': 'week'},
+        {'label': 'Day', 'value': 'day'},
+    ],
+    value='month',
+    inline=True,
+    style={'marginTop': '20px', 'font-size': '12px'}
 )
 
 # Cards
@@ -86,28 +100,25 @@ cards_layout = dbc.Row(
     style={'marginTop': '20px'}  # Add 20px space above the cards
 )
 
-# Charts
-product_bar_chart = dvc.Vega(
-    id='product-bar-chart',
-    spec={},
-    style={'width': '100%', 'marginTop': '20px'}
-)
+# Charts (dash_vega_components is imported when the layout is built)
+def _vega_chart(chart_id, **kwargs):
+    import dash_vega_components as dvc
 
-country_pie_chart = dvc.Vega(
-    id='country-pie-chart',
-    signalsToObserve=["selected_country"],
-    spec={},
-    style={'width': '100%', 'marginTop': '20px'}
-)
+    return dvc.Vega(
+        id=chart_id,
+        spec={},
+        style={'width': '100%', 'marginTop': '20px'},
+        **kwargs
+    )
 
-stacked_chart = dvc.Vega(
-    id='stacked-chart',
-    spec={},
-    style={'width': '100%', 'marginTop': '20px'}
-)
+def product_bar_chart():
+    return _vega_chart('product-bar-chart')
 
-monthly_revenue_chart = dvc.Vega(
-    id='monthly-revenue', 
-    spec={},
-    style={'width': '100%', 'marginTop': '20px'}
-)
+def country_pie_chart():
+    return _vega_chart('country-pie-chart', signalsToObserve=["selected_country"])
+
+def stacked_chart():
+    return _vega_chart('stacked-chart')
+
+def monthly_revenue_chart():
+    return _vega_chart('monthly-revenue')
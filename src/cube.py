@@ -0,0 +1,262 @@
+import numpy as np
+import pandas as pd
+
+from .filters import get_frame_index
+from .kernels import encode, group_sum
+from .metrics import metrics
+from .schema import month_keys, month_label, revenue_pence, to_pounds
+
+# Metrics materialized for every (day, country) cell
+METRICS = ['gross', 'refunds', 'net', 'returns', 'loyal', 'lines']
+
+# Period column of the roll-ups at every granularity. Months are labelled
+# 'Jan-2011', weeks by their Monday and days by their date ('2011-01-03')
+GRANULARITIES = {'month': 'MonthYear', 'week': 'Week', 'day': 'Day'}
+
+
+class MetricsCube:
+    """
+    Dense (day x country) cube of the revenue metrics used by the cards and
+    the revenue charts, built once from the invoice lines.
+
+    The cube holds, for every day and country:
+        - gross: revenue of the lines with a positive quantity
+        - refunds: revenue of the lines with a negative quantity (negative)
+        - net: total revenue, including refunds
+        - returns: revenue of the lines with a negative revenue (negative)
+        - loyal: revenue of the lines with a known CustomerID
+        - lines: number of invoice lines
+
+    Money is accumulated in integer pence, so totals are exact whatever the
+    summation order, and converted to pounds when queried.
+
+    Queries slice the day axis and sum over the selected countries, so their
+    cost depends on the number of days and countries, not on the number of
+    invoice lines. Range totals go through per-country prefix sums over the
+    day axis and cost two lookups and a subtraction per selected country.
+    The cube assumes 'InvoiceDate' holds dates (no time of day), which is
+    how the processed dataset is stored.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame
+        The invoice lines. It must contain 'InvoiceDate', 'Country',
+        'Quantity', 'Revenue' (or 'RevenuePence') and 'CustomerID'.
+    """
+
+    def __init__(self, frame):
+        country_codes, countries = pd.factorize(frame['Country'], sort=True)
+        self.countries = list(countries)
+        self._country_index = {country: i for i, country in enumerate(self.countries)}
+
+        days = frame['InvoiceDate'].to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+        first_day = days.min() if len(days) else np.datetime64('1970-01-01', 'D')
+        n_days = int((days.max() - first_day).astype(int)) + 1 if len(days) else 0
+        self.days = pd.date_range(first_day, periods=n_days, freq='D')
+        self._day_values = self.days.to_numpy()
+        day_codes = (days - first_day).astype(np.int64)
+
+        # Period of every day of the cube at every granularity, as integer
+        # codes from 0, with the label of every code
+        self._periods = _periods(self._day_values)
+        self._day_months, self._month_labels = self._periods['month']
+        # First day of every month on the day axis, plus the end of the axis
+        self.month_starts = np.r_[np.flatnonzero(np.diff(self._day_months, prepend=-1)), n_days]
+
+        # Integer pence held in float64 stay exact up to 2**53 pence
+        revenue = revenue_pence(frame).astype(np.float64)
+        quantity = frame['Quantity'].to_numpy()
+        weights = {
+            'gross': np.where(quantity > 0, revenue, 0.0),
+            'refunds': np.where(quantity < 0, revenue, 0.0),
+            'net': revenue,
+            'returns': np.where(revenue < 0, revenue, 0.0),
+            'loyal': np.where(frame['CustomerID'].notna().to_numpy(), revenue, 0.0),
+            'lines': None,
+        }
+
+        n_countries = len(self.countries)
+        cells = day_codes * n_countries + country_codes
+        self.values = np.empty((len(METRICS), n_days, n_countries), dtype=np.float64)
+        for i, metric in enumerate(METRICS):
+            self.values[i] = group_sum(cells, weights[metric], n_days * n_countries).reshape(n_days, n_countries)
+
+        # cumulative[:, d, c] is the total of days [0, d) for country c
+        self.cumulative = np.zeros((len(METRICS), n_days + 1, n_countries), dtype=np.float64)
+        np.cumsum(self.values, axis=1, out=self.cumulative[:, 1:])
+
+    @metrics.timed('filter')
+    def day_bounds(self, start_date, end_date):
+        """
+        Returns the (lo, hi) slice of the day axis between `start_date` and
+        `end_date`, both inclusive.
+        """
+        lo = self._day_values.searchsorted(_to_datetime64(start_date), side='left')
+        hi = self._day_values.searchsorted(_to_datetime64(end_date), side='right')
+        return int(lo), int(max(lo, hi))
+
+    def day_codes(self, dates):
+        """Returns the position on the day axis of each date in `dates`."""
+        days = np.asarray(dates, dtype='datetime64[ns]').astype('datetime64[D]')
+        return (days - self._day_values[:1].astype('datetime64[D]')).astype(np.int64)
+
+    @metrics.timed('filter')
+    def country_indices(self, countries=None, exclude=None):
+        """
+        Returns the positions on the country axis of the selected countries.
+        Countries absent from the data are ignored.
+        """
+        selected = self.countries if countries is None else countries
+        excluded = set(exclude) if exclude else set()
+        return np.array(sorted({self._country_index[country] for country in selected
+                                if country in self._country_index and country not in excluded}),
+                        dtype=np.int64)
+
+    def totals(self, start_date, end_date, countries=None, exclude=None):
+        """
+        Returns the totals of every metric over the date range (inclusive)
+        and the selected countries.
+
+        Parameters:
+        ----------
+        start_date : str
+            The selected start date (in YYYY-MM-DD format).
+        end_date : str
+            The selected end date (in YYYY-MM-DD format).
+        countries : list or None, optional
+            The selected countries. None keeps every country.
+        exclude : list or None, optional
+            Countries to leave out.
+
+        Returns:
+        -------
+        dict
+            The total of each metric in METRICS.
+        """
+        lo, hi = self.day_bounds(start_date, end_date)
+        columns = self.country_indices(countries, exclude)
+        sums = (self.cumulative[:, hi, columns] - self.cumulative[:, lo, columns]).sum(axis=1)
+        return {metric: total if metric == 'lines' else to_pounds(total)
+                for metric, total in zip(METRICS, sums.tolist())}
+
+    def by_country(self, start_date, end_date, metric='lines', exclude=None):
+        """
+        Returns the totals of `metric` per country over the date range
+        (inclusive). Countries without any invoice line are left out.
+
+        Returns:
+        -------
+        pandas.Series
+            The totals indexed by 'Country', in country order.
+        """
+        lo, hi = self.day_bounds(start_date, end_date)
+        columns = self.country_indices(exclude=exclude)
+        lines = self.cumulative[METRICS.index('lines'), hi, columns] - self.cumulative[METRICS.index('lines'), lo, columns]
+        totals = self.cumulative[METRICS.index(metric), hi, columns] - self.cumulative[METRICS.index(metric), lo, columns]
+
+        if metric != 'lines':
+            totals = to_pounds(totals)
+
+        present = lines > 0
+        return pd.Series(totals[present],
+                         index=pd.Index([self.countries[i] for i in columns[present]], name='Country'),
+                         name=metric)
+
+    def monthly(self, start_date, end_date, countries=None, metric='net'):
+        """
+        Returns the monthly totals of `metric` over the date range (inclusive)
+        and the selected countries, see `series`.
+        """
+        return self.series(start_date, end_date, countries, metric, 'month')
+
+    def series(self, start_date, end_date, countries=None, metric='net', granularity='month'):
+        """
+        Returns the totals of `metric` per period over the date range
+        (inclusive) and the selected countries, in chronological order.
+        Periods without any invoice line are left out.
+
+        Days are rolled up with a bincount over their precomputed integer
+        period codes, and the labels are looked up for the periods present.
+
+        Parameters:
+        ----------
+        start_date : str
+            The selected start date (in YYYY-MM-DD format).
+        end_date : str
+            The selected end date (in YYYY-MM-DD format).
+        countries : list or None, optional
+            The selected countries. None keeps every country.
+        metric : str, optional
+            One of METRICS, default is 'net'.
+        granularity : str, optional
+            'month' (default), 'week' (starting on Mondays) or 'day'.
+
+        Returns:
+        -------
+        pandas.Series
+            The totals indexed by the period labels, e.g. 'Jan-2011' in a
+            'MonthYear' index, see GRANULARITIES.
+        """
+        codes, labels = self._periods[granularity]
+        lo, hi = self.day_bounds(start_date, end_date)
+        columns = self.country_indices(countries)
+        daily = self.values[:, lo:hi][:, :, columns].sum(axis=2)
+
+        periods = codes[lo:hi]
+        lines = group_sum(periods, daily[METRICS.index('lines')], len(labels))
+        totals = group_sum(periods, daily[METRICS.index(metric)], len(labels))
+
+        if metric != 'lines':
+            totals = to_pounds(totals)
+
+        present = np.flatnonzero(lines > 0)
+        return pd.Series(totals[present],
+                         index=pd.Index([labels[i] for i in present], name=GRANULARITIES[granularity]),
+                         name=metric)
+
+
+def _periods(days):
+    # (codes, labels) of the month, week and day of every day, built from
+    # integer keys so every label is formatted once
+    day_numbers = days.astype('datetime64[D]').astype(np.int64)
+    keys = {
+        'month': month_keys(days).astype(np.int64),
+        # 1970-01-01 is a Thursday, so weeks start on Mondays
+        'week': (day_numbers + 3) // 7,
+        'day': day_numbers,
+    }
+    label = {
+        'month': lambda key: month_label(int(key)),
+        'week': lambda key: str(np.datetime64(int(key) * 7 - 3, 'D')),
+        'day': lambda key: str(np.datetime64(int(key), 'D')),
+    }
+    periods = {}
+    for granularity, period_keys in keys.items():
+        unique_keys, codes = encode(period_keys)
+        periods[granularity] = (codes, [label[granularity](key) for key in unique_keys])
+    return periods
+
+
+def _to_datetime64(date):
+    # np.datetime64 parses ISO dates much faster than pd.to_datetime
+    try:
+        return np.datetime64(date, 'ns')
+    except ValueError:
+        return pd.to_datetime(date).to_datetime64()
+
+
+def get_cube(frame):
+    """
+    Returns the shared MetricsCube of a frame, building it on first use.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame
+        The invoice lines.
+
+    Returns:
+    -------
+    MetricsCube
+        The cube built from `frame`.
+    """
+    return get_frame_index(frame, 'cube', MetricsCube)
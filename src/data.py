@@ -1,7 +1,350 @@
-import pandas as pd
+import hashlib
+import json
+import os
+import threading
 
-# Read parquet file 
-df = pd.read_parquet('data/processed/processed_data.parquet')
+# pandas, pyarrow and the indexes are imported when the dataset is first
+# loaded, so importing the app stays cheap
 
-# Ensure 'InvoiceDate' is converted to datetime format
-df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
+# Processed dataset produced by notebooks/format_data.ipynb
+DATA_PATH = 'data/processed/processed_data.parquet'
+
+# When set, every worker memory-maps one shared Arrow IPC copy of the dataset
+# instead of decoding the parquet file into its own memory
+MMAP = os.environ.get('RETAILENSE_MMAP', '').lower() in ('1', 'true', 'yes')
+
+
+def load_data(path=DATA_PATH, mmap=MMAP):
+    """
+    Reads the processed parquet file and prepares it for the callbacks.
+
+    Parameters:
+    ----------
+    path : str, optional
+        The path of the processed parquet file.
+    mmap : bool, optional
+        Whether to memory-map the Arrow IPC copy of the dataset (see
+        `load_arrow`) instead of reading the parquet file, default is the
+        RETAILENSE_MMAP environment variable.
+
+    Returns:
+    -------
+    pandas.DataFrame
+        The invoice lines with the compact schema of `src.schema.compact`,
+        in the order of the file.
+    """
+    import pandas as pd
+
+    if mmap:
+        return load_arrow(path)
+
+    # Read parquet file
+    return prepare_data(pd.read_parquet(path))
+
+
+def prepare_data(data):
+    """
+    Prepares invoice lines in the processed format for the callbacks, see
+    `load_data`.
+
+    Parameters:
+    ----------
+    data : pandas.DataFrame
+        The invoice lines, e.g. read from the processed parquet file.
+
+    Returns:
+    -------
+    pandas.DataFrame
+        The invoice lines with the compact schema, in their input order.
+    """
+    import pandas as pd
+
+    from .schema import compact
+
+    # Ensure 'InvoiceDate' is converted to datetime format
+    data['InvoiceDate'] = pd.to_datetime(data['InvoiceDate'])
+
+    # Categorical strings, int32 quantities and integer pence
+    return compact(data)
+
+
+def arrow_path(path=DATA_PATH):
+    """Returns the path of the Arrow IPC copy of a processed parquet file."""
+    return os.path.splitext(path)[0] + '.arrow'
+
+
+def write_arrow(frame, path):
+    """
+    Writes a loaded frame to an uncompressed Arrow IPC (Feather v2) file.
+
+    The file is written next to its final path and renamed into place, so
+    workers starting concurrently never map a partially written file.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame
+        The invoice lines, as returned by `load_data`.
+    path : str
+        The Arrow IPC file to write.
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_arrow(path=DATA_PATH):
+    """
+    Memory-maps the Arrow IPC copy of the processed dataset, writing it
+    first when it is missing or older than the parquet file.
+
+    The columns of the returned frame are read-only views over the mapped
+    file, so every process mapping it shares the same pages of the OS page
+    cache and a worker starts without decoding the dataset. Only the
+    nullable 'CustomerID' column is copied, because pandas keeps its null
+    mask as a separate boolean array.
+
+    Parameters:
+    ----------
+    path : str, optional
+        The path of the processed parquet file.
+
+    Returns:
+    -------
+    pandas.DataFrame
+        The invoice lines, as returned by `load_data`.
+    """
+    import pyarrow as pa
+
+    target = arrow_path(path)
+    if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(path):
+        write_arrow(load_data(path, mmap=False), target)
+
+    with pa.memory_map(target, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    # The table's buffers keep the mapping alive after the file is closed
+    return table.to_pandas(split_blocks=True)
+
+
+def metadata_path(path=DATA_PATH):
+    """Returns the path of the metadata sidecar of a processed parquet file."""
+    return os.path.splitext(path)[0] + '.meta.json'
+
+
+def frame_metadata(frame):
+    """
+    Describes a loaded frame with the bounds the layout needs.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame
+        The invoice lines.
+
+    Returns:
+    -------
+    dict
+        The first and last 'start_date' and 'end_date' (in YYYY-MM-DD
+        format), the sorted 'countries' and the number of 'rows'.
+    """
+    import pandas as pd
+
+    dates = pd.to_datetime(frame['InvoiceDate'])
+    return {
+        'start_date': dates.min().strftime('%Y-%m-%d'),
+        'end_date': dates.max().strftime('%Y-%m-%d'),
+        'countries': sorted(str(country) for country in frame['Country'].dropna().unique()),
+        'rows': len(frame),
+    }
+
+
+def write_metadata(path=DATA_PATH):
+    """
+    Writes the metadata sidecar of a processed parquet file, reading only
+    its 'InvoiceDate' and 'Country' columns.
+
+    Parameters:
+    ----------
+    path : str, optional
+        The path of the processed parquet file.
+
+    Returns:
+    -------
+    dict
+        The metadata, as returned by `frame_metadata`.
+    """
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path, columns=['InvoiceDate', 'Country'])
+    bounds = pc.min_max(table['InvoiceDate'])
+    countries = pc.unique(table['Country'].cast('string')).drop_null()
+    metadata = {
+        'start_date': bounds['min'].as_py().strftime('%Y-%m-%d') if table.num_rows else None,
+        'end_date': bounds['max'].as_py().strftime('%Y-%m-%d') if table.num_rows else None,
+        'countries': sorted(countries.to_pylist()),
+        'rows': table.num_rows,
+    }
+
+    # Renamed into place, like the Arrow copy, so readers never see a partial file
+    target = metadata_path(path)
+    tmp_path = f'{target}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(metadata, file, indent=2)
+    os.replace(tmp_path, target)
+    return metadata
+
+
+def load_metadata(path=DATA_PATH):
+    """
+    Reads the metadata sidecar of a processed parquet file, writing it first
+    when it is missing or older than the parquet file, so the layout is built
+    without loading the dataset.
+
+    Parameters:
+    ----------
+    path : str, optional
+        The path of the processed parquet file.
+
+    Returns:
+    -------
+    dict
+        The metadata, as returned by `frame_metadata`.
+    """
+    target = metadata_path(path)
+    if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(path):
+        return write_metadata(path)
+    with open(target) as file:
+        return json.load(file)
+
+
+# Dataset answered by the callbacks, loaded from `_data_path` on first use,
+# and the version of the file it was loaded from (None for injected frames)
+_data = None
+_data_path = DATA_PATH
+_data_version = None
+_data_lock = threading.Lock()
+
+
+def set_data(frame=None, path=DATA_PATH):
+    """
+    Sets the dataset answered by the callbacks.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame or None, optional
+        The invoice lines. None loads them from `path` on first use. The
+        DuckDB backend only reads `path`, so it refuses to answer from a
+        frame (see `src.backends.get_backend`).
+    path : str, optional
+        The path of the processed parquet file, also read by the DuckDB
+        backend.
+    """
+    global _data, _data_path, _data_version
+    with _data_lock:
+        _data = frame
+        _data_path = path
+        _data_version = None
+
+
+def get_data():
+    """
+    Returns the dataset answered by the callbacks, loading it on first use.
+
+    Returns:
+    -------
+    pandas.DataFrame
+        The invoice lines, as returned by `load_data`.
+    """
+    global _data, _data_version
+    with _data_lock:
+        if _data is None:
+            # Read before loading, so a file replaced meanwhile gets a new version
+            _data_version = file_version(_data_path)
+            _data = load_data(_data_path)
+        return _data
+
+
+def fingerprint(frame):
+    """
+    Returns a short content fingerprint of a frame, changing whenever any
+    value, column or dtype changes.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame
+        The invoice lines.
+
+    Returns:
+    -------
+    str
+        A 16 hexadecimal digit fingerprint.
+    """
+    import pandas as pd
+
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(repr([(str(name), str(dtype)) for name, dtype in frame.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def file_version(path):
+    """
+    Returns a short version of a file, changing whenever the file is
+    rewritten (its size or modification time changes), without reading it.
+
+    Parameters:
+    ----------
+    path : str
+        The path of the file.
+
+    Returns:
+    -------
+    str
+        A 16 hexadecimal digit version.
+    """
+    stat = os.stat(path)
+    return hashlib.blake2b(f'{stat.st_size}:{stat.st_mtime_ns}'.encode(), digest_size=8).hexdigest()
+
+
+def data_version():
+    """
+    Returns the version of the dataset answered by the callbacks, used to
+    namespace cached results. A dataset read from a parquet file is
+    versioned by the file (see `file_version`), so the DuckDB backend never
+    loads or hashes it; a frame set with `set_data` by its fingerprint.
+
+    The file version does not depend on the content: rewriting the file with
+    identical content changes it, and a frame set with `set_data` never
+    shares the version of the file it was read from. Either way the cached
+    results are only computed again, never served stale.
+    """
+    frame, version = _data, _data_version
+    if frame is None:
+        return file_version(_data_path)
+    if version is None:
+        from .filters import get_frame_index
+
+        return get_frame_index(frame, 'fingerprint', fingerprint)
+    return version
+
+
+def injected_data():
+    """
+    Returns the frame set with `set_data`, or None when the dataset is read
+    from its parquet file.
+    """
+    frame, version = _data, _data_version
+    return frame if version is None else None
+
+
+def data_path():
+    """Returns the path of the processed parquet file the dataset comes from."""
+    return _data_path
@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+from .cube import get_cube
+from .filters import get_frame_index
+from .kernels import distinct_count
+
+# HyperLogLog precision: 2**10 registers per cell, ~3% standard error
+HLL_PRECISION = 10
+
+
+class DistinctIndex:
+    """
+    Exact distinct-count index of the customers and of the anonymous invoices
+    (lines without a CustomerID) of every (day, country) cell.
+
+    Customer and invoice ids are mapped to dense integer codes, and the sorted
+    unique codes of every cell are stored back to back, country by country and
+    day by day. The codes of a country over a date range are therefore one
+    contiguous slice, and a distinct count over any (countries, date range)
+    filter is the size of the union of a few slices, computed with a bitset
+    instead of rehashing raw rows.
+
+    An approximate mode answers from per-cell HyperLogLog sketches instead,
+    whose cost does not grow with the number of distinct ids in the range.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame
+        The invoice lines. It must contain 'InvoiceDate', 'Country',
+        'CustomerID' and 'InvoiceNo'.
+    """
+
+    def __init__(self, frame):
+        self._cube = get_cube(frame)
+        n_days = len(self._cube.days)
+        self._n_days = n_days
+
+        day_codes = self._cube.day_codes(frame['InvoiceDate'])
+        country_codes = pd.Categorical(frame['Country'], categories=self._cube.countries).codes
+        # Country-major cells, so one country's days are contiguous
+        cells = country_codes.astype(np.int64) * n_days + day_codes
+        n_cells = len(self._cube.countries) * n_days
+
+        known = frame['CustomerID'].notna().to_numpy()
+        customer_codes, customers = pd.factorize(frame['CustomerID'])
+        invoice_codes, invoices = pd.factorize(frame['InvoiceNo'])
+
+        self._sets = {
+            'customers': _CellSets(cells[known], customer_codes[known], n_cells, len(customers)),
+            'anonymous_invoices': _CellSets(cells[~known], invoice_codes[~known], n_cells, len(invoices)),
+        }
+
+    def counts(self, start_date, end_date, countries=None, approximate=False):
+        """
+        Returns the number of distinct customers and of distinct anonymous
+        invoices over the date range (inclusive) and the selected countries.
+
+        Parameters:
+        ----------
+        start_date : str
+            The selected start date (in YYYY-MM-DD format).
+        end_date : str
+            The selected end date (in YYYY-MM-DD format).
+        countries : list or None, optional
+            The selected countries. None keeps every country.
+        approximate : bool, optional
+            Whether to estimate the counts with HyperLogLog, default is False.
+
+        Returns:
+        -------
+        dict
+            The 'customers' and 'anonymous_invoices' counts.
+        """
+        lo, hi = self._cube.day_bounds(start_date, end_date)
+        first_cells = self._cube.country_indices(countries) * self._n_days
+        ranges = [(cell + lo, cell + hi) for cell in first_cells.tolist() if hi > lo]
+        return {
+            name: cell_sets.estimate(ranges) if approximate else cell_sets.count(ranges)
+            for name, cell_sets in self._sets.items()
+        }
+
+
+class _CellSets:
+    # The sorted unique codes of every cell, stored back to back (CSR layout)
+
+    def __init__(self, cells, codes, n_cells, n_codes):
+        n_codes = max(n_codes, 1)
+        pairs = np.unique(cells * n_codes + codes)
+        self.cells = pairs // n_codes
+        self.codes = pairs % n_codes
+        self.offsets = np.searchsorted(self.cells, np.arange(n_cells + 1))
+        self.n_codes = n_codes
+        self._registers = None
+
+    def count(self, ranges):
+        return distinct_count([self.codes[self.offsets[first]:self.offsets[last]] for first, last in ranges],
+                              self.n_codes)
+
+    def estimate(self, ranges):
+        if self._registers is None:
+            self._build_sketches()
+        m = 1 << HLL_PRECISION
+        registers = np.zeros(m, dtype=np.uint8)
+        for first, last in ranges:
+            slots = self._slots[first:last]
+            slots = slots[slots >= 0]
+            if len(slots):
+                np.maximum(registers, self._registers[slots].max(axis=0), out=registers)
+
+        # HyperLogLog estimate with the linear-counting correction for small sets
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)))
+        zeros = np.count_nonzero(registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def _build_sketches(self):
+        # One sketch per non-empty cell; empty cells map to slot -1
+        non_empty = np.flatnonzero(np.diff(self.offsets))
+        self._slots = np.full(len(self.offsets) - 1, -1, dtype=np.int64)
+        self._slots[non_empty] = np.arange(len(non_empty))
+
+        hashes = _hash64(self.codes.astype(np.uint64))
+        buckets = (hashes >> np.uint64(64 - HLL_PRECISION)).astype(np.int64)
+        ranks = _leading_zeros(hashes << np.uint64(HLL_PRECISION), 64 - HLL_PRECISION) + 1
+
+        registers = np.zeros((len(non_empty), 1 << HLL_PRECISION), dtype=np.uint8)
+        np.maximum.at(registers, (self._slots[self.cells], buckets), ranks.astype(np.uint8))
+        self._registers = registers
+
+
+def _hash64(values):
+    # splitmix64 finalizer, mixes dense codes into uniformly distributed bits
+    with np.errstate(over='ignore'):
+        values = values + np.uint64(0x9E3779B97F4A7C15)
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return values ^ (values >> np.uint64(31))
+
+
+def _leading_zeros(values, limit):
+    # Number of leading zero bits of each uint64, capped at `limit`
+    zeros = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        empty = (values >> np.uint64(64 - shift)) == 0
+        zeros[empty] += shift
+        values = np.where(empty, values << np.uint64(shift), values)
+    zeros[values == 0] = 64
+    return np.minimum(zeros, limit)
+
+
+def get_distinct_index(frame):
+    """
+    Returns the shared DistinctIndex of a frame, building it on first use.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame
+        The invoice lines.
+
+    Returns:
+    -------
+    DistinctIndex
+        The index built from `frame`.
+    """
+    return get_frame_index(frame, 'distinct', DistinctIndex)
@@ -0,0 +1,204 @@
+"""
+Streaming ETL turning the raw Online Retail CSV into the processed parquet
+dataset read by the dashboard.
+
+Usage:
+    python -m src.etl [--input data/raw/online_retail.csv]
+                      [--output data/processed/processed_data.parquet]
+                      [--chunksize 250000]
+
+The raw file is read in bounded-memory chunks and every derived column is
+computed vectorized. Rows are first spilled to one temporary parquet file
+per month, then each month is sorted by date and country and written as its
+own row group(s), so the output is globally sorted, every row group covers a
+single month, and the column statistics let readers skip row groups by date.
+Only one month of data is held in memory at a time. The metadata sidecar
+read by the dashboard layout is written next to the output.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .data import write_metadata
+from .schema import month_keys, month_label
+
+RAW_PATH = 'data/raw/online_retail.csv'
+PROCESSED_PATH = 'data/processed/processed_data.parquet'
+
+# Explicit dtypes so chunks never fall back to inference
+RAW_DTYPES = {
+    'InvoiceNo': 'string',
+    'StockCode': 'string',
+    'Description': 'string',
+    'Quantity': 'int64',
+    'InvoiceDate': 'string',
+    'UnitPrice': 'float64',
+    'CustomerID': 'float64',
+    'Country': 'string',
+}
+
+# Schema of the processed dataset, as produced by notebooks/format_data.ipynb
+SCHEMA = pa.schema([
+    ('InvoiceNo', pa.string()),
+    ('StockCode', pa.string()),
+    ('Description', pa.string()),
+    ('Quantity', pa.int64()),
+    ('InvoiceDate', pa.date32()),
+    ('UnitPrice', pa.float64()),
+    ('CustomerID', pa.float64()),
+    ('Country', pa.string()),
+    ('Revenue', pa.float64()),
+    ('MonthYear', pa.string()),
+])
+
+# Replace country names for readability
+COUNTRY_NAMES = {'EIRE': 'Ireland'}
+
+
+def transform(chunk):
+    """
+    Adds the derived columns to a chunk of raw invoice lines.
+
+    Parameters:
+    ----------
+    chunk : pandas.DataFrame
+        Raw invoice lines with the columns of RAW_DTYPES.
+
+    Returns:
+    -------
+    pandas.DataFrame
+        The processed lines, with an extra integer 'MonthKey'
+        (year * 12 + month - 1) used to partition the rows by month.
+    """
+    # Revenue = Quantity x UnitPrice
+    chunk['Revenue'] = chunk['Quantity'] * chunk['UnitPrice']
+
+    chunk['Country'] = chunk['Country'].replace(COUNTRY_NAMES)
+
+    # Truncate the invoice timestamps to dates
+    dates = pd.to_datetime(chunk['InvoiceDate']).dt.normalize()
+    chunk['InvoiceDate'] = dates
+
+    # 'Jan-2011' style labels, formatted once per distinct month
+    keys = month_keys(dates).astype(np.int64)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    labels = np.array([month_label(key) for key in unique_keys], dtype=object)
+    chunk['MonthYear'] = labels[inverse.ravel()]
+    chunk['MonthKey'] = keys
+    return chunk
+
+
+def run_etl(input_path=RAW_PATH, output_path=PROCESSED_PATH, chunksize=250_000,
+            row_group_size=1_000_000, log=sys.stderr):
+    """
+    Streams the raw CSV into the processed parquet dataset.
+
+    Parameters:
+    ----------
+    input_path : str, optional
+        The raw CSV file.
+    output_path : str, optional
+        The processed parquet file to write.
+    chunksize : int, optional
+        The number of raw lines held in memory at once, default is 250,000.
+    row_group_size : int, optional
+        The maximum number of rows per row group. Months with more rows are
+        split over several row groups, default is 1,000,000.
+    log : file-like or None, optional
+        Where progress and throughput are reported, default is stderr.
+
+    Returns:
+    -------
+    dict
+        The number of 'rows' written, the number of 'row_groups', the
+        elapsed 'seconds' and the 'rows_per_second' throughput.
+    """
+    start = time.perf_counter()
+    spill_dir = tempfile.mkdtemp(prefix='retailense-etl-')
+    spills = {}
+    rows = 0
+    # Written next to the output and renamed into place once complete
+    tmp_output = output_path + '.tmp'
+
+    try:
+        # Pass 1: stream the CSV and spill every month to its own file
+        chunks = pd.read_csv(input_path, dtype=RAW_DTYPES, chunksize=chunksize)
+        for chunk in chunks:
+            chunk = transform(chunk)
+            for month_key, month in chunk.groupby('MonthKey', sort=False):
+                if month_key not in spills:
+                    spills[month_key] = pq.ParquetWriter(
+                        os.path.join(spill_dir, f'{month_key}.parquet'), SCHEMA
+                    )
+                spills[month_key].write_table(_to_table(month))
+            rows += len(chunk)
+            _report(log, 'read', rows, start)
+        for writer in spills.values():
+            writer.close()
+
+        # Pass 2: sort each month and write it as its own row group(s)
+        row_groups = 0
+        with pq.ParquetWriter(tmp_output, SCHEMA, write_statistics=True) as writer:
+            for month_key in sorted(spills):
+                month = pq.read_table(os.path.join(spill_dir, f'{month_key}.parquet'))
+                month = month.sort_by([('InvoiceDate', 'ascending'), ('Country', 'ascending')])
+                writer.write_table(month, row_group_size=row_group_size)
+                row_groups += -(-month.num_rows // row_group_size)
+        os.replace(tmp_output, output_path)
+
+        # Date bounds and countries read by the layout without loading the dataset
+        write_metadata(output_path)
+    finally:
+        for writer in spills.values():
+            writer.close()
+        shutil.rmtree(spill_dir, ignore_errors=True)
+        # Left behind only when the conversion failed before the rename
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+
+    seconds = time.perf_counter() - start
+    _report(log, 'wrote', rows, start)
+    return {
+        'rows': rows,
+        'row_groups': row_groups,
+        'seconds': seconds,
+        'rows_per_second': rows / seconds if seconds else float('inf'),
+    }
+
+
+def _to_table(frame):
+    frame = frame.drop(columns='MonthKey')
+    # numpy day precision maps to date32 without going through Python dates
+    dates = pa.array(frame.pop('InvoiceDate').to_numpy().astype('datetime64[D]'))
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.add_column(SCHEMA.get_field_index('InvoiceDate'), 'InvoiceDate', dates)
+    return table.cast(SCHEMA)
+
+
+def _report(log, action, rows, start):
+    if log is not None:
+        seconds = time.perf_counter() - start
+        print(f'{action} {rows:,} rows in {seconds:.1f}s ({rows / max(seconds, 1e-9):,.0f} rows/s)', file=log)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the processed RetaiLense dataset from the raw CSV.')
+    parser.add_argument('--input', default=RAW_PATH, help='raw Online Retail CSV file')
+    parser.add_argument('--output', default=PROCESSED_PATH, help='processed parquet file to write')
+    parser.add_argument('--chunksize', type=int, default=250_000, help='raw lines read at once')
+    parser.add_argument('--row-group-size', type=int, default=1_000_000, help='maximum rows per row group')
+    args = parser.parse_args(argv)
+
+    run_etl(args.input, args.output, args.chunksize, args.row_group_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import threading
+import weakref
+
+
+# Indexes built over a loaded frame, keyed by the frame's identity so a
+# replaced frame (e.g. a reloaded dataset) never reuses indexes of the old one
+_indexes = {}
+_indexes_lock = threading.RLock()  # Indexes may build on other indexes
+
+
+def get_frame_index(frame, name, build):
+    """
+    Returns the index `name` of a frame, building it with `build(frame)` on
+    first use. Indexes are dropped when the frame is garbage collected.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame
+        The indexed dataset.
+    name : str
+        The kind of index, e.g. 'cube' or 'products'.
+    build : callable
+        Builds the index from the frame.
+
+    Returns:
+    -------
+    object
+        The index bound to `frame`.
+    """
+    key = (id(frame), name)
+    with _indexes_lock:
+        entry = _indexes.get(key)
+        if entry is not None and entry[0]() is frame:
+            return entry[1]
+
+        index = build(frame)
+        _indexes[key] = (weakref.ref(frame, _forget_frame), index)
+        return index
+
+
+def _forget_frame(ref):
+    # Called when a frame is garbage collected; its id may already be reused
+    for key, (entry_ref, _) in list(_indexes.items()):
+        if entry_ref is ref:
+            _indexes.pop(key, None)
@@ -0,0 +1,224 @@
+"""
+Aggregation kernels over dictionary-encoded columns.
+
+Every kernel takes dense integer codes (0 to n - 1, as produced by
+`pd.factorize` or `encode`) instead of the raw values, so grouping is an
+array index instead of a hash lookup, and no pandas index or Python object
+is built per group:
+    - `encode`: dense codes of arbitrary integer keys, by sorted unique
+    - `group_sum`: sums (or counts) per code, with `np.bincount`
+    - `top_k`: the codes with the largest values, with `np.argpartition`
+    - `distinct_count`: the number of distinct codes, with a bitset (or a
+      sorted unique when the number of codes is unknown)
+
+The metrics cube, the product matrix and the distinct-count index build
+and query their aggregates through these kernels.
+
+Usage:
+    python -m src.kernels [--rows 1000000 10000000 50000000] [--repeat 3]
+
+times every kernel against its pandas baseline on synthetic columns with
+the cardinalities of the dataset.
+"""
+import argparse
+import time
+
+import numpy as np
+
+
+def encode(keys):
+    """
+    Maps integer keys to dense codes.
+
+    Parameters:
+    ----------
+    keys : numpy.ndarray
+        The integer keys.
+
+    Returns:
+    -------
+    tuple
+        The sorted unique keys, and the code of every key (its position in
+        the unique keys) as an int64 array.
+    """
+    unique_keys, codes = np.unique(keys, return_inverse=True)
+    return unique_keys, codes.ravel().astype(np.int64, copy=False)
+
+
+def group_sum(codes, weights=None, n_groups=0):
+    """
+    Sums `weights` per code, or counts the codes when `weights` is None.
+
+    Parameters:
+    ----------
+    codes : numpy.ndarray
+        The non-negative integer code of every row.
+    weights : numpy.ndarray or None, optional
+        The value of every row.
+    n_groups : int, optional
+        The minimum number of groups, so codes absent from `codes` still get
+        a (zero) total.
+
+    Returns:
+    -------
+    numpy.ndarray
+        The float64 total (int64 count) of every code from 0.
+    """
+    return np.bincount(codes, weights=weights, minlength=n_groups)
+
+
+def top_k(values, k, candidates=None):
+    """
+    Returns the codes with the `k` largest values, by decreasing value, ties
+    by increasing code.
+
+    Only the candidates tied with or above the k-th largest value are
+    sorted, so the cost is linear in the number of candidates.
+
+    Parameters:
+    ----------
+    values : numpy.ndarray
+        The value of every code.
+    k : int
+        The number of codes to return.
+    candidates : numpy.ndarray or None, optional
+        The codes to choose from, default is every code.
+
+    Returns:
+    -------
+    numpy.ndarray
+        The selected codes.
+    """
+    if candidates is None:
+        candidates = np.arange(len(values))
+    n = min(k, len(candidates))
+    if n <= 0:
+        return candidates[:0]
+    if n < len(candidates):
+        # Keep every candidate tied with the k-th value, so ties break by code
+        threshold = -np.partition(-values[candidates], n - 1)[n - 1]
+        candidates = candidates[values[candidates] >= threshold]
+    return candidates[np.lexsort((candidates, -values[candidates]))][:n]
+
+
+def distinct_count(codes, n_codes=None):
+    """
+    Counts the distinct codes of one array or of the union of several.
+
+    Parameters:
+    ----------
+    codes : numpy.ndarray or list of numpy.ndarray
+        The codes.
+    n_codes : int or None, optional
+        The number of possible codes. When known, the codes are marked in a
+        bitset of that size; otherwise they are sorted and deduplicated.
+
+    Returns:
+    -------
+    int
+        The number of distinct codes.
+    """
+    chunks = [codes] if isinstance(codes, np.ndarray) else list(codes)
+    if n_codes is None:
+        return len(np.unique(np.concatenate(chunks))) if chunks else 0
+    seen = np.zeros(max(n_codes, 1), dtype=bool)
+    for chunk in chunks:
+        seen[chunk] = True
+    return int(np.count_nonzero(seen))
+
+
+# Cardinalities of the benchmark columns, close to the processed dataset's
+CARDINALITIES = {'products': 4_000, 'months': 13, 'countries': 38, 'customers': 4_400}
+
+
+def synthetic_columns(n_rows, seed=0):
+    """
+    Returns synthetic dictionary-encoded columns of `n_rows` invoice lines:
+    'product', 'month', 'country' and 'customer' int32 codes with the
+    CARDINALITIES of the dataset (skewed like the dataset, where a few
+    products and one country dominate), and float64 'revenue'.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name, column in [('products', 'product'), ('months', 'month'), ('countries', 'country'),
+                         ('customers', 'customer')]:
+        weights = 1 / np.arange(1, CARDINALITIES[name] + 1)
+        columns[column] = rng.choice(len(weights), n_rows, p=weights / weights.sum()).astype(np.int32)
+    columns['revenue'] = rng.gamma(2, 8, n_rows)
+    return columns
+
+
+def _benchmarks(columns):
+    # (name, kernel, pandas baseline) of every kernel, on the same columns
+    import pandas as pd
+
+    product = columns['product']
+    revenue = columns['revenue']
+    n_products = CARDINALITIES['products']
+
+    def top_products_kernel():
+        return top_k(group_sum(product, revenue, n_products), 10)
+
+    def top_products_pandas():
+        return pd.Series(revenue).groupby(product).sum().nlargest(10)
+
+    return [
+        ('group_sum (revenue by month)',
+         lambda: group_sum(columns['month'], revenue, CARDINALITIES['months']),
+         lambda: pd.Series(revenue).groupby(columns['month']).sum()),
+        ('group_sum (lines by country)',
+         lambda: group_sum(columns['country'], n_groups=CARDINALITIES['countries']),
+         lambda: pd.Series(columns['country']).value_counts()),
+        ('top_k (top 10 products)', top_products_kernel, top_products_pandas),
+        ('distinct_count (customers)',
+         lambda: distinct_count(columns['customer'], CARDINALITIES['customers']),
+         lambda: pd.Series(columns['customer']).nunique()),
+    ]
+
+
+def _best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark(rows=(1_000_000, 10_000_000, 50_000_000), repeat=3):
+    """
+    Times every kernel and its pandas baseline on synthetic columns of each
+    size in `rows`.
+
+    Returns:
+    -------
+    pandas.DataFrame
+        The best 'kernel_ms' and 'pandas_ms' of every 'kernel' and 'rows',
+        and the 'speedup'.
+    """
+    import pandas as pd
+
+    results = []
+    for n_rows in rows:
+        columns = synthetic_columns(n_rows)
+        for name, kernel, baseline in _benchmarks(columns):
+            kernel_time = _best_time(kernel, repeat)
+            pandas_time = _best_time(baseline, repeat)
+            results.append({'kernel': name, 'rows': n_rows, 'kernel_ms': kernel_time * 1000,
+                            'pandas_ms': pandas_time * 1000, 'speedup': pandas_time / kernel_time})
+        del columns
+    return pd.DataFrame(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the aggregation kernels against pandas.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000, 50_000_000],
+                        help='numbers of synthetic rows')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measure, the best is kept')
+    args = parser.parse_args(argv)
+
+    print(run_benchmark(args.rows, args.repeat).round(2).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,445 @@
+"""
+End-to-end HTTP load test of the dashboard server.
+
+Usage:
+    python -m src.loadtest [--users 8] [--duration 30]
+                           [--gunicorn WORKERS | --url http://127.0.0.1:8050]
+                           [--rows N] [--output loadtest.json]
+
+Virtual users replay the requests the browser sends while someone uses the
+dashboard: the page load, the initial `/_dash-update-component` call, date
+range drags, country multi-selects, pie chart clicks and granularity
+changes. Every user keeps the state the browser would (the dropdown value
+and the template versions of the charts), so charts are patched like in
+the browser.
+
+By default the app is served in process by a threaded Werkzeug server with
+a fresh on-disk result cache, on the processed dataset (or `--rows`
+synthetic lines, see `src.benchmark.synthetic_invoices`). `--gunicorn`
+starts `gunicorn src.app:server` with that many workers instead, and
+`--url` targets a server that is already running. Everything runs on
+localhost.
+
+The report gives the throughput, the error rate, the latency percentiles
+of every user action and the result-cache hit ratio (in-process servers
+only, as the gunicorn workers keep their counters to themselves).
+"""
+import argparse
+import http.client
+import json
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+UPDATE_PATH = '/_dash-update-component'
+
+# Requests of the page load, before the first callback
+PAGE_PATHS = ['/', '/_dash-layout', '/_dash-dependencies']
+
+
+class DashClient:
+    """
+    Keep-alive HTTP client of one virtual user, recording every request.
+
+    Parameters:
+    ----------
+    url : str
+        The base URL of the server, e.g. 'http://127.0.0.1:8050'.
+    records : list
+        The list every request is appended to, as an (action, status,
+        seconds, response bytes) tuple.
+    timeout : float, optional
+        The timeout of every request in seconds.
+    """
+
+    def __init__(self, url, records, timeout=60):
+        parts = urllib.parse.urlsplit(url)
+        self._host, self._port = parts.hostname, parts.port or 80
+        self._prefix = parts.path.rstrip('/')
+        self._timeout = timeout
+        self._connection = None
+        self.records = records
+
+    def request(self, action, method, path, payload=None):
+        """
+        Sends a request and records it under `action`.
+
+        Returns:
+        -------
+        tuple
+            The status (0 on connection errors) and the decoded JSON body,
+            or None when the body is empty or not JSON.
+        """
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        started = time.perf_counter()
+        try:
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+            self._connection.request(method, self._prefix + path, body=body, headers=headers)
+            response = self._connection.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.close()
+            self.records.append((action, 0, time.perf_counter() - started, 0))
+            return 0, None
+        self.records.append((action, status, time.perf_counter() - started, len(data)))
+        try:
+            return status, json.loads(data) if data else None
+        except ValueError:
+            return status, None
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class DashboardSession:
+    """
+    Browser-side state of one dashboard page: the values of the callback
+    inputs and states, updated from every response.
+
+    Parameters:
+    ----------
+    client : DashClient
+        The client sending the requests.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.values = {}
+        self.options = []
+        self.dependencies = []
+
+    def load(self):
+        """
+        Loads the page like the browser: the index, the layout and the
+        callbacks, then runs the initial callbacks.
+        """
+        layout = None
+        for path in PAGE_PATHS:
+            status, body = self.client.request('page', 'GET', path)
+            if path == '/_dash-layout':
+                layout = body
+            elif path == '/_dash-dependencies':
+                self.dependencies = [dependency for dependency in body or []
+                                     if not dependency.get('clientside_function')]
+        if layout is None:
+            return False
+
+        for component in _components(layout):
+            props = component.get('props', {})
+            for name, value in props.items():
+                if name != 'id' and name != 'children':
+                    self.values[f"{props['id']}.{name}"] = value
+            if props['id'] == 'country-dropdown':
+                self.options = [option['value'] for option in props.get('options', [])]
+        for dependency in self.dependencies:
+            self.update('initial', {}, dependency)
+        return True
+
+    def update(self, action, changes, dependency=None):
+        """
+        Applies `changes` (values by 'id.property') and sends the callback
+        they trigger, recorded under `action`.
+        """
+        self.values.update(changes)
+        for candidate in ([dependency] if dependency else self.dependencies):
+            inputs = [f"{item['id']}.{item['property']}" for item in candidate['inputs']]
+            if dependency or set(changes) & set(inputs):
+                status, body = self.client.request(action, 'POST', UPDATE_PATH, self._payload(candidate, changes))
+                if status == 200 and body:
+                    self._apply(body)
+
+    def _payload(self, dependency, changes):
+        def props(items):
+            return [{**item, 'value': self.values.get(f"{item['id']}.{item['property']}")} for item in items]
+
+        outputs = [dict(zip(['id', 'property'], output.rsplit('.', 1)))
+                   for output in dependency['output'].strip('.').split('...')]
+        return {
+            'output': dependency['output'],
+            'outputs': outputs,
+            'inputs': props(dependency['inputs']),
+            'changedPropIds': list(changes),
+            'state': props(dependency.get('state', [])),
+        }
+
+    def _apply(self, body):
+        # Patched props are not tracked: only the stores and the dropdown
+        # value are read back by the callbacks
+        for component_id, props in body.get('response', {}).items():
+            for name, value in props.items():
+                if not (isinstance(value, dict) and value.get('__dash_patch_update')):
+                    self.values[f'{component_id}.{name}'] = value
+
+
+def _components(node):
+    # Every component of a layout JSON with an id
+    if isinstance(node, list):
+        for child in node:
+            yield from _components(child)
+    elif isinstance(node, dict):
+        props = node.get('props')
+        if isinstance(props, dict):
+            if isinstance(props.get('id'), str):
+                yield node
+            yield from _components(props.get('children'))
+
+
+def user_session(session, rng):
+    """
+    Replays one visit: a page load, a date range drag, a country
+    multi-select, pie chart clicks and a granularity change.
+    """
+    if not session.load():
+        return
+
+    # Drag the end date back one week at a time
+    start = np.datetime64(str(session.values.get('date-picker-range.start_date'))[:10])
+    end = np.datetime64(str(session.values.get('date-picker-range.end_date'))[:10])
+    for _ in range(rng.randint(2, 5)):
+        end = max(start, end - np.timedelta64(7, 'D'))
+        session.update('date-drag', {'date-picker-range.end_date': str(end)})
+
+    # Add a few countries one at a time
+    selected = list(session.values.get('country-dropdown.value') or [])
+    for country in rng.sample(session.options, min(3, len(session.options))):
+        if country not in selected:
+            selected = selected + [country]
+            session.update('country-select', {'country-dropdown.value': selected})
+
+    # Click a country slice, then the "Others" slice
+    for country in [rng.choice(session.options or ['United Kingdom']), 'Others']:
+        session.update('pie-click', {'country-pie-chart.signalData': {'selected_country': {'Country': [country]}}})
+
+    session.update('granularity', {'granularity.value': rng.choice(['week', 'day'])})
+    session.update('granularity', {'granularity.value': 'month'})
+
+
+def run_load_test(url, users=8, duration=30.0, seed=0):
+    """
+    Runs `users` virtual users replaying visits against `url` for
+    `duration` seconds.
+
+    Returns:
+    -------
+    list of tuple
+        The (action, status, seconds, response bytes) of every request.
+    """
+    records = []
+    deadline = time.perf_counter() + duration
+
+    def run_user(index):
+        rng = random.Random(seed + index)
+        client = DashClient(url, records)
+        try:
+            while time.perf_counter() < deadline:
+                user_session(DashboardSession(client), rng)
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=run_user, args=(index,), daemon=True) for index in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records
+
+
+def summarize(records, elapsed, cache_stats=None):
+    """
+    Summarizes the requests of a load test.
+
+    Parameters:
+    ----------
+    records : list of tuple
+        The requests, as returned by `run_load_test`.
+    elapsed : float
+        The duration of the load test in seconds.
+    cache_stats : dict or None, optional
+        The result-cache counters accumulated during the test, see
+        `src.cache.ResultCache.stats`.
+
+    Returns:
+    -------
+    dict
+        The 'requests', 'throughput' (requests per second), 'error_rate'
+        (failed requests, prevented updates excluded), 'cache_hit_ratio'
+        (None without `cache_stats`) and the count, p50/p95/p99 latency and
+        mean response size of every action.
+    """
+    actions = {}
+    for action, status, seconds, size in records:
+        actions.setdefault(action, []).append((status, seconds, size))
+
+    summary = {
+        'requests': len(records),
+        'throughput': len(records) / elapsed if elapsed else 0.0,
+        'error_rate': (sum(status not in (200, 204) for _, status, _, _ in records) / len(records)
+                       if records else 0.0),
+        'cache_hit_ratio': None,
+        'actions': {},
+    }
+    for action, requests in actions.items():
+        seconds = np.array([request[1] for request in requests]) * 1000
+        p50, p95, p99 = np.percentile(seconds, [50, 95, 99])
+        summary['actions'][action] = {
+            'requests': len(requests),
+            'errors': sum(status not in (200, 204) for status, _, _ in requests),
+            'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99),
+            'mean_kb': float(np.mean([request[2] for request in requests])) / 1e3,
+        }
+
+    if cache_stats:
+        hits = sum(counts['hits'] + counts['shared_hits'] for counts in cache_stats.values())
+        lookups = hits + sum(counts['misses'] for counts in cache_stats.values())
+        summary['cache_hit_ratio'] = hits / lookups if lookups else None
+    return summary
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve_in_process(rows=None, port=None):
+    """
+    Serves the app from a threaded Werkzeug server in a background thread,
+    with a fresh on-disk result cache.
+
+    Parameters:
+    ----------
+    rows : int or None, optional
+        The number of synthetic invoice lines to serve, default is the
+        processed dataset.
+    port : int or None, optional
+        The port, default is a free one.
+
+    Returns:
+    -------
+    tuple
+        The URL of the server and a function shutting it down.
+    """
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    from .app import create_app
+
+    data = None
+    if rows:
+        from .benchmark import synthetic_invoices
+        from .data import prepare_data
+
+        data = prepare_data(synthetic_invoices(rows))
+
+    cache_dir = tempfile.TemporaryDirectory(prefix='retailense-loadtest-')
+    app = create_app({'RESULT_CACHE_DIR': cache_dir.name}, data=data)
+    server = make_server('127.0.0.1', port or _free_port(), app.server, threaded=True,
+                         request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def shutdown():
+        server.shutdown()
+        thread.join()
+        cache_dir.cleanup()
+
+    # The index lazily imports the JSON encoder, which concurrent first
+    # requests would race on, so it is requested once before the users start
+    url = f'http://127.0.0.1:{server.server_port}'
+    DashClient(url, []).request('probe', 'GET', '/')
+    return url, shutdown
+
+
+def serve_gunicorn(workers, port=None, startup_timeout=120):
+    """
+    Serves `src.app:server` with gunicorn in a subprocess and waits until it
+    answers.
+
+    Returns:
+    -------
+    tuple
+        The URL of the server and a function stopping it.
+    """
+    port = port or _free_port()
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--workers', str(workers),
+                                '--bind', f'127.0.0.1:{port}', 'src.app:server'],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def shutdown():
+        process.terminate()
+        process.wait()
+
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.perf_counter() + startup_timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {process.returncode}')
+        status, _ = DashClient(url, []).request('probe', 'GET', '/')
+        if status == 200:
+            return url, shutdown
+        time.sleep(0.2)
+    shutdown()
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the RetaiLense dashboard server.')
+    parser.add_argument('--users', type=int, default=8, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of load')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the user actions')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help='URL of a running server')
+    target.add_argument('--gunicorn', type=int, metavar='WORKERS', help='serve with gunicorn workers')
+    parser.add_argument('--rows', type=int, help='serve synthetic invoice lines (in-process server only)')
+    parser.add_argument('--output', help='JSON file the summary is written to')
+    args = parser.parse_args(argv)
+
+    cache = None
+    if args.url:
+        url, shutdown = args.url, lambda: None
+    elif args.gunicorn:
+        url, shutdown = serve_gunicorn(args.gunicorn)
+    else:
+        url, shutdown = serve_in_process(args.rows)
+        from .app import result_cache as cache
+
+    try:
+        if cache is not None:
+            cache.clear()
+        started = time.perf_counter()
+        records = run_load_test(url, args.users, args.duration, args.seed)
+        summary = summarize(records, time.perf_counter() - started, cache.stats() if cache is not None else None)
+    finally:
+        shutdown()
+
+    print(f"{summary['requests']} requests, {summary['throughput']:.1f} req/s, "
+          f"error rate {summary['error_rate']:.2%}")
+    if summary['cache_hit_ratio'] is not None:
+        print(f"cache hit ratio {summary['cache_hit_ratio']:.2%}")
+    print(f"{'action':16}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean kB':>10}")
+    for action, stats in summary['actions'].items():
+        print(f"{action:16}{stats['requests']:>10}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+              f"{stats['p99_ms']:>10.1f}{stats['mean_kb']:>10.1f}")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(summary, file, indent=2)
+    return 0 if summary['error_rate'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
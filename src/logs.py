@@ -0,0 +1,60 @@
+import logging
+import os
+import threading
+import time
+
+# Level of the app's loggers, e.g. DEBUG to trace the pie chart clicks
+LOG_LEVEL = os.environ.get('RETAILENSE_LOG_LEVEL', 'WARNING').upper()
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Drops the records of a message beyond `burst` records per `period`
+    seconds, so a burst of clicks cannot flood the logs. The next record
+    let through reports how many were dropped.
+
+    Records are grouped by logger, level and message template (not by the
+    formatted message), so messages differing only in their arguments share
+    a budget.
+
+    Parameters:
+    ----------
+    burst : int, optional
+        The number of records let through per period, default is 10.
+    period : float, optional
+        The length of a period in seconds, default is 60.
+    """
+
+    def __init__(self, burst=10, period=60.0):
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            start, count, dropped = self._windows.get(key, (now, 0, 0))
+            if now - start >= self.period:
+                start, count = now, 0
+            if count >= self.burst:
+                self._windows[key] = (start, count, dropped + 1)
+                return False
+            self._windows[key] = (start, count + 1, 0)
+        if dropped:
+            record.msg = f'{record.msg} ({dropped} similar messages dropped)'
+        return True
+
+
+def get_logger(name):
+    """
+    Returns the logger of a module, at LOG_LEVEL and rate-limited by a
+    `RateLimitFilter`.
+    """
+    logger = logging.getLogger(name)
+    if not any(isinstance(existing, RateLimitFilter) for existing in logger.filters):
+        logger.addFilter(RateLimitFilter())
+        logger.setLevel(LOG_LEVEL)
+    return logger
@@ -0,0 +1,282 @@
+"""
+In-process instrumentation of the dashboard callbacks, exposed in the
+Prometheus text format on `/metrics`.
+
+Every instrumented callback records its call count and latency, and the
+time of every phase of a call:
+    - filter: resolving the date range and countries (cube bounds, SQL filter)
+    - aggregate: backend queries
+    - spec: rendering the chart specs
+    - cache: result-cache lookups and stores
+    - callback: the rest of the callback body
+    - serialize: encoding and sending the Dash response (Dash callbacks only)
+
+Phase times are exclusive, so a filter inside an aggregate query is only
+counted once, and are attributed to the innermost instrumented callback.
+Phases are measured with two `perf_counter` calls and accumulated per call,
+then observed once per call, so instrumentation stays on in production.
+
+The response size of every Dash callback and the result-cache outcomes of
+every cached callback are exported too. Every process (e.g. gunicorn
+worker) keeps its own metrics.
+"""
+import bisect
+import functools
+import threading
+import time
+
+# Upper bounds of the latency histograms, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the response size histograms, in bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+UPDATE_PATH = '_dash-update-component'
+
+
+class Histogram:
+    """Cumulative histogram with fixed bucket upper bounds."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        """Returns the Prometheus text lines of the histogram."""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class _Frame:
+    # An instrumented call in progress: its phase times and the time spent
+    # in the phases nested in the current one
+    __slots__ = ('name', 'phases', 'stack')
+
+    def __init__(self, name):
+        self.name = name
+        self.phases = {}
+        self.stack = []
+
+
+class Metrics:
+    """
+    Registry of the callback metrics.
+
+    Parameters:
+    ----------
+    cache : src.cache.ResultCache or None, optional
+        The result cache whose outcomes are exported, see `init_app`.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._calls = {}
+        self._errors = {}
+        self._latency = {}
+        self._phases = {}
+        self._sizes = {}
+
+    def init_app(self, server, cache=None, path='/metrics'):
+        """
+        Mounts the `/metrics` endpoint on a Flask server, and measures the
+        serialization time and response size of the Dash callbacks it
+        answers.
+        """
+        from flask import Response, request
+
+        if cache is not None:
+            self.cache = cache
+
+        @server.before_request
+        def start_request():
+            self._local.request_start = time.perf_counter()
+            self._local.last_call = None
+
+        @server.after_request
+        def end_request(response):
+            call = getattr(self._local, 'last_call', None)
+            if call is not None and request.path.endswith(UPDATE_PATH):
+                name, elapsed = call
+                total = time.perf_counter() - self._local.request_start
+                size = response.calculate_content_length()
+                with self._lock:
+                    self._histogram(self._phases, (name, 'serialize'), LATENCY_BUCKETS).observe(max(total - elapsed, 0.0))
+                    if size is not None:
+                        self._histogram(self._sizes, name, SIZE_BUCKETS).observe(size)
+            return response
+
+        if path not in {rule.rule for rule in server.url_map.iter_rules()}:
+            server.add_url_rule(path, 'metrics', lambda: Response(self.render(), mimetype='text/plain; version=0.0.4'))
+
+    def instrument(self, func=None, name=None, expected=()):
+        """
+        Decorator recording the calls, latency and phase times of a callback.
+        Exceptions of the `expected` types (e.g. PreventUpdate) are not
+        counted as errors.
+        """
+        if func is None:
+            return functools.partial(self.instrument, name=name, expected=expected)
+        name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            frames = self._frames()
+            frame = _Frame(name)
+            frames.append(frame)
+            start = time.perf_counter()
+            nested = [0.0]
+            frame.stack.append(nested)
+            failed = False
+            try:
+                return func(*args, **kwargs)
+            except Exception as error:
+                failed = not isinstance(error, expected)
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                frame.stack.pop()
+                frames.pop()
+                phases = frame.phases
+                phases['callback'] = phases.get('callback', 0.0) + elapsed - nested[0]
+                if frames:
+                    # Time the caller spent in this callback is not its own
+                    parent = frames[-1]
+                    if parent.stack:
+                        parent.stack[-1][0] += elapsed
+                else:
+                    self._local.last_call = (name, elapsed)
+                self._record(name, elapsed, phases, failed)
+
+        return wrapper
+
+    def phase(self, name):
+        """
+        Context manager attributing the time of its block to phase `name` of
+        the current callback. Does nothing outside instrumented callbacks.
+        """
+        return _Phase(self, name)
+
+    def timed(self, phase):
+        """Decorator attributing the time of every call to `phase`."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with _Phase(self, phase):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def render(self):
+        """Returns every metric in the Prometheus text format."""
+        with self._lock:
+            lines = [
+                '# HELP retailense_callback_calls_total Calls of every callback.',
+                '# TYPE retailense_callback_calls_total counter',
+                *[f'retailense_callback_calls_total{{callback="{name}"}} {count}'
+                  for name, count in sorted(self._calls.items())],
+                '# HELP retailense_callback_errors_total Calls of every callback that raised.',
+                '# TYPE retailense_callback_errors_total counter',
+                *[f'retailense_callback_errors_total{{callback="{name}"}} {count}'
+                  for name, count in sorted(self._errors.items())],
+                '# HELP retailense_callback_duration_seconds Latency of every callback.',
+                '# TYPE retailense_callback_duration_seconds histogram',
+            ]
+            for name, histogram in sorted(self._latency.items()):
+                lines += histogram.samples('retailense_callback_duration_seconds', f'callback="{name}"')
+            lines += ['# HELP retailense_callback_phase_seconds Exclusive time of every phase of every callback.',
+                      '# TYPE retailense_callback_phase_seconds histogram']
+            for (name, phase), histogram in sorted(self._phases.items()):
+                lines += histogram.samples('retailense_callback_phase_seconds', f'callback="{name}",phase="{phase}"')
+            lines += ['# HELP retailense_callback_response_bytes Response size of every Dash callback.',
+                      '# TYPE retailense_callback_response_bytes histogram']
+            for name, histogram in sorted(self._sizes.items()):
+                lines += histogram.samples('retailense_callback_response_bytes', f'callback="{name}"')
+
+        if self.cache is not None:
+            stats = sorted(self.cache.stats().items())
+            lines += ['# HELP retailense_cache_lookups_total Result-cache lookups of every cached callback, by outcome.',
+                      '# TYPE retailense_cache_lookups_total counter']
+            for name, counts in stats:
+                lines += [f'retailense_cache_lookups_total{{callback="{name}",outcome="{outcome}"}} {counts[counter]}'
+                          for outcome, counter in [('hit', 'hits'), ('shared_hit', 'shared_hits'), ('miss', 'misses')]]
+            lines += ['# HELP retailense_cache_evictions_total In-process result-cache evictions of every cached callback.',
+                      '# TYPE retailense_cache_evictions_total counter',
+                      *[f'retailense_cache_evictions_total{{callback="{name}"}} {counts["evictions"]}'
+                        for name, counts in stats]]
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """Drops every recorded metric."""
+        with self._lock:
+            for store in (self._calls, self._errors, self._latency, self._phases, self._sizes):
+                store.clear()
+
+    def _frames(self):
+        frames = getattr(self._local, 'frames', None)
+        if frames is None:
+            frames = self._local.frames = []
+        return frames
+
+    def _record(self, name, elapsed, phases, failed):
+        with self._lock:
+            self._calls[name] = self._calls.get(name, 0) + 1
+            if failed:
+                self._errors[name] = self._errors.get(name, 0) + 1
+            self._histogram(self._latency, name, LATENCY_BUCKETS).observe(elapsed)
+            for phase, seconds in phases.items():
+                self._histogram(self._phases, (name, phase), LATENCY_BUCKETS).observe(seconds)
+
+    @staticmethod
+    def _histogram(store, key, buckets):
+        histogram = store.get(key)
+        if histogram is None:
+            histogram = store[key] = Histogram(buckets)
+        return histogram
+
+
+class _Phase:
+    # Exclusive timing: nested phases are subtracted from the enclosing one
+    __slots__ = ('metrics', 'name', 'frame', 'start', 'nested')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        frames = getattr(self.metrics._local, 'frames', None)
+        self.frame = frames[-1] if frames else None
+        if self.frame is not None:
+            self.nested = [0.0]
+            self.frame.stack.append(self.nested)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        frame = self.frame
+        if frame is None:
+            return False
+        elapsed = time.perf_counter() - self.start
+        frame.stack.pop()
+        if frame.stack:
+            frame.stack[-1][0] += elapsed
+        frame.phases[self.name] = frame.phases.get(self.name, 0.0) + elapsed - self.nested[0]
+        return False
+
+
+# Registry of the app's callbacks, mounted by `src.app.create_app`
+metrics = Metrics()
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+from .cube import get_cube
+from .filters import get_frame_index
+from .kernels import encode, group_sum, top_k
+from .schema import revenue_pence, to_pounds
+
+
+class ProductRevenueMatrix:
+    """
+    Sparse revenue matrix of every product per (country, month) and per
+    (country, day), built once from the invoice lines.
+
+    Products are the distinct descriptions mapped to dense integer codes.
+    For each cell, only the products sold in it are stored, back to back and
+    country by country (CSR layout), so the cells of a country over a range
+    of months or days are one contiguous slice.
+
+    A top-N query over a date range sums the month rows of the months fully
+    inside the range, plus the day rows of the partial months at both ends,
+    so the totals are exact for any range. The top N products are then
+    picked with `argpartition`, without sorting every product.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame
+        The invoice lines. It must contain 'InvoiceDate', 'Country',
+        'Description' and 'Revenue' (or 'RevenuePence').
+    """
+
+    def __init__(self, frame):
+        self._cube = get_cube(frame)
+        n_countries = len(self._cube.countries)
+        self._n_days = len(self._cube.days)
+        self._n_months = len(self._cube.month_starts) - 1
+
+        product_codes, products = pd.factorize(frame['Description'], sort=True)
+        self.products = np.asarray(products, dtype=object)
+
+        # Rows without a description are not grouped, like groupby would
+        sold = product_codes >= 0
+        product_codes = product_codes[sold]
+        revenue = revenue_pence(frame).astype(np.float64)[sold]
+        country_codes = pd.Categorical(frame['Country'], categories=self._cube.countries).codes[sold]
+        day_codes = self._cube.day_codes(frame['InvoiceDate'])[sold]
+        month_codes = self._cube._day_months[day_codes]
+
+        self._days = _SparseRows(country_codes.astype(np.int64) * self._n_days + day_codes,
+                                 product_codes, revenue, n_countries * self._n_days, len(products))
+        self._months = _SparseRows(country_codes.astype(np.int64) * self._n_months + month_codes,
+                                   product_codes, revenue, n_countries * self._n_months, len(products))
+
+    def top_products(self, start_date, end_date, countries=None, n_products=10):
+        """
+        Returns the products with the highest revenue over the date range
+        (inclusive) and the selected countries.
+
+        Parameters:
+        ----------
+        start_date : str
+            The selected start date (in YYYY-MM-DD format).
+        end_date : str
+            The selected end date (in YYYY-MM-DD format).
+        countries : list or None, optional
+            The selected countries. None keeps every country.
+        n_products : int, optional
+            The number of products to return, default is 10.
+
+        Returns:
+        -------
+        pandas.DataFrame
+            The 'Description' and 'Revenue' of the top products, by
+            decreasing revenue.
+        """
+        lo, hi = self._cube.day_bounds(start_date, end_date)
+
+        # Months fully inside [lo, hi), and the partial days on each side
+        starts = self._cube.month_starts
+        first_month = int(np.searchsorted(starts, lo, side='left'))
+        last_month = int(np.searchsorted(starts, hi, side='right')) - 1
+        if first_month < last_month:
+            day_ranges = [(lo, starts[first_month]), (starts[last_month], hi)]
+        else:
+            first_month = last_month = 0
+            day_ranges = [(lo, hi)]
+
+        slices = []
+        for country in self._cube.country_indices(countries).tolist():
+            slices.append(self._months.slice(country * self._n_months + first_month,
+                                             country * self._n_months + last_month))
+            for day_lo, day_hi in day_ranges:
+                slices.append(self._days.slice(country * self._n_days + day_lo,
+                                               country * self._n_days + day_hi))
+
+        codes = np.concatenate([codes for codes, _ in slices]) if slices else np.array([], dtype=np.int64)
+        values = np.concatenate([values for _, values in slices]) if slices else np.array([])
+        totals = group_sum(codes, values, len(self.products))
+        candidates = np.flatnonzero(group_sum(codes, n_groups=len(self.products)))
+
+        # Partition out the top N, then only sort those N
+        top = top_k(totals, n_products, candidates)
+
+        return pd.DataFrame({'Description': self.products[top], 'Revenue': to_pounds(totals[top])})
+
+
+class _SparseRows:
+    # Revenue per (cell, product), stored sorted by cell (CSR layout)
+
+    def __init__(self, cells, products, revenue, n_cells, n_products):
+        keys, inverse = encode(cells * max(n_products, 1) + products)
+        self.products = keys % max(n_products, 1)
+        self.revenue = group_sum(inverse, revenue, len(keys))
+        self.offsets = np.searchsorted(keys // max(n_products, 1), np.arange(n_cells + 1))
+
+    def slice(self, first, last):
+        lo, hi = self.offsets[first], self.offsets[last]
+        return self.products[lo:hi], self.revenue[lo:hi]
+
+
+def get_product_matrix(frame):
+    """
+    Returns the shared ProductRevenueMatrix of a frame, building it on first use.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame
+        The invoice lines.
+
+    Returns:
+    -------
+    ProductRevenueMatrix
+        The matrix built from `frame`.
+    """
+    return get_frame_index(frame, 'products', ProductRevenueMatrix)
@@ -0,0 +1,206 @@
+"""
+Opt-in sampling profiler of the Dash callback requests, writing flame
+graphs of slow callbacks.
+
+Profiling is off unless a profiles directory is configured (PROFILE_DIR, or
+the RETAILENSE_PROFILE_DIR environment variable): no hook is installed on
+the server otherwise. Once on, a callback request is profiled when
+    - it carries the `X-Profile: 1` header or the `profile=1` query flag,
+      also on the page it was sent from (e.g. open `/?profile=1` to profile
+      every callback of that page), or
+    - it takes longer than PROFILE_THRESHOLD seconds, when set, in which
+      case every callback request is sampled and fast ones are discarded.
+
+A sampler thread records the stack of the request thread every
+PROFILE_INTERVAL seconds, from the Flask dispatch through the callback,
+pandas/DuckDB, the spec rendering, the result cache and the JSON
+serialization of the response. Stacks are written in the folded format
+("frame;frame;frame weight", weights in microseconds), read by
+flamegraph.pl, speedscope or inferno. The directory keeps the newest
+PROFILE_MAX_FILES profiles.
+"""
+import collections
+import functools
+import itertools
+import os
+import re
+import sys
+import sysconfig
+import threading
+import time
+
+from .logs import get_logger
+from .metrics import UPDATE_PATH
+
+logger = get_logger(__name__)
+
+# Directory of the profiles, None disables profiling
+PROFILE_DIR = os.environ.get('RETAILENSE_PROFILE_DIR') or None
+
+# Latency in seconds above which callbacks are profiled, None profiles
+# requested callbacks only
+PROFILE_THRESHOLD = float(os.environ['RETAILENSE_PROFILE_THRESHOLD']) if os.environ.get('RETAILENSE_PROFILE_THRESHOLD') else None
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_FLAG = re.compile(r'[?&]profile=(1|true|yes)(&|$)')
+
+_STDLIB = sysconfig.get_paths()['stdlib'] + os.sep
+
+
+class Sampler(threading.Thread):
+    """
+    Samples the stack of a thread until stopped, weighting every stack by
+    the time since the previous sample.
+
+    Parameters:
+    ----------
+    thread_id : int
+        The identifier of the sampled thread.
+    interval : float, optional
+        The sampling interval in seconds, default is 5 ms.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                self.stacks[folded_stack(frame)] += round((now - last) * 1e6)
+            last = now
+
+    def stop(self):
+        """Stops sampling and returns the weight of every folded stack."""
+        self._stopped.set()
+        self.join()
+        return self.stacks
+
+
+def folded_stack(frame):
+    """Returns the stack of a frame, outermost first, joined by ';'."""
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+@functools.lru_cache(maxsize=None)
+def _label(code):
+    path = code.co_filename
+    _, found, rest = path.rpartition('site-packages' + os.sep)
+    if found:
+        path = rest
+    elif path.startswith(_STDLIB):
+        path = path[len(_STDLIB):]
+    elif path.startswith(os.getcwd() + os.sep):
+        path = os.path.relpath(path)
+    return f'{code.co_name} ({path}:{code.co_firstlineno})'.replace(';', ',')
+
+
+class Profiler:
+    """
+    Profiles the callback requests of a Flask server, see the module
+    docstring.
+    """
+
+    def __init__(self):
+        self.directory = None
+        self.threshold = None
+        self.interval = 0.005
+        self.max_files = 100
+        self._sequence = itertools.count()
+
+    def init_app(self, server):
+        """
+        Reads the settings of a Flask server and, when PROFILE_DIR is set,
+        profiles its callback requests: PROFILE_THRESHOLD (seconds) profiles
+        slow callbacks, PROFILE_INTERVAL sets the sampling interval and
+        PROFILE_MAX_FILES bounds the profiles directory.
+        """
+        from flask import g, request
+
+        self.directory = server.config.get('PROFILE_DIR')
+        self.threshold = server.config.get('PROFILE_THRESHOLD')
+        self.interval = server.config.get('PROFILE_INTERVAL', self.interval)
+        self.max_files = server.config.get('PROFILE_MAX_FILES', self.max_files)
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+
+        @server.before_request
+        def start_profile():
+            if not request.path.endswith(UPDATE_PATH):
+                return
+            requested = self.requested(request)
+            if requested or self.threshold is not None:
+                g.profile = (requested, time.perf_counter(), Sampler(threading.get_ident(), self.interval))
+                g.profile[2].start()
+
+        @server.after_request
+        def end_profile(response):
+            profile = g.pop('profile', None)
+            if profile is None:
+                return response
+            requested, start, sampler = profile
+            stacks = sampler.stop()
+            elapsed = time.perf_counter() - start
+            if requested or elapsed >= self.threshold:
+                body = request.get_json(silent=True) or {}
+                path = self.write(stacks, body.get('output', ''), elapsed)
+                response.headers['X-Profile-File'] = os.path.basename(path)
+                logger.info('Profile of a %.0f ms callback written to %s', elapsed * 1000, path)
+            return response
+
+    @staticmethod
+    def requested(request):
+        """Whether a request, or the page it was sent from, asks to be profiled."""
+        if request.headers.get(PROFILE_HEADER, '').lower() in ('1', 'true', 'yes'):
+            return True
+        return any(PROFILE_FLAG.search(url) for url in (request.full_path, request.referrer or ''))
+
+    def write(self, stacks, name, elapsed):
+        """
+        Writes folded stacks to a new file of the profiles directory, named
+        after the time, the latency and the callback outputs, and drops the
+        oldest profiles beyond PROFILE_MAX_FILES.
+
+        Returns:
+        -------
+        str
+            The path of the profile.
+        """
+        name = re.sub(r'[^A-Za-z0-9_-]+', '-', name).strip('-')[:80] or 'callback'
+        path = os.path.join(self.directory, '{}-{}-{}-{:.0f}ms-{}.folded'.format(
+            time.strftime('%Y%m%d-%H%M%S'), os.getpid(), next(self._sequence), elapsed * 1000, name
+        ))
+        with open(path, 'w') as file:
+            file.writelines(f'{stack} {weight}\n' for stack, weight in stacks.most_common())
+        self.prune()
+        return path
+
+    def prune(self):
+        """Drops the oldest profiles beyond PROFILE_MAX_FILES."""
+        paths = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.folded'):
+                try:
+                    paths.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:  # dropped by another worker
+                    pass
+        for _, path in sorted(paths)[:max(len(paths) - self.max_files, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+# Profiler of the app's server, set up by `src.app.create_app`
+profiler = Profiler()
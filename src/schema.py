@@ -0,0 +1,162 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from .kernels import encode
+
+# String columns stored as categoricals (dictionary codes + one copy of each value)
+CATEGORICAL_COLUMNS = ['InvoiceNo', 'StockCode', 'Description', 'Country']
+
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+               'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+def compact(frame):
+    """
+    Converts the processed invoice lines to a compact in-memory schema:
+        - string columns become categoricals
+        - 'CustomerID' becomes a nullable Int32
+        - 'Quantity' becomes an int32
+        - 'Revenue' is replaced by 'RevenuePence', an exact int64 amount in pence
+        - 'MonthKey' is added, the int32 month of every line (year * 12 + month - 1)
+        - 'MonthYear' becomes an ordered categorical of 'Jan-2011' style
+          labels, in chronological order
+
+    'UnitPrice' is kept as is: the dashboard never aggregates it, and a few
+    source prices have sub-penny precision.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame
+        The processed invoice lines.
+
+    Returns:
+    -------
+    pandas.DataFrame
+        The same lines with the compact schema.
+    """
+    frame = frame.copy()
+    for column in CATEGORICAL_COLUMNS:
+        if column in frame:
+            frame[column] = frame[column].astype('category')
+    frame['CustomerID'] = frame['CustomerID'].astype('Int32')
+    frame['Quantity'] = frame['Quantity'].astype(np.int32)
+    frame['RevenuePence'] = revenue_pence(frame)
+    frame['MonthKey'] = month_keys(frame['InvoiceDate'])
+    frame['MonthYear'] = month_labels(frame['MonthKey'].to_numpy())
+    return frame.drop(columns='Revenue')
+
+
+def month_keys(dates):
+    """
+    Returns the integer month (year * 12 + month - 1) of every date, so
+    months sort and group as plain integers.
+
+    Parameters:
+    ----------
+    dates : array-like
+        The dates.
+
+    Returns:
+    -------
+    numpy.ndarray
+        The int32 month key of every date.
+    """
+    months = np.asarray(dates, dtype='datetime64[ns]').astype('datetime64[M]')
+    return (months.astype(np.int64) + 1970 * 12).astype(np.int32)
+
+
+def month_label(key):
+    """Returns the 'Jan-2011' style label of a month key."""
+    return f'{MONTH_NAMES[key % 12]}-{key // 12}'
+
+
+def month_labels(keys):
+    """
+    Returns the labels of an array of month keys as an ordered categorical
+    whose categories are the months present, in chronological order. Each
+    distinct month is formatted once.
+
+    Parameters:
+    ----------
+    keys : numpy.ndarray
+        The month keys, see `month_keys`.
+
+    Returns:
+    -------
+    pandas.Categorical
+        The 'MonthYear' labels.
+    """
+    unique_keys, codes = encode(keys)
+    categories = [month_label(int(key)) for key in unique_keys]
+    return pd.Categorical.from_codes(codes, categories=categories, ordered=True)
+
+
+def revenue_pence(frame):
+    """
+    Returns the revenue of every line in integer pence, from 'RevenuePence'
+    when the frame has the compact schema and from 'Revenue' otherwise.
+
+    Parameters:
+    ----------
+    frame : pandas.DataFrame
+        The invoice lines.
+
+    Returns:
+    -------
+    numpy.ndarray
+        The int64 revenue of every line, in pence.
+    """
+    if 'RevenuePence' in frame:
+        return frame['RevenuePence'].to_numpy(dtype=np.int64)
+    return np.round(frame['Revenue'].to_numpy(dtype=np.float64) * 100).astype(np.int64)
+
+
+def to_pounds(pence):
+    """Converts an amount (or array of amounts) in pence to pounds."""
+    return pence / 100
+
+
+def memory_report(before, after):
+    """
+    Compares the memory footprint of every column of two frames.
+
+    Parameters:
+    ----------
+    before : pandas.DataFrame
+        The frame with the original schema.
+    after : pandas.DataFrame
+        The frame with the compact schema.
+
+    Returns:
+    -------
+    pandas.DataFrame
+        The dtype and deep memory usage (in MB) of every column, before and
+        after, with a 'Total' row.
+    """
+    def usage(frame):
+        return pd.DataFrame({
+            'dtype': frame.dtypes.astype(str),
+            'MB': frame.memory_usage(index=False, deep=True) / 1e6,
+        })
+
+    report = usage(before).join(usage(after), how='outer', lsuffix=' before', rsuffix=' after')
+    report = report.fillna({'dtype before': '-', 'MB before': 0, 'dtype after': '-', 'MB after': 0})
+    report.loc['Total'] = ['', report['MB before'].sum(), '', report['MB after'].sum()]
+    return report.round(2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Report the memory footprint of the compact schema.')
+    parser.add_argument('path', nargs='?', default='data/processed/processed_data.parquet',
+                        help='processed parquet file')
+    args = parser.parse_args(argv)
+
+    before = pd.read_parquet(args.path)
+    before['InvoiceDate'] = pd.to_datetime(before['InvoiceDate'])
+    print(memory_report(before, compact(before)).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,415 @@
+"""
+Vega-Lite specifications of the dashboard charts.
+
+Every chart is defined once with Altair and compiled on first use into a
+`SpecTemplate`: a static spec whose inline dataset (and the few encodings
+that depend on the data) are filled in per request, so callbacks skip the
+Altair object tree, the JSON-schema validation and the dataset hashing.
+
+Once a browser shows the spec of a template, `spec_update` sends it only
+the data-dependent parts as a Dash `Patch`.
+
+Usage:
+    python -m src.specs [--repeat 200]
+
+compares the time of building each chart with Altair to rendering it from
+its template, and the response size of a full spec to that of a patch.
+"""
+import argparse
+import functools
+import hashlib
+import json
+import re
+import time
+
+import pandas as pd
+
+from .metrics import metrics
+
+
+# Period column, axis title and chart title of the revenue trend at every granularity
+PERIODS = {
+    'month': ('MonthYear', 'Month-Year', 'Monthly Revenue Trend'),
+    'week': ('Week', 'Week', 'Weekly Revenue Trend'),
+    'day': ('Day', 'Day', 'Daily Revenue Trend'),
+}
+
+
+def monthly_revenue_chart(data, granularity='month'):
+    """
+    Line chart of the monthly revenue trend.
+
+    Parameters:
+    ----------
+    data : pandas.DataFrame
+        The 'MonthYear' and 'Revenue' of every month, in chronological order.
+    granularity : str, optional
+        'month' (default), 'week' or 'day', in which case `data` holds the
+        'Week' or 'Day' and 'Revenue' of every week or day.
+    """
+    import altair as alt
+
+    column, axis_title, title = PERIODS[granularity]
+    return alt.Chart(
+        data
+    ).mark_line(point=True, color='#361162').encode(
+        x=alt.X(f'{column}:N',
+                sort=data[column].tolist(),
+                title=axis_title),
+        y=alt.Y('Revenue:Q', title='Total Revenue (£)'),
+        tooltip=[  # Format tooltip values with commas
+            alt.Tooltip(f'{column}:N', title=axis_title),
+            alt.Tooltip('Revenue:Q', title='Total Revenue (£)', format=",.0f")
+        ]
+    ).properties(
+        title=title,
+        width='container',
+        height = 300
+    )
+
+
+def stacked_chart(data):
+    """
+    Stacked bar chart of the net revenue and refunds.
+
+    Parameters:
+    ----------
+    data : pandas.DataFrame
+        The 'Component', 'Value' and 'Total' of the net revenue and refunds.
+    """
+    import altair as alt
+
+    return alt.Chart(data).mark_bar(size=40).encode(  # Adjust size here
+        x=alt.X('Total:Q', title='Total Gross Revenue'),
+        y=alt.Y('Value:Q', title='Amount (£)'),
+        color=alt.Color('Component:N', scale=alt.Scale(domain=['Refunds', 'Net Revenue'], range=['#9A2A2A', '#ffcc87']),
+                        legend=alt.Legend(title='Category')
+                       ),
+        order=alt.Order('Component:N', sort='ascending'),  # Ensure correct stacking order,
+    tooltip=[
+        alt.Tooltip('Component:N', title='Category'),
+        alt.Tooltip('Value:Q', title='Amount (£)', format=",.2f")  # Format with pound symbol and commas
+    ]
+    ).properties(
+        title='Revenue Stacked Chart',
+        width=200,
+        height=300
+    )
+
+
+def top_products_chart(data, n_products=10):
+    """
+    Horizontal bar chart of the top products by revenue.
+
+    Parameters:
+    ----------
+    data : pandas.DataFrame
+        The 'Description', wrapped 'Product' name, 'Revenue' and 'Color' of
+        every product.
+    n_products : int, optional
+        The number of top products shown in the title, default is 10.
+    """
+    import altair as alt
+
+    # Plot the bar chart with consistent colors for the top 10 positions
+    return alt.Chart(data).mark_bar().encode(
+        x=alt.X('Revenue:Q', title='Revenue (£)'),
+        y=alt.Y('Product:N', sort='-x', title='Product Name'),
+        color=alt.Color('Color:N', scale=None, legend=None),  # Use consistent colors
+        tooltip=[
+            alt.Tooltip('Description:N', title='Description'),
+            alt.Tooltip('Revenue:Q', title='Revenue (£)', format=",.0f")
+        ]
+    ).properties(
+        title=f'Top {n_products} Products by Revenue',
+        width='container',
+        height=300
+    )
+
+
+def country_pie_chart(data):
+    """
+    Pie chart of the top countries outside of the UK, with a text layer of
+    country names and a 'selected_country' click selection.
+
+    Parameters:
+    ----------
+    data : pandas.DataFrame
+        The 'Country', 'Count' and 'Percentage' of every slice.
+    """
+    import altair as alt
+
+    # Create an Altair selection object for clicking on the pie slices
+    selection = alt.selection_point(fields=['Country'],
+                                    nearest= False,
+                                    empty=False,
+                                    name="selected_country")
+
+    # Create the Altair pie chart with percentages
+    pie_chart = alt.Chart(data).mark_arc().encode(
+        theta=alt.Theta(field="Percentage", type="quantitative").stack(True),
+        opacity=alt.condition(selection, alt.value(1), alt.value(0.5)),
+        tooltip=['Country', 'Percentage']
+    )
+
+    chart = pie_chart.mark_arc(outerRadius=120).encode(
+         color=alt.Color(field="Country", type="nominal", scale=alt.Scale(scheme='magma'), legend=None)
+    ).add_params(selection).properties(
+        title="Top 5 Countries Outside of the UK",
+        width='container',
+        height = 300
+    )
+
+    text = pie_chart.mark_text(
+        size=10, fontWeight='bold', color='black', radius=140
+    ).encode(
+        text=alt.Text('Country:N'),  # Show country names
+    )
+
+    return chart + text
+
+
+class SpecTemplate:
+    """
+    A chart compiled once into a static Vega-Lite spec, rendered per request
+    by injecting the data values.
+
+    Rendered specs share every unchanged part of the template, so they must
+    be treated as read-only. Their 'usermeta' holds the version of the
+    template and the paths of the data-dependent values, which `spec_update`
+    uses to patch a spec already shown by the browser.
+
+    Parameters:
+    ----------
+    chart : altair.TopLevelMixin
+        The chart, built from a frame with the columns and dtypes of the data
+        it will be rendered with.
+    name : str
+        The name of the inline dataset.
+    patch_paths : iterable, optional
+        The paths of keys of the data-dependent values besides the dataset,
+        e.g. [('encoding', 'x', 'sort')].
+    """
+
+    def __init__(self, chart, name, patch_paths=()):
+        self.name = f'data-{name}'
+        spec = chart.to_dict()
+        spec.pop('datasets', None)
+        spec['data'] = {'name': self.name}
+
+        # Altair numbers views with a process-wide counter, renumber them so
+        # every worker compiles the same spec
+        views = {}
+        text = re.sub(r'"view_\d+"', lambda match: views.setdefault(match.group(), f'"view_{len(views) + 1}"'),
+                      json.dumps(spec, sort_keys=True))
+        self.spec = json.loads(text)
+        self.version = hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+        self.spec['usermeta'] = {'template': self.version, 'patch': [list(path) for path in patch_paths]}
+
+    @metrics.timed('spec')
+    def render(self, data, overrides=None):
+        """
+        Returns the spec of the chart for `data`.
+
+        Parameters:
+        ----------
+        data : pandas.DataFrame
+            The rows of the inline dataset.
+        overrides : dict or None, optional
+            Data-dependent values of the spec, by path of keys, e.g.
+            {('encoding', 'x', 'sort'): [...]}.
+
+        Returns:
+        -------
+        dict
+            The Vega-Lite spec.
+        """
+        spec = dict(self.spec)
+        spec['datasets'] = {self.name: to_values(data)}
+        for path, value in (overrides or {}).items():
+            spec = _replace(spec, path, value)
+        return spec
+
+
+@metrics.timed('spec')
+def spec_update(spec, rendered=None):
+    """
+    Returns the update of a Vega component to `spec`.
+
+    Parameters:
+    ----------
+    spec : dict
+        The spec rendered from a template.
+    rendered : str or None, optional
+        The version of the template whose spec the component shows.
+
+    Returns:
+    -------
+    tuple
+        The full spec and its template version when the component shows
+        another template, otherwise a `dash.Patch` of the dataset and the
+        data-dependent values, and `dash.no_update`.
+    """
+    from dash import Patch, no_update
+
+    meta = spec.get('usermeta', {})
+    version = meta.get('template')
+    if version is None or version != rendered:
+        return spec, version
+
+    patch = Patch()
+    for name, values in spec['datasets'].items():
+        patch['datasets'][name] = values
+    for path in meta['patch']:
+        target, value = patch, spec
+        for key in path[:-1]:
+            target, value = target[key], value[key]
+        target[path[-1]] = value[path[-1]]
+    return patch, no_update
+
+
+def to_values(data):
+    """
+    Converts a frame to the list of records of an inline dataset, with
+    missing values as None like Altair does.
+    """
+    records = data.to_dict('records')
+    if data.isna().to_numpy().any():
+        records = [{key: (None if _is_missing(value) else value) for key, value in record.items()}
+                   for record in records]
+    return records
+
+
+def _is_missing(value):
+    return not isinstance(value, (list, tuple)) and pd.isna(value)
+
+
+def _replace(node, path, value):
+    # Copies the nodes along `path` only, the rest stays shared with the template
+    node = dict(node)
+    key = path[0]
+    node[key] = value if len(path) == 1 else _replace(node.get(key, {}), path[1:], value)
+    return node
+
+
+# Empty frames with the columns and dtypes of every chart's data, so the
+# compiled templates do not depend on the data of the first request
+_SCHEMAS = {
+    'monthly_revenue': {'MonthYear': 'object', 'Revenue': 'float64'},
+    'stacked': {'Component': 'object', 'Value': 'float64', 'Total': 'float64'},
+    'top_products': {'Description': 'object', 'Revenue': 'float64', 'Product': 'object',
+                     'Rank': 'int64', 'Color': 'object'},
+    'country_pie': {'Country': 'object', 'Count': 'int64', 'Percentage': 'float64'},
+}
+
+
+def _empty(name):
+    return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in _SCHEMAS[name].items()})
+
+
+@functools.lru_cache(maxsize=None)
+def get_template(name, n_products=10, granularity='month'):
+    """
+    Returns the compiled template of a chart: 'monthly_revenue' (one per
+    `granularity`), 'stacked', 'top_products' (one per `n_products`) or
+    'country_pie'.
+    """
+    if name == 'monthly_revenue':
+        data = _empty(name).rename(columns={'MonthYear': PERIODS[granularity][0]})
+        return SpecTemplate(monthly_revenue_chart(data, granularity), f'{name}-{granularity}',
+                            [('encoding', 'x', 'sort')])
+    if name == 'stacked':
+        return SpecTemplate(stacked_chart(_empty(name)), name)
+    if name == 'top_products':
+        return SpecTemplate(top_products_chart(_empty(name), n_products), f'{name}-{n_products}')
+    if name == 'country_pie':
+        return SpecTemplate(country_pie_chart(_empty(name)), name)
+    raise ValueError(f"Unknown chart '{name}'")
+
+
+def monthly_revenue_spec(data, granularity='month'):
+    """Returns the spec of `monthly_revenue_chart` for `data`."""
+    # The periods come in chronological order, which is the axis order
+    periods = data[PERIODS[granularity][0]].tolist()
+    return get_template('monthly_revenue', granularity=granularity).render(
+        data, {('encoding', 'x', 'sort'): periods})
+
+
+def stacked_spec(data):
+    """Returns the spec of `stacked_chart` for `data`."""
+    return get_template('stacked').render(data)
+
+
+def top_products_spec(data, n_products=10):
+    """Returns the spec of `top_products_chart` for `data`."""
+    return get_template('top_products', n_products).render(data)
+
+
+def country_pie_spec(data):
+    """Returns the spec of `country_pie_chart` for `data`."""
+    return get_template('country_pie').render(data)
+
+
+def sample_data():
+    """Chart data the size of the production charts, by chart name."""
+    months = pd.period_range('2010-12', '2011-12', freq='M').strftime('%b-%Y')
+    descriptions = [f'PRODUCT NUMBER {i} WITH A LONG DESCRIPTION' for i in range(10)]
+    return {
+        'monthly_revenue': pd.DataFrame({'MonthYear': list(months), 'Revenue': [750_000.5 + i for i in range(len(months))]}),
+        'stacked': pd.DataFrame({'Component': ['Net Revenue', 'Refunds'], 'Value': [8_300_000.25, 890_000.5],
+                                 'Total': [9_190_000.75, 9_190_000.75]}),
+        'top_products': pd.DataFrame({'Description': descriptions, 'Revenue': [float(200_000 - i) for i in range(10)],
+                                      'Product': [[d[:30], d[30:]] for d in descriptions], 'Rank': range(1, 11),
+                                      'Color': ['#150e37'] * 10}),
+        'country_pie': pd.DataFrame({'Country': ['Germany', 'France', 'Ireland', 'Spain', 'Netherlands', 'Others'],
+                                     'Count': [9000, 8000, 7000, 2500, 2300, 10000],
+                                     'Percentage': [23.1, 20.5, 18.0, 6.4, 5.9, 26.1]}),
+    }
+
+
+def run_benchmark(repeat=200):
+    """
+    Times building every chart with Altair and rendering it from its
+    template, and measures the JSON response size of the full spec and of
+    its patch, on `sample_data`.
+
+    Returns:
+    -------
+    pandas.DataFrame
+        The mean 'altair_ms' and 'template_ms' per chart, the 'speedup', and
+        the 'spec_bytes' and 'patch_bytes' of a response.
+    """
+    from plotly.io.json import to_json_plotly
+
+    builders = {
+        'monthly_revenue': (lambda data: monthly_revenue_chart(data).to_dict(), monthly_revenue_spec),
+        'stacked': (lambda data: stacked_chart(data).to_dict(), stacked_spec),
+        'top_products': (lambda data: top_products_chart(data).to_dict(), top_products_spec),
+        'country_pie': (lambda data: country_pie_chart(data).to_dict(), country_pie_spec),
+    }
+    rows = []
+    for name, data in sample_data().items():
+        times = []
+        for build in builders[name]:
+            build(data)  # Warm up, compiles the template
+            start = time.perf_counter()
+            for _ in range(repeat):
+                build(data)
+            times.append((time.perf_counter() - start) / repeat * 1000)
+        spec = builders[name][1](data)
+        patch, _ = spec_update(spec, spec['usermeta']['template'])
+        rows.append({'chart': name, 'altair_ms': times[0], 'template_ms': times[1], 'speedup': times[0] / times[1],
+                     'spec_bytes': len(to_json_plotly(spec)), 'patch_bytes': len(to_json_plotly(patch))})
+    return pd.DataFrame(rows).set_index('chart')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare Altair chart building to spec templates and patches.')
+    parser.add_argument('--repeat', type=int, default=200, help='renders per chart')
+    args = parser.parse_args(argv)
+
+    print(run_benchmark(args.repeat).round(3).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Startup benchmark of the dashboard.
+
+Usage:
+    python -m src.startup [--repeat 5] [--budget 1.5]
+
+Every run starts a fresh interpreter, imports `src.app`, then creates the
+app, and reports the median time of both steps against the startup budget.
+It also lists the heavy modules loaded by the import, which should be none:
+pandas, altair and the dataset are only loaded by the first callback.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Seconds allowed for importing `src.app` and creating the app
+STARTUP_BUDGET = 1.5
+
+# Modules deferred until a callback needs them
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'altair', 'dash_vega_components']
+
+_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import src.app
+imported = time.perf_counter()
+heavy = [name for name in {heavy!r} if name in sys.modules]
+if {create!r}:
+    src.app.create_app()
+created = time.perf_counter()
+print(json.dumps({{'import': imported - start, 'create': created - imported, 'heavy': heavy}}))
+'''
+
+
+def measure(create=True):
+    """
+    Imports `src.app` (and creates the app) in a fresh interpreter.
+
+    Parameters:
+    ----------
+    create : bool, optional
+        Whether to also create the app, which reads the metadata sidecar.
+
+    Returns:
+    -------
+    dict
+        The 'import' and 'create' times in seconds and the 'heavy' modules
+        loaded by the import.
+    """
+    probe = _PROBE.format(heavy=HEAVY_MODULES, create=create)
+    output = subprocess.run([sys.executable, '-c', probe], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def run_benchmark(repeat=5, budget=STARTUP_BUDGET, create=True):
+    """
+    Measures the startup `repeat` times and compares the median to `budget`.
+
+    Returns:
+    -------
+    dict
+        The median 'import', 'create' and 'total' times in seconds, the
+        'heavy' modules loaded by the import and whether the startup is
+        'within_budget'.
+    """
+    runs = [measure(create) for _ in range(repeat)]
+    result = {
+        'import': statistics.median(run['import'] for run in runs),
+        'create': statistics.median(run['create'] for run in runs),
+        'heavy': sorted({name for run in runs for name in run['heavy']}),
+    }
+    result['total'] = result['import'] + result['create']
+    result['within_budget'] = result['total'] <= budget
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the startup time of the RetaiLense dashboard.')
+    parser.add_argument('--repeat', type=int, default=5, help='number of fresh interpreters')
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET, help='startup budget in seconds')
+    parser.add_argument('--no-create', action='store_true', help='only import src.app')
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.repeat, args.budget, create=not args.no_create)
+    print(f"import src.app  {result['import']:.3f}s")
+    print(f"create_app()    {result['create']:.3f}s")
+    print(f"total           {result['total']:.3f}s (budget {args.budget:.3f}s)")
+    print(f"heavy modules   {', '.join(result['heavy']) or 'none'}")
+    return 0 if result['within_budget'] and not result['heavy'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import json
+import subprocess
+import time
+import urllib.request
+
+import pandas as pd
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.app import create_app
+from src.benchmark import synthetic_invoices
+from src.loadtest import _free_port
+from src.startup import measure
+
+
+def test_import_defers_heavy_modules():
+    """Test that importing the app loads neither pandas, altair nor the dataset."""
+    assert measure(create=False)["heavy"] == []
+
+
+def test_create_app_builds_layout_from_injected_data():
+    """Test that the filters span the injected data instead of the production file."""
+    data = pd.DataFrame({
+        "InvoiceDate": pd.to_datetime(["2011-03-01", "2011-01-15", "2011-02-01"]),
+        "Country": ["Spain", "France", "Spain"],
+    })
+    app = create_app({"RESULT_CACHE_DIR": None, "DATA_PATH": "missing.parquet"}, data=data)
+
+    date_picker = app.layout["date-picker-range"]
+    assert (date_picker.start_date, date_picker.end_date) == ("2011-01-15", "2011-03-01")
+    assert [option["value"] for option in app.layout["country-dropdown"].options] == ["France", "Spain"]
+
+
+def test_entry_point_serves_callbacks_from_its_cache(tmp_path):
+    """Test that `python -m src.app` answers callbacks through the result cache it set up."""
+    root = os.path.join(os.path.dirname(__file__), '..')
+    path = tmp_path / "data" / "processed" / "processed_data.parquet"
+    path.parent.mkdir(parents=True)
+    synthetic_invoices(5000).to_parquet(path)
+
+    port = _free_port()
+    env = {**os.environ, "PYTHONPATH": os.path.abspath(root), "PORT": str(port)}
+    server = subprocess.Popen([sys.executable, "-m", "src.app"], cwd=tmp_path, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f"http://127.0.0.1:{port}"
+        for _ in range(300):
+            try:
+                urllib.request.urlopen(url, timeout=5)
+                break
+            except OSError:
+                time.sleep(0.1)
+
+        output = tmp_path / "loadtest.json"
+        subprocess.run([sys.executable, "-m", "src.loadtest", "--url", url, "--users", "1", "--duration", "1",
+                        "--output", str(output)], cwd=root, check=True, capture_output=True)
+        assert json.loads(output.read_text())["error_rate"] == 0
+
+        # The callbacks used the cache configured by create_app, with its on-disk tier
+        metrics = urllib.request.urlopen(url + "/metrics", timeout=5).read().decode()
+        assert 'retailense_cache_lookups_total{callback="compute_kpis",outcome="miss"}' in metrics
+        assert any(name.startswith("v-") for name in os.listdir(tmp_path / "tmp"))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
@@ -0,0 +1,183 @@
+import pytest
+import numpy as np
+import pandas as pd
+from flask import Flask
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.backends import PandasBackend, DuckDBBackend, get_backend
+import src.data
+from src.data import DATA_PATH, data_version, load_data, set_data
+
+duckdb = pytest.importorskip("duckdb")
+
+
+def make_mock_data(n=2000, seed=0):
+    """Invoice lines in the processed format: refunds, anonymous customers and missing descriptions."""
+    rng = np.random.default_rng(seed)
+    invoice = rng.integers(536365, 537000, n).astype(str).astype(object)
+    quantity = rng.integers(1, 12, n)
+    refund = rng.random(n) < 0.05
+    quantity[refund] *= -1
+    invoice[refund] = "C" + invoice[refund]
+    unit_price = np.round(rng.gamma(2, 2, n), 2)
+    dates = pd.Timestamp("2011-01-01") + pd.to_timedelta(rng.integers(0, 100, n), unit="D")
+    description = rng.choice([f"PRODUCT {i}" for i in range(40)], n).astype(object)
+    description[rng.random(n) < 0.01] = None
+    return pd.DataFrame({
+        "InvoiceNo": invoice,
+        "StockCode": rng.integers(20000, 20040, n).astype(str),
+        "Description": description,
+        "Quantity": quantity,
+        "InvoiceDate": dates.date,
+        "UnitPrice": unit_price,
+        "CustomerID": np.where(rng.random(n) < 0.7, rng.integers(12346, 12500, n), np.nan),
+        "Country": rng.choice(["United Kingdom", "Germany", "France", "Ireland", "Spain",
+                               "Netherlands", "Belgium", "Norway"], n,
+                              p=[0.6, 0.1, 0.08, 0.06, 0.05, 0.04, 0.04, 0.03]),
+        "Revenue": quantity * unit_price,
+        "MonthYear": pd.to_datetime(dates).strftime("%b-%Y"),
+    })
+
+
+@pytest.fixture(scope="module")
+def parquet_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("data") / "processed_data.parquet"
+    make_mock_data().to_parquet(path)
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def backends(parquet_path):
+    """Both backends answering from the same parquet fixture."""
+    frame = load_data(parquet_path)
+    yield PandasBackend(frame), DuckDBBackend(parquet_path, threads=2)
+
+
+FILTERS = [
+    ("2011-01-01", "2011-04-30", ["United Kingdom"]),
+    ("2011-01-15", "2011-03-10", ["Germany", "France", "Spain"]),
+    ("2011-02-01", "2011-02-28", ["Norway", "Belgium", "Ireland", "Netherlands"]),
+    ("2011-02-10", "2011-02-10", ["France"]),
+    ("2012-01-01", "2012-01-31", ["Germany"]),
+    ("2011-01-01", "2011-04-30", []),
+]
+
+
+def assert_frames_match(left, right):
+    assert list(left.columns) == list(right.columns)
+    assert len(left) == len(right)
+    for column in left.columns:
+        if pd.api.types.is_float_dtype(left[column]):
+            assert left[column].tolist() == pytest.approx(right[column].tolist())
+        else:
+            assert left[column].tolist() == right[column].tolist()
+
+
+@pytest.mark.parametrize("start_date, end_date, countries", FILTERS)
+def test_monthly_revenue_parity(backends, start_date, end_date, countries):
+    """Test that both backends return the same monthly revenue."""
+    pandas_backend, duckdb_backend = backends
+    assert_frames_match(pandas_backend.monthly_revenue(start_date, end_date, countries),
+                        duckdb_backend.monthly_revenue(start_date, end_date, countries))
+
+
+@pytest.mark.parametrize("granularity", ["week", "day"])
+@pytest.mark.parametrize("start_date, end_date, countries", FILTERS)
+def test_revenue_series_parity(backends, start_date, end_date, countries, granularity):
+    """Test that both backends return the same weekly and daily revenue."""
+    pandas_backend, duckdb_backend = backends
+    assert_frames_match(pandas_backend.monthly_revenue(start_date, end_date, countries, granularity),
+                        duckdb_backend.monthly_revenue(start_date, end_date, countries, granularity))
+
+
+@pytest.mark.parametrize("start_date, end_date, countries", FILTERS)
+@pytest.mark.parametrize("n_products", [1, 10, 100])
+def test_top_products_parity(backends, start_date, end_date, countries, n_products):
+    """Test that both backends return the same top products."""
+    pandas_backend, duckdb_backend = backends
+    assert_frames_match(pandas_backend.top_products(start_date, end_date, countries, n_products),
+                        duckdb_backend.top_products(start_date, end_date, countries, n_products))
+
+
+@pytest.mark.parametrize("start_date, end_date, countries", FILTERS)
+def test_country_shares_parity(backends, start_date, end_date, countries):
+    """Test that both backends return the same country shares, with and without the UK."""
+    pandas_backend, duckdb_backend = backends
+    assert_frames_match(pandas_backend.country_shares(start_date, end_date),
+                        duckdb_backend.country_shares(start_date, end_date))
+    assert_frames_match(pandas_backend.country_shares(start_date, end_date, exclude=["United Kingdom"]),
+                        duckdb_backend.country_shares(start_date, end_date, exclude=["United Kingdom"]))
+
+
+@pytest.mark.parametrize("start_date, end_date, countries", FILTERS)
+def test_kpis_parity(backends, start_date, end_date, countries):
+    """Test that both backends return the same KPI totals."""
+    pandas_backend, duckdb_backend = backends
+    left = pandas_backend.kpis(start_date, end_date, countries)
+    right = duckdb_backend.kpis(start_date, end_date, countries)
+
+    assert left.keys() == right.keys()
+    for name in left:
+        assert left[name] == pytest.approx(right[name]), name
+
+
+@pytest.mark.parametrize("start_date, end_date, countries", FILTERS)
+def test_distinct_counts_parity(backends, start_date, end_date, countries):
+    """Test that both backends return the same distinct counts."""
+    pandas_backend, duckdb_backend = backends
+    assert pandas_backend.distinct_counts(start_date, end_date, countries) == \
+        duckdb_backend.distinct_counts(start_date, end_date, countries)
+
+
+def test_distinct_counts_are_estimated_for_long_ranges(backends):
+    """Test that both backends estimate distinct counts beyond APPROXIMATE_DISTINCT_DAYS, and stay exact below."""
+    exact = backends[0].distinct_counts("2011-01-01", "2011-04-30", None)
+    server = Flask(__name__)
+    server.config["APPROXIMATE_DISTINCT_DAYS"] = 30
+    with server.app_context():
+        for backend in backends:
+            assert not backend.approximate("2011-01-01", "2011-01-30")
+            assert backend.approximate("2011-01-01", "2011-01-31")
+            estimate = backend.distinct_counts("2011-01-01", "2011-04-30", None)
+            for name, count in exact.items():
+                assert estimate[name] == pytest.approx(count, rel=0.05), name
+
+
+def test_duckdb_backend_does_not_load_the_dataset(parquet_path):
+    """Test that the DuckDB backend answers the callbacks' dataset without loading it into pandas."""
+    try:
+        set_data(None, parquet_path)
+        backend = get_backend(name="duckdb")
+        assert backend.kpis("2011-01-01", "2011-04-30", None)["lines"] == 2000
+        data_version()
+        assert src.data._data is None
+    finally:
+        set_data(None, DATA_PATH)
+
+
+def test_get_backend_rejects_unknown_names():
+    """Test that an unknown backend name raises a ValueError."""
+    with pytest.raises(ValueError):
+        get_backend(make_mock_data(10), name="sqlite")
+
+
+def test_pandas_backend_keeps_its_frame(parquet_path):
+    """Test that a backend of a temporary frame still answers once nothing else references the frame."""
+    import gc
+
+    backend = get_backend(frame=load_data(parquet_path), name="pandas")
+    gc.collect()
+    assert backend.kpis("2011-01-01", "2011-04-30", None)["lines"] == 2000
+
+
+def test_duckdb_backend_rejects_an_injected_frame(parquet_path):
+    """Test that the DuckDB backend refuses a frame set with set_data instead of silently reading the file."""
+    try:
+        set_data(make_mock_data(10), parquet_path)
+        with pytest.raises(ValueError):
+            get_backend(name="duckdb")
+    finally:
+        set_data(None, DATA_PATH)
@@ -0,0 +1,70 @@
+import pytest
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.benchmark import SCENARIOS, compare, run_benchmark, synthetic_invoices
+from src.data import prepare_data
+
+
+@pytest.fixture(scope="module")
+def invoices():
+    return synthetic_invoices(20_000, seed=3)
+
+
+def test_synthetic_invoices_look_like_the_dataset(invoices):
+    """Test that the synthetic lines have the processed schema and the traits of the dataset."""
+    assert list(invoices.columns) == ["InvoiceNo", "StockCode", "Description", "Quantity", "InvoiceDate",
+                                      "UnitPrice", "CustomerID", "Country", "Revenue", "MonthYear"]
+    assert len(invoices) == 20_000
+
+    # Skewed country mix and long-tail products
+    shares = invoices["Country"].value_counts(normalize=True)
+    assert shares.index[0] == "United Kingdom" and shares.iloc[0] > 0.8
+    assert invoices["Description"].value_counts().iloc[0] > 20 * invoices["Description"].value_counts().median()
+
+    # Refund invoices carry negative quantities, some invoices are anonymous
+    refunds = invoices["InvoiceNo"].astype(str).str.startswith("C")
+    assert refunds.any() and (invoices.loc[refunds, "Quantity"] < 0).all()
+    assert (invoices.loc[~refunds, "Quantity"] > 0).all()
+    assert 0.1 < invoices["CustomerID"].isna().mean() < 0.4
+    assert (invoices["InvoiceDate"].dt.dayofweek != 5).all()
+
+    # Lines of an invoice share its country, date and customer
+    per_invoice = invoices.groupby("InvoiceNo", observed=True)[["Country", "InvoiceDate"]].nunique()
+    assert (per_invoice == 1).all().all()
+
+
+def test_synthetic_invoices_prepare_like_the_dataset(invoices):
+    """Test that the synthetic lines go through the loader's preparation unchanged in content."""
+    frame = prepare_data(invoices.copy())
+    assert len(frame) == len(invoices)
+    assert frame["RevenuePence"].sum() == pytest.approx(round(invoices["Revenue"].sum() * 100), abs=len(frame))
+
+
+def test_run_benchmark_reports_every_callback_and_scenario():
+    """Test that the results hold the latency percentiles and peak memory of every callback and scenario."""
+    scenarios = dict(list(SCENARIOS.items())[:2])
+    run = run_benchmark(rows=[5_000], repeat=3, scenarios=scenarios)
+
+    assert len(run["results"]) == 6 * len(scenarios)
+    for result in run["results"]:
+        assert result["rows"] == 5_000
+        assert 0 < result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+        assert result["peak_mb"] >= 0
+    assert run["sizes"][0]["rows"] == 5_000
+
+
+def test_compare_flags_regressions():
+    """Test that only latencies above the tolerance on matching sizes and scenarios are regressions."""
+    def run(*latencies):
+        return {"results": [{"rows": rows, "callback": "update_cards", "scenario": "wide", "p95_ms": latency}
+                            for rows, latency in latencies]}
+
+    previous = run((1_000, 10.0), (10_000, 20.0))
+    current = run((1_000, 12.0), (10_000, 30.0), (100_000, 90.0))
+    regressions = compare(previous, current, tolerance=0.25)
+
+    assert [(regression["rows"], regression["current"]) for regression in regressions] == [(10_000, 30.0)]
+    assert regressions[0]["change"] == pytest.approx(0.5)
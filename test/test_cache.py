@@ -0,0 +1,160 @@
+import os
+import time
+
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.cache import DiskCache, ResultCache, filter_key
+
+
+class DictCache:
+    """Shared tier keeping entries in a dict, with the DiskCache get/set interface."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries[key] = value
+
+
+def make_counted(cache, **kwargs):
+    calls = []
+
+    @cache.memoize(**kwargs)
+    def chart(start_date, end_date, countries):
+        calls.append((start_date, end_date, countries))
+        return {"countries": countries}
+
+    return chart, calls
+
+
+def test_filter_key_is_canonical():
+    """Test that equivalent filters share a key while None and [] stay distinct."""
+    assert filter_key("2011-01-01", "2011-02-01", ["France", "Germany"]) == \
+        filter_key("2011-01-01T00:00:00", "2011-02-01", ["Germany", "France", "Germany"])
+    assert filter_key("2011-01-01", "2011-02-01", None) != filter_key("2011-01-01", "2011-02-01", [])
+    assert filter_key("2011-01-01", "2011-02-01", ["France"], 10) != filter_key("2011-01-01", "2011-02-01", ["France"], 5)
+
+
+def test_memoize_hits_on_reordered_countries():
+    """Test that a reordered country list is served from the cache."""
+    cache = ResultCache()
+    chart, calls = make_counted(cache)
+
+    first = chart("2011-01-01", "2011-02-01", ["France", "Germany"])
+    assert chart("2011-01-01", "2011-02-01", ["Germany", "France"]) == first
+    assert len(calls) == 1
+    assert cache.stats()["chart"] == {"hits": 1, "shared_hits": 0, "misses": 1, "evictions": 0}
+
+
+def test_memoize_binds_keywords_and_defaults():
+    """Test that keyword arguments and omitted defaults share the entry of the positional call."""
+    cache = ResultCache()
+    calls = []
+
+    @cache.memoize()
+    def chart(start_date, end_date, countries, n_products=10):
+        calls.append(n_products)
+        return n_products
+
+    assert chart("2011-01-01", "2011-02-01", ["France"]) == 10
+    assert chart("2011-01-01", "2011-02-01", ["France"], 10) == 10
+    assert chart(start_date="2011-01-01T00:00:00", end_date="2011-02-01", countries=["France"], n_products=10) == 10
+    assert chart("2011-01-01", "2011-02-01", countries=["France"], n_products=5) == 5
+    assert calls == [10, 5]
+
+
+def test_lru_evicts_least_recently_used():
+    """Test that the in-process tier keeps at most `maxsize` results and counts evictions."""
+    cache = ResultCache(maxsize=2)
+    chart, calls = make_counted(cache)
+
+    chart("2011-01-01", "2011-02-01", ["France"])
+    chart("2011-01-01", "2011-02-01", ["Spain"])
+    chart("2011-01-01", "2011-02-01", ["France"])  # France becomes the most recent
+    chart("2011-01-01", "2011-02-01", ["Italy"])   # Evicts Spain
+    chart("2011-01-01", "2011-02-01", ["France"])
+    chart("2011-01-01", "2011-02-01", ["Spain"])
+
+    assert [call[2] for call in calls] == [["France"], ["Spain"], ["Italy"], ["Spain"]]
+    assert cache.stats()["chart"]["evictions"] == 2
+
+
+def test_shared_tier_is_promoted():
+    """Test that a result cached by another process is read once from the shared tier."""
+    shared = DictCache()
+    chart, _ = make_counted(ResultCache(shared))
+    chart("2011-01-01", "2011-02-01", ["France"])
+
+    # A fresh in-process tier, as in another worker
+    cache = ResultCache(shared)
+    chart, calls = make_counted(cache)
+    chart("2011-01-01", "2011-02-01", ["France"])
+    chart("2011-01-01", "2011-02-01", ["France"])
+
+    assert calls == []
+    assert cache.stats()["chart"] == {"hits": 1, "shared_hits": 1, "misses": 0, "evictions": 0}
+
+
+def test_disabled_in_process_tier():
+    """Test that maxsize=0 recomputes every call without a shared tier."""
+    cache = ResultCache(maxsize=0)
+    chart, calls = make_counted(cache)
+    chart("2011-01-01", "2011-02-01", None)
+    chart("2011-01-01", "2011-02-01", None)
+    assert len(calls) == 2
+
+
+def test_results_are_namespaced_by_data_version():
+    """Test that a new dataset version never serves results of the previous one."""
+    version = ["a"]
+    cache = ResultCache(DictCache(), version=lambda: version[0])
+    chart, calls = make_counted(cache)
+
+    chart("2011-01-01", "2011-02-01", ["France"])
+    version[0] = "b"
+    chart("2011-01-01", "2011-02-01", ["France"])
+    assert len(calls) == 2
+
+
+def test_disk_cache_round_trip_is_compressed(tmp_path):
+    """Test that entries are read back unchanged and stored compressed."""
+    disk = DiskCache(str(tmp_path))
+    blob = b"spec" * 10_000
+    disk.set(("v1", "chart", ("2011-01-01",)), blob)
+
+    assert disk.get(("v1", "chart", ("2011-01-01",))) == blob
+    assert disk.get(("v1", "chart", ("2011-01-02",))) is None
+    stored = [os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(tmp_path) for name in names]
+    assert stored and max(stored) < len(blob) / 10
+
+
+def test_disk_cache_purges_other_versions(tmp_path):
+    """Test that seeing a new dataset version removes the entries of the old one."""
+    DiskCache(str(tmp_path)).set(("old", "chart", ()), b"old")
+
+    disk = DiskCache(str(tmp_path))
+    disk.set(("new", "chart", ()), b"new")
+    for _ in range(100):
+        if sorted(os.listdir(tmp_path)) == ["v-new"]:
+            break
+        time.sleep(0.01)
+
+    assert sorted(os.listdir(tmp_path)) == ["v-new"]
+    assert disk.get(("new", "chart", ())) == b"new"
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    """Test that the entries are kept under the byte budget, oldest first."""
+    disk = DiskCache(str(tmp_path), max_bytes=2500, level=0)
+    for i in range(3):
+        disk.set(("v", "chart", (i,)), bytes(1000))
+        # Distinct modification times, oldest first
+        path = disk._path(("v", "chart", (i,)))
+        os.utime(path, (i, i))
+    disk.set(("v", "chart", (3,)), bytes(1000))
+
+    assert [disk.get(("v", "chart", (i,))) is not None for i in range(4)] == [False, False, True, True]
@@ -1,8 +1,12 @@
 import pytest
 import pandas as pd
 import altair as alt
+from contextvars import copy_context
 from datetime import datetime
-from unittest.mock import patch
+
+from dash import no_update
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
 
 import sys
 import os
@@ -14,17 +18,15 @@ from src.callbacks import (
     plot_top_products_revenue,
     plot_top_countries_pie_chart,
     update_cards,
+    compute_kpis,
+    compute_country_shares,
     compute_other_countries,
     store_selected_country,
-    update_country_dropdown
+    update_country_dropdown,
+    update_dashboard
 )
-from src.app import cache
-
-def disable_cache():
-    cache.clear()  # Clear any existing cache
-    cache.memoize = lambda *args, **kwargs: lambda func: func  # Disable caching
-
-disable_cache()
+from src.app import create_app, result_cache
+from src.data import set_data
 
 
 # Sample mock data
@@ -50,11 +52,42 @@ mock_data = pd.DataFrame({
     "MonthYear": ["Jan-2024", "Jan-2024", "Jan-2024", "Jan-2024", "Jan-2024", "Feb-2024", "Feb-2024", "Mar-2024", "Mar-2024", "Mar-2024"]
 })
 
+# App with caching disabled, answering from the mock data
+app = create_app({'RESULT_CACHE_DIR': None, 'RESULT_CACHE_MAXSIZE': 0},
+                 data=mock_data)
+
+
 @pytest.fixture
 def setup_mock_data():
-    """Fixture to patch the global df variable with mock data."""
-    with patch("src.callbacks.df", mock_data):
-        yield
+    """Fixture to inject the mock data as the dataset."""
+    set_data(mock_data)
+    yield
+    set_data(None)
+
+
+@pytest.fixture
+def enabled_cache(monkeypatch):
+    """Fixture enabling the in-process result cache, empty before and after the test."""
+    monkeypatch.setattr(result_cache, "maxsize", 256)
+    result_cache.clear()
+    yield result_cache
+    result_cache.clear()
+
+
+@pytest.fixture
+def counted_backend(enabled_cache, monkeypatch):
+    """Fixture counting the backend lookups of the callbacks, with the result cache enabled."""
+    import src.callbacks
+
+    backend_calls = []
+    backend = src.callbacks._backend
+
+    def counted():
+        backend_calls.append(1)
+        return backend()
+
+    monkeypatch.setattr(src.callbacks, "_backend", counted)
+    return backend_calls
 
 
 
@@ -151,8 +184,8 @@ def test_plot_stacked_chart(setup_mock_data):
     net_revenue_chart_value = chart_data.loc[chart_data["Component"] == "Net Revenue", "Value"].values[0]
     refunds_chart_value = chart_data.loc[chart_data["Component"] == "Refunds", "Value"].values[0]
 
-    assert net_revenue_chart_value == net_revenue, f"Expected Net Revenue: {net_revenue}, Got: {net_revenue_chart_value}"
-    assert refunds_chart_value == refunds, f"Expected Refunds: {refunds}, Got: {refunds_chart_value}"
+    assert net_revenue_chart_value == pytest.approx(net_revenue, rel=1e-12), f"Expected Net Revenue: {net_revenue}, Got: {net_revenue_chart_value}"
+    assert refunds_chart_value == pytest.approx(refunds, rel=1e-12), f"Expected Refunds: {refunds}, Got: {refunds_chart_value}"
 
     # Ensure tooltip contains expected fields
     assert "tooltip" in chart_spec["encoding"], "Chart should include tooltips."
@@ -217,6 +250,24 @@ def test_plot_top_products_revenue(setup_mock_data):
     assert any(t["field"] == "Revenue" for t in chart_spec["encoding"]["tooltip"]), "Tooltip should contain 'Revenue'."
 
 
+def test_plot_top_products_revenue_beyond_palette():
+    """Test that more top products than palette colors reuse the colors in order."""
+    more_products = mock_data.copy()
+    more_products["StockCode"] = more_products["StockCode"] + "B"
+    more_products["Description"] = more_products["Description"] + " (LARGE)"
+    set_data(pd.concat([mock_data, more_products], ignore_index=True))
+    try:
+        chart_spec = plot_top_products_revenue("2024-01-01", "2024-03-31", ["Germany", "France", "Spain", "Italy"], 12)
+    finally:
+        set_data(None)
+
+    chart_data = pd.DataFrame(chart_spec["datasets"][chart_spec["data"]["name"]])
+    colors = list(chart_data.sort_values("Rank")["Color"])
+    assert len(colors) == 12
+    assert len(set(colors[:10])) == 10
+    assert colors[10:] == colors[:2]
+
+
 def test_plot_top_countries_pie_chart(setup_mock_data):
     """Test that the function generates a valid Altair pie chart specification."""
     
@@ -330,7 +381,41 @@ def test_update_cards_no_customers(setup_mock_data):
 
     # Validate Loyal Customer Ratio is 0%
     assert displayed_loyal_ratio == 0, f"Expected 0% loyal customers, but got {displayed_loyal_ratio}%"
+    assert card_loyal_customer_ratio[1].children.children == "0%", "An empty selection should show 0%, as before caching."
+
+
+def test_update_cards_hits_kpi_cache(setup_mock_data, counted_backend):
+    """Test that cards for an equivalent filter are rendered without querying the data again."""
+    first = update_cards("2024-01-01", "2024-03-31", ["Germany", "France"])
+    calls_after_miss = len(counted_backend)
+    second = update_cards("2024-01-01", "2024-03-31", ["France", "Germany", "France"])
+    stats = result_cache.stats()["compute_kpis"]
+
+    assert calls_after_miss > 0
+    assert len(counted_backend) == calls_after_miss, "A cache hit should not query the data."
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert [card[1].children.children for card in first] == [card[1].children.children for card in second]
+
 
+def test_compute_kpis_returns_plain_record(setup_mock_data):
+    """Test that the cached KPI record only holds plain floats."""
+    kpis = compute_kpis("2024-01-01", "2024-03-31", ["Germany", "France", "Spain", "Italy"])
+    assert set(kpis) == {"loyal_customer_ratio", "loyal_customer_sales", "net_sales", "total_returns"}
+    assert all(type(value) is float for value in kpis.values())
+
+
+
+def test_pie_chart_and_others_share_one_aggregation(setup_mock_data, counted_backend):
+    """Test that the pie chart and the "Others" list come from one country count and agree on the top 5."""
+    pie_spec = plot_top_countries_pie_chart("2024-01-01", "2024-03-31")
+    other_countries = compute_other_countries("2024-01-01", "2024-03-31", None)
+    shares = compute_country_shares("2024-01-01", "2024-03-31")
+
+    assert len(counted_backend) == 1
+    pie_countries = [row["Country"] for row in pie_spec["datasets"][pie_spec["data"]["name"]]]
+    assert pie_countries == shares["top"] + ["Others"]
+    assert other_countries == shares["others"]
+    assert not set(other_countries) & set(pie_countries)
 
 
 def test_compute_other_countries(setup_mock_data):
@@ -528,3 +613,120 @@ def test_update_country_dropdown_empty_other_countries(mock_dropdown_value):
     selected_country = "Others"
     result = update_country_dropdown(selected_country, [], mock_dropdown_value)
     assert result == [], "Expected an empty list when 'Others' has no countries."
+
+
+
+def count_invocations(dependencies, changed):
+    """
+    Counts the callback calls triggered by changing the `changed` props, the
+    way the Dash renderer cascades updates: every callback with a changed
+    input runs, then the props it outputs (except its own inputs) trigger
+    the next round.
+    """
+    calls = 0
+    for _ in range(10):  # Guard against cycles
+        triggered = [dependency for dependency in dependencies
+                     if any(f"{i['id']}.{i['property']}" in changed for i in dependency["inputs"])]
+        if not triggered:
+            return calls
+        calls += len(triggered)
+        changed = set()
+        for dependency in triggered:
+            inputs = {f"{i['id']}.{i['property']}" for i in dependency["inputs"]}
+            changed |= set(dependency["output"].strip(".").split("...")) - inputs
+    raise AssertionError("Callbacks trigger each other in a cycle.")
+
+
+@pytest.mark.parametrize("action", [
+    {"date-picker-range.start_date", "date-picker-range.end_date"},
+    {"country-dropdown.value"},
+    {"country-pie-chart.signalData"},
+    {"granularity.value"},
+])
+def test_one_round_trip_per_user_action(action):
+    """Test that a filter change or a pie click runs a single callback, without cascades."""
+    dependencies = app.server.test_client().get("/_dash-dependencies").get_json()
+    assert count_invocations(dependencies, action) == 1
+
+
+def run_triggered(prop_id, **kwargs):
+    """Runs update_dashboard as if `prop_id` triggered it."""
+    def run():
+        context_value.set(AttributeDict(triggered_inputs=[{"prop_id": prop_id, "value": None}]))
+        return update_dashboard(**kwargs)
+    return copy_context().run(run)
+
+
+def test_update_dashboard_pie_click(setup_mock_data):
+    """Test that a pie click sets the dropdown and updates the charts and cards for it, but not the pie."""
+    rendered = dict.fromkeys(["monthly_revenue", "stacked", "top_products", "country_pie"])
+    outputs = run_triggered("country-pie-chart.signalData", start_date="2024-01-01", end_date="2024-03-31",
+                            selected_countries=["United Kingdom"],
+                            signal_data={"selected_country": {"Country": ["Spain"]}}, granularity="month",
+                            rendered=rendered)
+
+    assert outputs["countries"] == ["Spain"]
+    assert outputs["country_pie"] == (no_update, no_update)
+    expected_cards = update_cards("2024-01-01", "2024-03-31", ["Spain"])
+    assert [card[1].children.children for card in outputs["cards"]] == [card[1].children.children for card in expected_cards]
+    spec, _ = outputs["monthly_revenue"]
+    assert spec == plot_monthly_revenue_chart("2024-01-01", "2024-03-31", ["Spain"])
+
+
+def test_update_dashboard_date_change(setup_mock_data):
+    """Test that a date change updates the pie chart and keeps the dropdown."""
+    rendered = dict.fromkeys(["monthly_revenue", "stacked", "top_products", "country_pie"])
+    outputs = run_triggered("date-picker-range.start_date", start_date="2024-01-01", end_date="2024-03-31",
+                            selected_countries=["Germany"], signal_data=None, granularity="month", rendered=rendered)
+
+    assert outputs["countries"] is no_update
+    spec, version = outputs["country_pie"]
+    assert spec == plot_top_countries_pie_chart("2024-01-01", "2024-03-31")
+    assert version == spec["usermeta"]["template"]
+
+
+def test_update_dashboard_granularity_change(setup_mock_data):
+    """Test that a granularity change only updates the revenue trend, with one point per week."""
+    rendered = dict.fromkeys(["monthly_revenue", "stacked", "top_products", "country_pie"])
+    outputs = run_triggered("granularity.value", start_date="2024-01-01", end_date="2024-03-31",
+                            selected_countries=["Germany"], signal_data=None, granularity="week",
+                            rendered=rendered)
+
+    spec, version = outputs["monthly_revenue"]
+    assert spec == plot_monthly_revenue_chart("2024-01-01", "2024-03-31", ["Germany"], "week")
+    assert version == spec["usermeta"]["template"]
+    weeks = [row["Week"] for row in spec["datasets"][spec["data"]["name"]]]
+    assert weeks == sorted(weeks) and spec["encoding"]["x"]["sort"] == weeks
+    assert all(outputs[name] == (no_update, no_update) for name in ["stacked", "top_products", "country_pie"])
+    assert outputs["cards"] == (no_update,) * 4
+
+
+def test_compute_country_shares_top_n(setup_mock_data, enabled_cache):
+    """Test that a non-default number of top countries is cached apart from the default split."""
+    top_3 = compute_country_shares("2024-01-01", "2024-03-31", 3)
+    top_5 = compute_country_shares("2024-01-01", "2024-03-31")
+
+    assert len(top_3["top"]) == 3 and top_3["top"][0] == "Germany"
+    assert top_3["top"] + top_3["others"] == top_5["top"]
+    assert top_5["others"] == []
+
+
+def test_callbacks_accept_keyword_arguments(setup_mock_data, enabled_cache):
+    """Test that cached callbacks called by keyword share the entries of positional calls."""
+    start_date, end_date, countries = "2024-01-01", "2024-03-31", ["Germany", "France"]
+
+    products = plot_top_products_revenue(start_date, end_date, countries, n_products=5)
+    assert plot_top_products_revenue(start_date, end_date, countries, 5) == products
+    weekly = plot_monthly_revenue_chart(start_date, end_date, countries, granularity="week")
+    assert plot_monthly_revenue_chart(start_date, end_date, countries, "week") == weekly
+    monthly = plot_monthly_revenue_chart(start_date, end_date, countries)
+    assert plot_monthly_revenue_chart(start_date, end_date, countries, "month") == monthly
+    shares = compute_country_shares(start_date, end_date, n_top=3)
+    assert compute_country_shares(start_date, end_date, 3) == shares
+    stats = result_cache.stats()
+
+    assert weekly != monthly
+    assert len(shares["top"]) == 3
+    for name in ("plot_top_products_revenue", "compute_country_shares"):
+        assert (stats[name]["hits"], stats[name]["misses"]) == (1, 1)
+    assert (stats["plot_monthly_revenue_chart"]["hits"], stats["plot_monthly_revenue_chart"]["misses"]) == (2, 2)
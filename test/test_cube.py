@@ -0,0 +1,91 @@
+import pytest
+import pandas as pd
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.cube import METRICS, MetricsCube
+
+
+# Sample mock data
+mock_data = pd.DataFrame({
+    "InvoiceDate": pd.to_datetime([
+        "2024-01-01", "2024-01-01", "2024-01-20", "2024-02-15", "2024-03-01", "2024-03-15"
+    ]),
+    "Country": ["Germany", "France", "Germany", "France", "Germany", "United Kingdom"],
+    "Quantity": [6, 2, -1, 3, 4, -2],
+    "Revenue": [12.0, 8.0, -5.0, 9.0, 16.0, -4.0],
+    "CustomerID": [17850.0, None, 17850.0, 13047.0, None, 13587.0],
+})
+
+
+def test_totals_match_raw_rows():
+    """Test that the cube totals match the sums over the raw invoice lines."""
+    cube = MetricsCube(mock_data)
+    totals = cube.totals("2024-01-01", "2024-02-29", ["Germany", "France"])
+
+    rows = mock_data[(mock_data["InvoiceDate"] <= "2024-02-29") &
+                     (mock_data["Country"].isin(["Germany", "France"]))]
+    assert totals["gross"] == pytest.approx(rows.loc[rows["Quantity"] > 0, "Revenue"].sum())
+    assert totals["refunds"] == pytest.approx(rows.loc[rows["Quantity"] < 0, "Revenue"].sum())
+    assert totals["net"] == pytest.approx(rows["Revenue"].sum())
+    assert totals["returns"] == pytest.approx(rows.loc[rows["Revenue"] < 0, "Revenue"].sum())
+    assert totals["loyal"] == pytest.approx(rows.loc[rows["CustomerID"].notna(), "Revenue"].sum())
+    assert totals["lines"] == len(rows)
+
+
+def test_totals_outside_data_are_zero():
+    """Test that ranges and countries without data sum to zero."""
+    cube = MetricsCube(mock_data)
+
+    assert cube.totals("2025-01-01", "2025-01-31", ["Germany"])["lines"] == 0
+    assert cube.totals("2024-01-01", "2024-03-31", ["Spain"])["net"] == 0
+
+
+def test_monthly_is_chronological_and_skips_empty_months():
+    """Test that monthly totals are ordered by date and only list months with lines."""
+    cube = MetricsCube(mock_data)
+    monthly = cube.monthly("2024-01-01", "2024-03-31", ["Germany"])
+
+    assert monthly.index.tolist() == ["Jan-2024", "Mar-2024"]
+    assert monthly.tolist() == pytest.approx([7.0, 16.0])
+
+
+@pytest.mark.parametrize("granularity, labels, expected", [
+    ("week", ["2024-01-15", "2024-02-26", "2024-03-11"], [-5.0, 16.0, -4.0]),
+    ("day", ["2024-01-20", "2024-03-01", "2024-03-15"], [-5.0, 16.0, -4.0]),
+])
+def test_series_by_week_and_day(granularity, labels, expected):
+    """Test that weekly (from Mondays) and daily totals are chronological and skip empty periods."""
+    cube = MetricsCube(mock_data)
+    series = cube.series("2024-01-02", "2024-03-31", ["Germany", "United Kingdom"], granularity=granularity)
+
+    assert series.index.tolist() == labels
+    assert series.tolist() == pytest.approx(expected)
+
+
+def test_prefix_sums_match_cell_sums():
+    """Test that range totals from the prefix sums match summing the cube cells."""
+    cube = MetricsCube(mock_data)
+    lo, hi = cube.day_bounds("2024-01-10", "2024-03-01")
+    columns = cube.country_indices(["Germany", "France"])
+
+    totals = cube.totals("2024-01-10", "2024-03-01", ["Germany", "France"])
+    cells = cube.values[:, lo:hi][:, :, columns].sum(axis=(1, 2))
+    assert totals["lines"] == cells[-1]
+    assert [totals[metric] * 100 for metric in METRICS[:-1]] == pytest.approx(cells[:-1].tolist())
+
+
+def test_money_sums_are_exact():
+    """Test that money is summed in pence, so totals do not depend on the summation order."""
+    data = pd.DataFrame({
+        "InvoiceDate": pd.to_datetime(["2024-01-01"] * 3 + ["2024-01-02"] * 3),
+        "Country": ["Germany"] * 6,
+        "Quantity": [1] * 6,
+        "Revenue": [0.1, 0.2, 0.3, 0.1, 0.2, 0.3],
+        "CustomerID": [None] * 6,
+    })
+    cube = MetricsCube(data)
+
+    assert cube.totals("2024-01-01", "2024-01-02", ["Germany"])["net"] == 1.2
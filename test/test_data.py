@@ -0,0 +1,154 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import src.data
+from src.cache import ResultCache
+from src.data import (DATA_PATH, arrow_path, data_version, file_version, frame_metadata, get_data, load_arrow,
+                      load_data, load_metadata, metadata_path, set_data)
+
+
+def make_mock_data(n=500, seed=0):
+    """Invoice lines in the processed format, with anonymous customers."""
+    rng = np.random.default_rng(seed)
+    quantity = rng.integers(-3, 12, n)
+    unit_price = np.round(rng.gamma(2, 2, n), 2)
+    dates = pd.Timestamp("2011-01-01") + pd.to_timedelta(rng.integers(0, 90, n), unit="D")
+    return pd.DataFrame({
+        "InvoiceNo": rng.integers(536365, 536500, n).astype(str),
+        "StockCode": rng.integers(20000, 20030, n).astype(str),
+        "Description": rng.choice([f"PRODUCT {i}" for i in range(30)], n),
+        "Quantity": quantity,
+        "InvoiceDate": dates.date,
+        "UnitPrice": unit_price,
+        "CustomerID": np.where(rng.random(n) < 0.7, rng.integers(12346, 12400, n), np.nan),
+        "Country": rng.choice(["United Kingdom", "Germany", "France", "Spain"], n),
+        "Revenue": quantity * unit_price,
+        "MonthYear": pd.to_datetime(dates).strftime("%b-%Y"),
+    })
+
+
+def test_load_data_adds_month_keys(tmp_path):
+    """Test that the loader adds integer month keys and chronologically ordered month labels."""
+    path = str(tmp_path / "processed_data.parquet")
+    data = make_mock_data()
+    data.to_parquet(path)
+
+    frame = load_data(path, mmap=False)
+    dates = frame["InvoiceDate"]
+    assert frame["MonthKey"].tolist() == (dates.dt.year * 12 + dates.dt.month - 1).tolist()
+    assert frame["MonthYear"].cat.ordered
+    assert frame["MonthYear"].cat.categories.tolist() == ["Jan-2011", "Feb-2011", "Mar-2011"]
+    assert frame["MonthYear"].astype(str).tolist() == dates.dt.strftime("%b-%Y").tolist()
+
+
+def test_load_arrow_matches_parquet(tmp_path):
+    """Test that the memory-mapped dataset equals the parquet one and is written next to it."""
+    path = str(tmp_path / "processed_data.parquet")
+    make_mock_data().to_parquet(path)
+
+    mapped = load_arrow(path)
+    assert os.path.exists(arrow_path(path))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+    pd.testing.assert_frame_equal(mapped, load_data(path, mmap=False))
+
+
+def test_load_arrow_columns_are_read_only_views(tmp_path):
+    """Test that the fixed-width columns are zero-copy views over the mapped file."""
+    path = str(tmp_path / "processed_data.parquet")
+    make_mock_data().to_parquet(path)
+
+    mapped = load_arrow(path)
+    for column in ["Quantity", "InvoiceDate", "UnitPrice", "RevenuePence"]:
+        assert not mapped[column].to_numpy().flags.writeable, column
+    assert not mapped["Country"].cat.codes.to_numpy().flags.writeable
+
+
+def test_load_arrow_rebuilds_stale_copy(tmp_path):
+    """Test that the Arrow copy is rewritten when the parquet file is newer."""
+    path = str(tmp_path / "processed_data.parquet")
+    make_mock_data(seed=0).to_parquet(path)
+    load_arrow(path)
+
+    # Make the existing copy older than the new parquet file
+    past = time.time() - 60
+    os.utime(arrow_path(path), (past, past))
+    make_mock_data(seed=1).to_parquet(path)
+
+    pd.testing.assert_frame_equal(load_arrow(path), load_data(path, mmap=False))
+
+
+def test_load_metadata_writes_sidecar(tmp_path):
+    """Test that the sidecar describes the dataset like the loaded frame does."""
+    path = str(tmp_path / "processed_data.parquet")
+    make_mock_data().to_parquet(path)
+
+    metadata = load_metadata(path)
+    assert os.path.exists(metadata_path(path))
+    assert metadata == frame_metadata(load_data(path, mmap=False))
+    assert load_metadata(path) == metadata
+
+
+def test_data_version_comes_from_the_file(tmp_path):
+    """Test that a file-backed dataset is versioned without being loaded, and rewrites change the version."""
+    path = tmp_path / "processed_data.parquet"
+    make_mock_data().to_parquet(path)
+    try:
+        set_data(None, str(path))
+        version = data_version()
+        assert version == file_version(str(path))
+        assert src.data._data is None, "Versioning should not load the dataset."
+
+        get_data()
+        assert data_version() == version
+
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+        assert file_version(str(path)) != version
+
+        frame = make_mock_data(10)
+        set_data(frame, "missing.parquet")
+        assert len(data_version()) == 16
+    finally:
+        set_data(None, DATA_PATH)
+
+
+def test_same_rows_in_memory_and_from_the_file_are_cached_apart(tmp_path):
+    """Test that the file and an in-memory copy of it get their own cache namespace, with the same results."""
+    path = tmp_path / "processed_data.parquet"
+    make_mock_data().to_parquet(path)
+    cache = ResultCache(version=data_version)
+    calls = []
+
+    @cache.memoize(key=lambda: ())
+    def lines():
+        calls.append(1)
+        return len(get_data())
+
+    try:
+        set_data(None, str(path))
+        from_file = lines()
+        version = data_version()
+
+        set_data(load_data(str(path)), str(path))
+        assert data_version() != version
+        assert lines() == from_file
+        assert len(calls) == 2
+
+        set_data(None, str(path))
+        assert lines() == from_file
+        assert len(calls) == 2, "The file's namespace should still be hit."
+
+        # Rewriting identical content only starts a new namespace
+        make_mock_data().to_parquet(path)
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+        set_data(None, str(path))
+        assert data_version() != version
+        assert lines() == from_file
+        assert len(calls) == 3
+    finally:
+        set_data(None, DATA_PATH)
@@ -0,0 +1,65 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.distinct import DistinctIndex
+
+
+# Sample mock data
+mock_data = pd.DataFrame({
+    "InvoiceNo": [536365, 536365, 536366, 536367, 536367, 536368, "C536369", 536370],
+    "InvoiceDate": pd.to_datetime([
+        "2024-01-01", "2024-01-01", "2024-01-02", "2024-01-02", "2024-01-02",
+        "2024-02-01", "2024-02-01", "2024-03-01"
+    ]),
+    "Country": ["Germany", "Germany", "France", "Germany", "Germany", "France", "France", "Germany"],
+    "CustomerID": [17850.0, 17850.0, None, 13047.0, 13047.0, None, None, 17850.0],
+    "Quantity": [6, 2, 1, 3, 4, 2, -1, 5],
+    "Revenue": [12.0, 4.0, 2.5, 9.0, 16.0, 5.0, -2.5, 10.0],
+})
+
+
+def expected_counts(start_date, end_date, countries):
+    rows = mock_data[(mock_data["InvoiceDate"] >= start_date) &
+                     (mock_data["InvoiceDate"] <= end_date) &
+                     (mock_data["Country"].isin(countries))]
+    return {
+        "customers": rows["CustomerID"].nunique(),
+        "anonymous_invoices": rows.loc[rows["CustomerID"].isna(), "InvoiceNo"].nunique(),
+    }
+
+
+@pytest.mark.parametrize("start_date, end_date, countries", [
+    ("2024-01-01", "2024-03-31", ["Germany", "France"]),
+    ("2024-01-02", "2024-02-01", ["France"]),
+    ("2024-01-01", "2024-01-01", ["Germany"]),
+    ("2025-01-01", "2025-01-31", ["Germany", "France"]),
+])
+def test_exact_counts_match_nunique(start_date, end_date, countries):
+    """Test that the exact counts match nunique over the filtered rows."""
+    index = DistinctIndex(mock_data)
+    assert index.counts(start_date, end_date, countries) == expected_counts(start_date, end_date, countries)
+
+
+def test_approximate_counts_are_close():
+    """Test that the HyperLogLog estimate stays within a few percent of the exact count."""
+    rng = np.random.default_rng(0)
+    n = 20000
+    data = pd.DataFrame({
+        "InvoiceNo": rng.integers(0, 5000, n),
+        "InvoiceDate": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 60, n), unit="D"),
+        "Country": rng.choice(["Germany", "France"], n),
+        "CustomerID": np.where(rng.random(n) < 0.8, rng.integers(0, 8000, n), np.nan),
+        "Quantity": np.ones(n, dtype=int),
+        "Revenue": np.ones(n),
+    })
+    index = DistinctIndex(data)
+
+    exact = index.counts("2024-01-01", "2024-02-29", ["Germany", "France"])
+    approximate = index.counts("2024-01-01", "2024-02-29", ["Germany", "France"], approximate=True)
+    for name, count in exact.items():
+        assert approximate[name] == pytest.approx(count, rel=0.1)
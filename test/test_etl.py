@@ -0,0 +1,74 @@
+import pytest
+import pandas as pd
+import pyarrow.parquet as pq
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.etl import run_etl
+
+
+# Raw lines in the format of data/raw/online_retail.csv, deliberately out of order
+raw_data = pd.DataFrame({
+    "InvoiceNo": ["536365", "C536379", "536366", "581587", "536367", "560000", "560001"],
+    "StockCode": ["85123A", "D", "22752", "22138", "84406B", "22633", "22556"],
+    "Description": ["WHITE HANGING HEART T-LIGHT HOLDER", "Discount", "SET 7 BABUSHKA NESTING BOXES",
+                    "BAKING SET 9 PIECE RETROSPOT", None, "HAND WARMER UNION JACK", "PLUSH PANDA SOFT TOY"],
+    "Quantity": [6, -1, 2, 3, 8, 6, 3],
+    "InvoiceDate": ["2010-12-01 8:26", "2010-12-01 9:41", "2010-12-01 8:28", "2011-12-09 12:50",
+                    "2010-12-01 8:34", "2011-07-14 10:00", "2011-07-13 17:05"],
+    "UnitPrice": [2.55, 27.5, 7.65, 4.95, 2.75, 1.85, 5.99],
+    "CustomerID": [17850.0, 14527.0, 17850.0, 12680.0, None, 12583.0, 12583.0],
+    "Country": ["United Kingdom", "United Kingdom", "EIRE", "France", "United Kingdom", "Italy", "Italy"],
+})
+
+
+@pytest.fixture
+def processed_path(tmp_path):
+    raw_path = tmp_path / "online_retail.csv"
+    raw_data.to_csv(raw_path, index=False)
+    output_path = tmp_path / "processed_data.parquet"
+    run_etl(str(raw_path), str(output_path), chunksize=2, log=None)
+    return str(output_path)
+
+
+def test_etl_matches_notebook_processing(processed_path):
+    """Test that the streamed output matches the processing of notebooks/format_data.ipynb."""
+    expected = raw_data.copy()
+    expected["Revenue"] = expected["Quantity"] * expected["UnitPrice"]
+    expected["Country"] = expected["Country"].replace("EIRE", "Ireland")
+    expected["InvoiceDate"] = pd.to_datetime(expected["InvoiceDate"]).dt.date
+    expected["MonthYear"] = pd.to_datetime(expected["InvoiceDate"]).dt.strftime("%b-%Y")
+
+    result = pd.read_parquet(processed_path)
+    key = ["InvoiceNo", "StockCode"]
+    pd.testing.assert_frame_equal(result.sort_values(key, ignore_index=True),
+                                  expected.sort_values(key, ignore_index=True))
+
+
+def test_etl_output_is_sorted_with_one_month_per_row_group(processed_path):
+    """Test that rows are sorted by date then country and no row group spans two months."""
+    result = pd.read_parquet(processed_path)
+    assert result.equals(result.sort_values(["InvoiceDate", "Country"], kind="stable", ignore_index=True))
+
+    metadata = pq.ParquetFile(processed_path).metadata
+    date_column = pq.ParquetFile(processed_path).schema_arrow.get_field_index("InvoiceDate")
+    assert metadata.num_row_groups == 3
+    for i in range(metadata.num_row_groups):
+        statistics = metadata.row_group(i).column(date_column).statistics
+        assert (statistics.min.year, statistics.min.month) == (statistics.max.year, statistics.max.month)
+
+
+def test_failed_etl_leaves_no_partial_output(tmp_path, monkeypatch):
+    """Test that a conversion failing while writing the output removes its temporary file."""
+    raw_path = tmp_path / "online_retail.csv"
+    raw_data.to_csv(raw_path, index=False)
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pq, "read_table", fail)
+    with pytest.raises(OSError):
+        run_etl(str(raw_path), str(tmp_path / "processed_data.parquet"), chunksize=2, log=None)
+    assert sorted(os.listdir(tmp_path)) == ["online_retail.csv"]
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.kernels import distinct_count, encode, group_sum, synthetic_columns, top_k
+
+
+@pytest.fixture(scope="module")
+def columns():
+    return synthetic_columns(20_000, seed=1)
+
+
+def test_encode_maps_keys_to_sorted_codes():
+    """Test that keys map to their position among the sorted unique keys."""
+    unique_keys, codes = encode(np.array([2011 * 12 + 3, 2010 * 12 + 11, 2011 * 12 + 3]))
+    assert unique_keys.tolist() == [2010 * 12 + 11, 2011 * 12 + 3]
+    assert codes.tolist() == [1, 0, 1]
+
+
+def test_group_sum_matches_groupby(columns):
+    """Test that grouped sums and counts match pandas, with zeros for absent codes."""
+    totals = group_sum(columns["product"], columns["revenue"], 5_000)
+    expected = pd.Series(columns["revenue"]).groupby(columns["product"]).sum()
+    assert len(totals) == 5_000
+    assert totals[expected.index].tolist() == pytest.approx(expected.tolist())
+
+    counts = group_sum(columns["country"])
+    expected = pd.Series(columns["country"]).value_counts()
+    assert counts[expected.index].tolist() == expected.tolist()
+
+
+def test_top_k_matches_nlargest(columns):
+    """Test that the top codes match pandas' largest group sums."""
+    totals = group_sum(columns["product"], columns["revenue"])
+    expected = pd.Series(totals).nlargest(10)
+    assert top_k(totals, 10).tolist() == expected.index.tolist()
+
+
+def test_top_k_breaks_ties_by_code():
+    """Test that ties across the k-th value keep the lowest codes, and candidates restrict the choice."""
+    values = np.array([1.0, 5.0, 3.0, 5.0, 3.0, 3.0])
+    assert top_k(values, 3).tolist() == [1, 3, 2]
+    assert top_k(values, 3, np.array([0, 4, 5])).tolist() == [4, 5, 0]
+    assert top_k(values, 10).tolist() == [1, 3, 2, 4, 5, 0]
+    assert top_k(values, 0).tolist() == []
+
+
+def test_distinct_count_matches_nunique(columns):
+    """Test that the bitset and sorted-unique counts match pandas, also over a union of arrays."""
+    customers = columns["customer"]
+    expected = pd.Series(customers).nunique()
+    assert distinct_count(customers, 4_400) == expected
+    assert distinct_count(customers) == expected
+
+    chunks = [customers[:5_000], customers[3_000:9_000]]
+    expected = pd.Series(customers[:9_000]).nunique()
+    assert distinct_count(chunks, 4_400) == expected
+    assert distinct_count(chunks) == expected
+    assert distinct_count([], 10) == 0
@@ -0,0 +1,39 @@
+import json
+import subprocess
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.loadtest import summarize
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+
+def test_load_test_replays_every_action(tmp_path):
+    """Test that virtual users replay full visits against a local server without errors."""
+    # In a fresh interpreter, as the Dash callbacks are registered with the first app of a process
+    output = tmp_path / "loadtest.json"
+    subprocess.run([sys.executable, "-m", "src.loadtest", "--rows", "5000", "--users", "2", "--duration", "1",
+                    "--output", str(output)], cwd=ROOT, check=True, capture_output=True)
+    summary = json.loads(output.read_text())
+
+    assert summary["error_rate"] == 0
+    assert set(summary["actions"]) == {"page", "initial", "date-drag", "country-select", "pie-click", "granularity"}
+    assert summary["throughput"] > 0
+    assert 0 < summary["cache_hit_ratio"] < 1
+    for stats in summary["actions"].values():
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+
+
+def test_summarize_counts_failures_but_not_prevented_updates():
+    """Test that failed requests count as errors and 204 (prevented) updates do not."""
+    records = [("pie-click", 204, 0.01, 0), ("pie-click", 500, 0.02, 10),
+               ("date-drag", 200, 0.03, 100), ("date-drag", 0, 0.04, 0)]
+    stats = {"plot_stacked_chart": {"hits": 2, "shared_hits": 1, "misses": 1, "evictions": 0}}
+    summary = summarize(records, 2.0, stats)
+
+    assert summary["requests"] == 4 and summary["throughput"] == 2.0
+    assert summary["error_rate"] == 0.5
+    assert summary["actions"]["pie-click"]["errors"] == 1
+    assert summary["cache_hit_ratio"] == 0.75
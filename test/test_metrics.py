@@ -0,0 +1,111 @@
+import logging
+import time
+
+import pytest
+from flask import Flask
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.logs import RateLimitFilter
+from src.metrics import Metrics
+
+
+def phase_sum(metrics, name, phase):
+    return metrics._phases[(name, phase)].sum
+
+
+def test_phases_are_exclusive():
+    """Test that a nested phase is only counted once, and the rest goes to the callback phase."""
+    metrics = Metrics()
+
+    @metrics.instrument
+    def figure():
+        with metrics.phase('aggregate'):
+            time.sleep(0.02)
+            with metrics.phase('filter'):
+                time.sleep(0.02)
+        time.sleep(0.01)
+
+    figure()
+    assert metrics._calls == {'figure': 1}
+    assert phase_sum(metrics, 'figure', 'filter') == pytest.approx(0.02, abs=0.01)
+    assert phase_sum(metrics, 'figure', 'aggregate') == pytest.approx(0.02, abs=0.01)
+    assert phase_sum(metrics, 'figure', 'callback') == pytest.approx(0.01, abs=0.01)
+    total = sum(phase_sum(metrics, 'figure', phase) for phase in ('filter', 'aggregate', 'callback'))
+    assert total == pytest.approx(metrics._latency['figure'].sum)
+
+
+def test_nested_callbacks_and_errors():
+    """Test that a nested callback's time is attributed to it only, and errors other than expected ones are counted."""
+    metrics = Metrics()
+
+    @metrics.instrument(name='inner')
+    def inner(fail):
+        with metrics.phase('aggregate'):
+            time.sleep(0.02)
+        if fail:
+            raise ValueError
+
+    @metrics.instrument(expected=(KeyError,))
+    def outer():
+        inner(False)
+        raise KeyError
+
+    with pytest.raises(KeyError):
+        outer()
+    with pytest.raises(ValueError):
+        inner(True)
+
+    assert metrics._calls == {'inner': 2, 'outer': 1}
+    assert metrics._errors == {'inner': 1}
+    assert ('outer', 'aggregate') not in metrics._phases
+    assert phase_sum(metrics, 'outer', 'callback') < 0.01
+
+    # Phases outside instrumented callbacks are ignored
+    with metrics.phase('filter'):
+        pass
+    assert ('filter' not in {phase for _, phase in metrics._phases})
+
+
+def test_metrics_endpoint():
+    """Test that /metrics serves the Prometheus text format, with serialization and size of Dash responses."""
+    metrics = Metrics()
+    server = Flask(__name__)
+
+    @metrics.instrument(name='update')
+    def update():
+        return '{"response": {}}'
+
+    server.add_url_rule('/_dash-update-component', 'update', update, methods=['POST'])
+    metrics.init_app(server)
+
+    client = server.test_client()
+    assert client.post('/_dash-update-component').status_code == 200
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert 'retailense_callback_calls_total{callback="update"} 1' in text
+    assert 'retailense_callback_phase_seconds_count{callback="update",phase="serialize"} 1' in text
+    assert 'retailense_callback_response_bytes_bucket{callback="update",le="256"} 1' in text
+
+    metrics.reset()
+    assert 'callback="update"' not in metrics.render()
+
+
+def test_rate_limit_filter():
+    """Test that records beyond the burst are dropped and counted on the next record let through."""
+    limit = RateLimitFilter(burst=2, period=0.05)
+
+    def record(msg='Selected country: %s'):
+        return logging.LogRecord('src.callbacks', logging.DEBUG, __file__, 1, msg, ('France',), None)
+
+    assert [limit.filter(record()) for _ in range(4)] == [True, True, False, False]
+    assert limit.filter(record('Other message'))
+
+    time.sleep(0.06)
+    allowed = record()
+    assert limit.filter(allowed)
+    assert allowed.getMessage() == 'Selected country: France (2 similar messages dropped)'
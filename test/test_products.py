@@ -0,0 +1,55 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.products import ProductRevenueMatrix
+
+
+# Synthetic invoice lines spanning several months and countries
+rng = np.random.default_rng(42)
+n = 3000
+mock_data = pd.DataFrame({
+    "InvoiceDate": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 120, n), unit="D"),
+    "Country": rng.choice(["Germany", "France", "Spain"], n),
+    "Description": rng.choice([f"PRODUCT {i}" for i in range(50)], n),
+    "Quantity": np.ones(n, dtype=int),
+    "Revenue": np.round(rng.normal(20, 15, n), 2),
+    "CustomerID": np.full(n, 17850.0),
+})
+
+
+def expected_top_products(start_date, end_date, countries, n_products):
+    rows = mock_data[(mock_data["InvoiceDate"] >= start_date) &
+                     (mock_data["InvoiceDate"] <= end_date) &
+                     (mock_data["Country"].isin(countries))]
+    return rows.groupby("Description")["Revenue"].sum().sort_values(ascending=False).head(n_products)
+
+
+@pytest.mark.parametrize("start_date, end_date", [
+    ("2024-01-01", "2024-04-29"),  # Whole range
+    ("2024-01-15", "2024-03-10"),  # Partial months on both sides
+    ("2024-02-01", "2024-02-29"),  # Exactly one month
+    ("2024-02-10", "2024-02-12"),  # Inside a single month
+])
+def test_top_products_match_groupby(start_date, end_date):
+    """Test that the top products match a groupby over the filtered rows, for full and partial months."""
+    matrix = ProductRevenueMatrix(mock_data)
+    result = matrix.top_products(start_date, end_date, ["Germany", "France"], n_products=10)
+    expected = expected_top_products(start_date, end_date, ["Germany", "France"], 10)
+
+    assert result["Description"].tolist() == expected.index.tolist()
+    assert result["Revenue"].tolist() == pytest.approx(expected.tolist())
+
+
+def test_top_products_any_n():
+    """Test that N larger than the number of products sold returns every product sold."""
+    matrix = ProductRevenueMatrix(mock_data)
+    result = matrix.top_products("2024-01-01", "2024-01-01", ["Spain"], n_products=1000)
+    expected = expected_top_products("2024-01-01", "2024-01-01", ["Spain"], 1000)
+
+    assert len(result) == len(expected)
+    assert result["Revenue"].tolist() == pytest.approx(expected.tolist())
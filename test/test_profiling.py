@@ -0,0 +1,70 @@
+import os
+import time
+
+import pytest
+from flask import Flask
+
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.profiling import Profiler
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def make_server(**config):
+    server = Flask(__name__)
+    server.config.update(config)
+
+    def update():
+        busy(float(server.config.get('DELAY', 0.05)))
+        return '{"response": {}}'
+
+    server.add_url_rule('/_dash-update-component', 'update', update, methods=['POST'])
+    Profiler().init_app(server)
+    return server
+
+
+def post(server, **kwargs):
+    return server.test_client().post('/_dash-update-component', json={'output': 'pie-chart.figure'}, **kwargs)
+
+
+def test_off_by_default():
+    """Test that no hook is installed without a profiles directory."""
+    server = make_server()
+    assert not server.before_request_funcs and not server.after_request_funcs
+    assert 'X-Profile-File' not in post(server, headers={'X-Profile': '1'}).headers
+
+
+def test_requested_profile(tmp_path):
+    """Test that the header, query and page flags write a folded profile of the callback."""
+    server = make_server(PROFILE_DIR=str(tmp_path), PROFILE_INTERVAL=0.001)
+    assert 'X-Profile-File' not in post(server).headers
+
+    names = [post(server, headers={'X-Profile': '1'}).headers['X-Profile-File'],
+             post(server, query_string={'profile': '1'}).headers['X-Profile-File'],
+             post(server, headers={'Referer': 'http://localhost/?profile=1'}).headers['X-Profile-File']]
+    assert sorted(os.listdir(tmp_path)) == sorted(names)
+    assert all(name.endswith('-pie-chart-figure.folded') for name in names)
+
+    lines = (tmp_path / names[0]).read_text().splitlines()
+    stacks = dict(line.rsplit(' ', 1) for line in lines)
+    assert all(weight.isdigit() for weight in stacks.values())
+    busy_weight = sum(int(weight) for stack, weight in stacks.items() if 'busy (' in stack.split(';')[-1])
+    assert busy_weight == pytest.approx(50_000, rel=0.5)
+    assert any(';update (' in stack for stack in stacks)
+
+
+def test_threshold_and_bound(tmp_path):
+    """Test that only callbacks slower than the threshold are profiled, and the directory keeps the newest profiles."""
+    server = make_server(PROFILE_DIR=str(tmp_path), PROFILE_THRESHOLD=0.03, PROFILE_MAX_FILES=2, DELAY=0.001)
+    assert 'X-Profile-File' not in post(server).headers
+    assert not os.listdir(tmp_path)
+
+    server.config['DELAY'] = 0.04
+    names = [post(server).headers['X-Profile-File'] for _ in range(3)]
+    assert sorted(os.listdir(tmp_path)) == sorted(names[1:])
@@ -0,0 +1,82 @@
+import json
+import re
+
+import pytest
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.specs import (
+    country_pie_chart, country_pie_spec,
+    monthly_revenue_chart, monthly_revenue_spec,
+    sample_data,
+    spec_update,
+    stacked_chart, stacked_spec,
+    top_products_chart, top_products_spec,
+)
+
+
+def normalize(spec):
+    """
+    Renames the inline dataset, whose name Altair derives from a hash of the
+    values, and the views, which Altair numbers with a process-wide counter,
+    and drops the template metadata.
+    """
+    (name, values), = spec["datasets"].items()
+    spec = {**spec, "data": {"name": "data"}, "datasets": {"data": values}}
+    spec.pop("usermeta", None)
+    return json.loads(re.sub(r'"view_\d+"', '"view"', json.dumps(spec)))
+
+
+@pytest.mark.parametrize("name, build, render", [
+    ("monthly_revenue", monthly_revenue_chart, monthly_revenue_spec),
+    ("stacked", stacked_chart, stacked_spec),
+    ("top_products", top_products_chart, top_products_spec),
+    ("country_pie", country_pie_chart, country_pie_spec),
+])
+def test_template_matches_altair(name, build, render):
+    """Test that rendering a template gives the spec Altair builds for the same data."""
+    data = sample_data()[name]
+    assert normalize(render(data)) == normalize(build(data).to_dict())
+
+
+def test_template_matches_altair_on_subsets():
+    """Test that data-dependent parts follow the data, e.g. the month axis order and missing values."""
+    data = sample_data()["monthly_revenue"].iloc[[3, 1, 2]].reset_index(drop=True)
+    data.loc[1, "Revenue"] = float("nan")
+    assert normalize(monthly_revenue_spec(data)) == normalize(monthly_revenue_chart(data).to_dict())
+
+    data = sample_data()["top_products"].head(3)
+    assert normalize(top_products_spec(data, 3)) == normalize(top_products_chart(data, 3).to_dict())
+
+
+def test_template_matches_altair_by_week():
+    """Test that the weekly revenue trend template gives the spec Altair builds."""
+    data = sample_data()["monthly_revenue"].rename(columns={"MonthYear": "Week"})
+    assert normalize(monthly_revenue_spec(data, "week")) == normalize(monthly_revenue_chart(data, "week").to_dict())
+
+
+def test_renders_do_not_share_data():
+    """Test that rendering new data leaves previously rendered specs unchanged."""
+    data = sample_data()["monthly_revenue"]
+    first = monthly_revenue_spec(data)
+    monthly_revenue_spec(data.head(2))
+    assert first["encoding"]["x"]["sort"] == data["MonthYear"].tolist()
+    assert len(first["datasets"][first["data"]["name"]]) == len(data)
+
+
+def test_spec_update_patches_only_the_data():
+    """Test that a browser showing the template only receives the dataset and month order."""
+    data = sample_data()["monthly_revenue"]
+    spec = monthly_revenue_spec(data)
+    version = spec["usermeta"]["template"]
+
+    # The first update sends the whole spec
+    assert spec_update(spec, None) == (spec, version)
+
+    patch, rendered = spec_update(spec, version)
+    operations = patch.to_plotly_json()["operations"]
+    assert {tuple(operation["location"]) for operation in operations} == {
+        ("datasets", spec["data"]["name"]), ("encoding", "x", "sort")}
+    assert all(operation["operation"] == "Assign" for operation in operations)